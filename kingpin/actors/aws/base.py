@@ -32,13 +32,13 @@ below for using each actor.
 
 import logging
 import re
+import time
 
 from boto import utils as boto_utils
 from boto import exception as boto_exception
 from tornado import concurrent
 from tornado import gen
 from tornado import ioloop
-from retrying import retry
 import boto.cloudformation
 import boto.ec2
 import boto.ec2.elb
@@ -49,12 +49,19 @@ from kingpin import utils
 from kingpin.actors import base
 from kingpin.actors import exceptions
 from kingpin.actors.aws import settings as aws_settings
+from kingpin.actors.support import budget
+from kingpin.actors.support import metrics
 
 log = logging.getLogger(__name__)
 
 __author__ = 'Mikhail Simin <mikhail@nextdoor.com>'
 
-EXECUTOR = concurrent.futures.ThreadPoolExecutor(10)
+EXECUTOR = metrics.ThreadPoolExecutor(10, name='aws')
+
+API_CALLS = metrics.histogram(
+    'kingpin_aws_call_seconds',
+    'Duration of every attempt (including retries) at an AWS API call.',
+    labels=('function',))
 
 
 class ELBNotFound(exceptions.RecoverableActorFailure):
@@ -98,6 +105,7 @@ class AWSBaseActor(base.BaseActor):
 
         # Establish region-specific connection objects.
         region = self.option('region')
+        self._region = None
         if not region:
             return
 
@@ -110,8 +118,8 @@ class AWSBaseActor(base.BaseActor):
 
             # Set the fixed region
             region = zone_check.group(1)
-            self.log.warning('Converting zone "%s" to region "%s".' % (
-                zone, region))
+            self.log.warning('Converting zone "%s" to region "%s".',
+                             zone, region)
 
         region_names = [r.name for r in boto.ec2.elb.regions()]
         if region not in region_names:
@@ -119,6 +127,7 @@ class AWSBaseActor(base.BaseActor):
                    (region, region_names))
             raise exceptions.InvalidOptions(err)
 
+        self._region = region
         self.ec2_conn = boto.ec2.connect_to_region(
             region,
             aws_access_key_id=aws_settings.AWS_ACCESS_KEY_ID,
@@ -139,9 +148,8 @@ class AWSBaseActor(base.BaseActor):
             aws_access_key_id=aws_settings.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=aws_settings.AWS_SECRET_ACCESS_KEY)
 
-    @concurrent.run_on_executor
-    @retry(**aws_settings.RETRYING_SETTINGS)
-    @utils.exception_logger
+    @utils.async_retry(**aws_settings.RETRYING_SETTINGS)
+    @gen.coroutine
     def thread(self, function, *args, **kwargs):
         """Execute `function` in a concurrent thread.
 
@@ -150,7 +158,23 @@ class AWSBaseActor(base.BaseActor):
 
         This allows execution of any function in a thread without having
         to write a wrapper method that is decorated with run_on_executor()
+
+        Throttled calls are retried (see `aws_settings.RETRYING_SETTINGS`),
+        but the waits between the attempts happen on the IOLoop -- an
+        executor thread is only used while the call is actually made.
+
+        Each attempt takes a slot in the ``aws`` (and ``aws/<region>``)
+        budget, see `kingpin.actors.support.budget`.
         """
+        with (yield budget.acquire('aws', self._region)):
+            ret = yield self._thread(function, *args, **kwargs)
+        raise gen.Return(ret)
+
+    @concurrent.run_on_executor
+    @utils.exception_logger
+    def _thread(self, function, *args, **kwargs):
+        """Makes a single attempt at `function` in an executor thread."""
+        start = time.time()
         try:
             return function(*args, **kwargs)
         except boto_exception.BotoServerError as e:
@@ -160,6 +184,9 @@ class AWSBaseActor(base.BaseActor):
                 raise exceptions.InvalidCredentials(msg)
 
             raise
+        finally:
+            API_CALLS.observe(time.time() - start,
+                              function=getattr(function, '__name__', '?'))
 
     @gen.coroutine
     def _find_elb(self, name):
@@ -176,21 +203,21 @@ class AWSBaseActor(base.BaseActor):
         Raises:
             ELBNotFound
         """
-        self.log.info('Searching for ELB "%s"' % name)
+        self.log.info('Searching for ELB "%s"', name)
 
         try:
             elbs = yield self.thread(self.elb_conn.get_all_load_balancers,
                                      load_balancer_names=name)
         except boto_exception.BotoServerError as e:
             msg = '%s: %s' % (e.error_code, e.message)
-            log.error('Received exception: %s' % msg)
+            log.error('Received exception: %s', msg)
 
             if e.status == 400:
                 raise ELBNotFound(msg)
 
             raise
 
-        self.log.debug('ELBs found: %s' % elbs)
+        self.log.debug('ELBs found: %s', elbs)
 
         if len(elbs) != 1:
             raise ELBNotFound('Expected to find exactly 1 ELB. Found %s: %s'
@@ -198,8 +225,8 @@ class AWSBaseActor(base.BaseActor):
 
         raise gen.Return(elbs[0])
 
+    @utils.async_retry(**aws_settings.RETRYING_SETTINGS)
     @concurrent.run_on_executor
-    @retry(**aws_settings.RETRYING_SETTINGS)
     def _get_meta_data(self, key):
         """Get AWS meta data for current instance.
 
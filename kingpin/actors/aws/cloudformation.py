@@ -27,6 +27,7 @@ from tornado import ioloop
 from kingpin import utils
 from kingpin.actors import exceptions
 from kingpin.actors.aws import base
+from kingpin.actors.support import metrics
 from kingpin.constants import REQUIRED
 
 log = logging.getLogger(__name__)
@@ -122,7 +123,7 @@ class CloudFormationBaseActor(base.AWSBaseActor):
             <Stack Object> or <None>
         """
         stacks = yield self._get_stacks()
-        self.log.debug('Checking whether stack %s exists.' % stack)
+        self.log.debug('Checking whether stack %s exists.', stack)
         new_list = [s for s in stacks if s.stack_name == stack]
 
         if len(new_list) > 0:
@@ -147,26 +148,27 @@ class CloudFormationBaseActor(base.AWSBaseActor):
             StackNotFound: If the stack doesn't exist.
         """
         while True:
+            metrics.POLLS.inc(loop='cloudformation._wait_until_state')
             stack = yield self._get_stack(self.option('name'))
 
             if not stack:
                 msg = 'Stack "%s" not found.' % self.option('name')
                 raise StackNotFound(msg)
 
-            self.log.debug('Got stack %s status: %s' %
-                           (stack.stack_name, stack.stack_status))
+            self.log.debug('Got stack %s status: %s',
+                           stack.stack_name, stack.stack_status)
 
             # First, lets see if the stack is still in progress (either
             # creation, deletion, or rollback .. doesn't really matter)
             if stack.stack_status in IN_PROGRESS:
-                self.log.info('Stack is in %s, waiting %s(s)...' %
-                              (stack.stack_status, sleep))
+                self.log.info('Stack is in %s, waiting %s(s)...',
+                              stack.stack_status, sleep)
                 yield utils.tornado_sleep(sleep)
                 continue
 
             # If the stack is in the desired state, then return
             if stack.stack_status in desired_states:
-                self.log.info('Stack execution completed, final state: %s' %
+                self.log.info('Stack execution completed, final state: %s',
                               stack.stack_status)
                 raise gen.Return()
 
@@ -229,6 +231,10 @@ class Create(CloudFormationBaseActor):
          }
        }
 
+    **Runtime Context**
+
+    With an ``id``, this actor publishes the ``stack_id`` of the new stack.
+
     **Dry Mode**
 
     Validates the template, verifies that an existing stack with that name does
@@ -303,7 +309,7 @@ class Create(CloudFormationBaseActor):
         if self._template_body is not None:
             self.log.info('Validating template with AWS...')
         else:
-            self.log.info('Validating template (%s) with AWS...' %
+            self.log.info('Validating template (%s) with AWS...',
                           self._template_url)
 
         try:
@@ -323,7 +329,7 @@ class Create(CloudFormationBaseActor):
     def _create_stack(self):
         """Executes the stack creation."""
         # Create the stack, and get its ID.
-        self.log.info('Creating stack %s' % self.option('name'))
+        self.log.info('Creating stack %s', self.option('name'))
         try:
             stack_id = yield self.thread(
                 self.cf_conn.create_stack,
@@ -342,9 +348,15 @@ class Create(CloudFormationBaseActor):
 
             raise
 
-        self.log.info('Stack %s created: %s' % (self.option('name'), stack_id))
+        self.log.info('Stack %s created: %s', self.option('name'), stack_id)
         raise gen.Return(stack_id)
 
+    @gen.coroutine
+    def needs_execution(self):
+        """Whether the stack is missing (or not finished being built)."""
+        stack = yield self._get_stack(self.option('name'))
+        raise gen.Return(stack is None or stack.stack_status not in COMPLETE)
+
     @gen.coroutine
     def _execute(self):
         stack_name = self.option('name')
@@ -365,7 +377,8 @@ class Create(CloudFormationBaseActor):
             raise gen.Return()
 
         # Create the stack
-        yield self._create_stack()
+        stack_id = yield self._create_stack()
+        self.publish('stack_id', stack_id)
 
         # Now wait until the stack creation has finished
         yield self._wait_until_state(COMPLETE)
@@ -411,7 +424,7 @@ class Delete(CloudFormationBaseActor):
     def _delete_stack(self):
         """Executes the stack deletion."""
         # Create the stack, and get its ID.
-        self.log.info('Deleting stack %s' % self.option('name'))
+        self.log.info('Deleting stack %s', self.option('name'))
         try:
             ret = yield self.thread(
                 self.cf_conn.delete_stack, self.option('name'))
@@ -422,8 +435,8 @@ class Delete(CloudFormationBaseActor):
                 raise CloudFormationError(msg)
 
             raise
-        self.log.info('Stack %s delete requested: %s' %
-                      (self.option('name'), ret))
+        self.log.info('Stack %s delete requested: %s',
+                      self.option('name'), ret)
         raise gen.Return(ret)
 
     @gen.coroutine
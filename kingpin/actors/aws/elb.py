@@ -27,6 +27,7 @@ from tornado import gen
 from kingpin import utils
 from kingpin.actors import exceptions
 from kingpin.actors.aws import base
+from kingpin.actors.support import metrics
 from kingpin.constants import REQUIRED
 
 log = logging.getLogger(__name__)
@@ -159,20 +160,20 @@ class WaitUntilHealthy(ELBBaseActor):
         """
         name = elb.name
 
-        self.log.debug('Counting ELB InService instances for : %s' % name)
+        self.log.debug('Counting ELB InService instances for : %s', name)
 
         # Get all instances for this ELB
         instance_list = yield self.thread(elb.get_instance_health)
         total_count = len(instance_list)
 
-        self.log.debug('All instances: %s' % instance_list)
+        self.log.debug('All instances: %s', instance_list)
         in_service_count = [
             i.state for i in instance_list].count('InService')
 
         expected_count = self._get_expected_count(count, total_count)
 
         healthy = (in_service_count >= expected_count)
-        self.log.debug('ELB "%s" healthy state: %s' % (elb.name, healthy))
+        self.log.debug('ELB "%s" healthy state: %s', elb.name, healthy)
 
         raise gen.Return(healthy)
 
@@ -189,23 +190,26 @@ class WaitUntilHealthy(ELBBaseActor):
             self.log.info,
             'Still waiting for %s to become healthy' % self.option('name'),
             seconds=30)
-        while True:
-            healthy = yield self._is_healthy(elb, count=self.option('count'))
-
-            if healthy is True:
-                self.log.info('ELB is healthy.')
-                break
-
-            # In dry mode, fake it
-            if self._dry:
-                self.log.info('Pretending that ELB is healthy.')
-                break
-
-            # Not healthy :( continue looping
-            self.log.debug('Retrying in 3 seconds.')
-            yield utils.tornado_sleep(3)
-
-        utils.clear_repeating_log(repeating_log)
+        try:
+            while True:
+                metrics.POLLS.inc(loop='elb.WaitUntilHealthy')
+                healthy = yield self._is_healthy(
+                    elb, count=self.option('count'))
+
+                if healthy is True:
+                    self.log.info('ELB is healthy.')
+                    break
+
+                # In dry mode, fake it
+                if self._dry:
+                    self.log.info('Pretending that ELB is healthy.')
+                    break
+
+                # Not healthy :( continue looping
+                self.log.debug('Retrying in 3 seconds.')
+                yield utils.tornado_sleep(3)
+        finally:
+            utils.clear_repeating_log(repeating_log)
 
         raise gen.Return()
 
@@ -223,7 +227,9 @@ class SetCert(ELBBaseActor):
       (str) Name of the ELB
 
     :cert_name:
-      (str) Unique IAM certificate name, or ARN
+      (str) Unique IAM certificate name, or ARN (ie, the ``arn`` published by
+      `kingpin.actors.aws.iam.UploadCert`). An ARN is used as-is, without
+      looking up the cert.
 
     :port:
       (int) Port associated with the cert.
@@ -245,7 +251,9 @@ class SetCert(ELBBaseActor):
     **Dry run**
 
     Will check that ELB and Cert names are existent, and will also check that
-    the credentials provided for AWS have access to the new cert for ssl.
+    the credentials provided for AWS have access to the new cert for ssl. A
+    ``cert_name`` that comes from the runtime context (ie, ``{@cert.arn}``)
+    was not published in the dry run, so that cert is not looked up.
     """
 
     all_options = {
@@ -282,10 +290,11 @@ class SetCert(ELBBaseActor):
     def _get_cert_arn(self, name):
         """Return a server_certificate ARN.
 
-        Searches for a certificate object and returns the "ARN" value.
+        Searches for a certificate object and returns the "ARN" value. An
+        ARN is returned as-is.
 
         Args:
-            name: certificate name
+            name: certificate name, or ARN
 
         Raises:
             CertNotFound - if the name doesn't match an existing cert.
@@ -293,8 +302,10 @@ class SetCert(ELBBaseActor):
         Returns:
             string: the ARN value of the certificate
         """
+        if name.startswith('arn:'):
+            raise gen.Return(name)
 
-        self.log.debug('Searching for cert "%s"...' % name)
+        self.log.debug('Searching for cert "%s"...', name)
         try:
             cert = yield self.thread(
                 self.iam_conn.get_server_certificate, name)
@@ -319,7 +330,7 @@ class SetCert(ELBBaseActor):
             arn: ARN for server certificate to use.
         """
 
-        self.log.info('Setting ELB "%s" to use cert arn: %s' % (elb, arn))
+        self.log.info('Setting ELB "%s" to use cert arn: %s', elb, arn)
         try:
             yield self.thread(
                 elb.set_listener_SSL_certificate, self.option('port'), arn)
@@ -345,22 +356,39 @@ class SetCert(ELBBaseActor):
 
         return arn == new_arn
 
+    @gen.coroutine
+    def needs_execution(self):
+        """Whether the ELB is using a different cert."""
+        if self._unpublished('cert_name'):
+            raise gen.Return(True)
+
+        elb = yield self._find_elb(self.option('name'))
+        cert_arn = yield self._get_cert_arn(self.option('cert_name'))
+        raise gen.Return(not self._compare_certs(elb, cert_arn))
+
     @gen.coroutine
     def _execute(self):
         """Find ELB, and a Cert, then apply it."""
         elb = yield self._find_elb(self.option('name'))
+
+        if self._unpublished('cert_name'):
+            yield self._check_access(elb)
+            self.log.info('Would instruct %s to use the published value %s',
+                          self.option('name'), self.option('cert_name'))
+            raise gen.Return()
+
         cert_arn = yield self._get_cert_arn(self.option('cert_name'))
 
         same_cert = self._compare_certs(elb, cert_arn)
 
         if same_cert:
-            self.log.warning('ELB %s is already using this cert.' % elb)
+            self.log.warning('ELB %s is already using this cert.', elb)
             raise gen.Return()
 
         if self._dry:
             yield self._check_access(elb)
-            self.log.info('Would instruct %s to use %s' % (
-                self.option('name'), self.option('cert_name')))
+            self.log.info('Would instruct %s to use %s',
+                          self.option('name'), self.option('cert_name'))
         else:
             yield self._use_cert(elb, cert_arn)
 
@@ -429,8 +457,8 @@ class RegisterInstance(base.AWSBaseActor):
         enabled_zones = set(elb.availability_zones)
 
         if not zone_names.issubset(enabled_zones):
-            self.log.warning('ELB "%s" is missing some AZ.' % elb.name)
-            self.log.info('Enabling all zones: %s' % zone_names)
+            self.log.warning('ELB "%s" is missing some AZ.', elb.name)
+            self.log.info('Enabling all zones: %s', zone_names)
             yield self.thread(elb.enable_zones, zone_names)
 
     @gen.coroutine
@@ -442,13 +470,13 @@ class RegisterInstance(base.AWSBaseActor):
             self.log.debug('No instance provided. Using current instance id.')
             iid = yield self._get_meta_data('instance-id')
             instances = [iid]
-            self.log.debug('Instances is: %s' % instances)
+            self.log.debug('Instances is: %s', instances)
 
         if type(instances) is not list:
             instances = [instances]
 
-        self.log.info(('Adding the following instances to elb: '
-                       '%s' % ', '.join(instances)))
+        self.log.info('Adding the following instances to elb: %s',
+                      ', '.join(instances))
         if not self._dry:
             yield self._add(elb, instances)
             self.log.info('Done.')
@@ -517,13 +545,13 @@ class DeregisterInstance(base.AWSBaseActor):
             self.log.debug('No instance provided. Using current instance id.')
             iid = yield self._get_meta_data('instance-id')
             instances = [iid]
-            self.log.debug('Instances is: %s' % instances)
+            self.log.debug('Instances is: %s', instances)
 
         if type(instances) is not list:
             instances = [instances]
 
-        self.log.info(('Removing the following instances from elb: '
-                       '%s' % ', '.join(instances)))
+        self.log.info('Removing the following instances from elb: %s',
+                      ', '.join(instances))
         if not self._dry:
             yield self._remove(elb, instances)
             self.log.info('Done.')
@@ -0,0 +1,427 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+
+"""
+:mod:`kingpin.actors.aws.fake`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+In-process fakes of the boto connections used by the `kingpin.actors.aws`
+actors (IAM server certificates, ELBs, CloudFormation stacks and SQS queues).
+See `kingpin.actors.support.fake` for how to enable them.
+
+The fake connections hand back real boto objects (``LoadBalancer``,
+``Queue``, ``StackSummary`` ...) wired up to the fake connection, and raise
+real ``BotoServerError`` exceptions, so the actors run exactly the same code
+that they do against AWS. Throttled calls fail with the ``Throttling`` error
+code (which the actors retry), and failed calls with an
+``InternalFailure``.
+
+State is shared by all regions.
+
+**State**
+
+The `FakeAWS.load()` method takes a dict like this:
+
+.. code-block:: json
+
+    { "certs": [ "star-example-com" ],
+      "elbs": [ { "name": "prod-web", "instances": [ "i-123456" ],
+                  "listeners": [ [ 443, 80, "HTTPS", "HTTP", "" ] ] } ],
+      "queues": [ { "name": "async-tasks", "messages": 5 } ],
+      "stacks": [ { "name": "prod-backend" } ] }
+"""
+
+import functools
+import json
+import logging
+import threading
+import uuid
+
+from boto import exception as boto_exception
+from boto.cloudformation import connection as cf_connection
+from boto.cloudformation import stack as cf_stack
+from boto.ec2 import zone as ec2_zone
+from boto.ec2.elb import instancestate
+from boto.ec2.elb import listener as elb_listener
+from boto.ec2.elb import loadbalancer
+from boto.sqs import queue as sqs_queue
+import boto.cloudformation
+import boto.ec2
+import boto.ec2.elb
+import boto.iam
+import boto.sqs
+
+from kingpin.actors.aws import settings as aws_settings
+from kingpin.actors.support import fake
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Mikhail Simin <mikhail@nextdoor.com>'
+
+ACCOUNT_ID = '123456789012'
+
+ERROR_BODY = ('<ErrorResponse><Error><Type>Sender</Type><Code>%s</Code>'
+              '<Message>%s</Message></Error></ErrorResponse>')
+
+# (module, attribute, original value) tuples replaced by install()
+_ORIGINALS = []
+
+
+def _error(status, code, message):
+    """Returns a BotoServerError just like boto would raise it."""
+    return boto_exception.BotoServerError(
+        status, 'Fake', ERROR_BODY % (code, message))
+
+
+def api(f):
+    """Decorates a fake API call with the backend's Behavior.
+
+    The call itself is made while holding the backend lock, because the
+    actors make their calls from several executor threads at once.
+    """
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        outcome = self.backend.behavior.roll(f.__name__)
+        if outcome == fake.THROTTLED:
+            raise _error(400, 'Throttling', 'Rate exceeded')
+        if outcome == fake.FAILED:
+            raise _error(500, 'InternalFailure', 'Fake internal failure')
+        with self.backend.lock:
+            return f(self, *args, **kwargs)
+    return wrapper
+
+
+class FakeConnection(object):
+
+    """Base class for the fake connections."""
+
+    def __init__(self, backend, region='us-east-1'):
+        self.backend = backend
+        self.region = boto.ec2.RegionInfo(name=region)
+
+
+class FakeIAMConnection(FakeConnection):
+
+    @api
+    def upload_server_cert(self, cert_name, cert_body, private_key,
+                           cert_chain=None, path=None):
+        if cert_name in self.backend.certs:
+            raise _error(409, 'EntityAlreadyExists',
+                         'Server Certificate %s already exists.' % cert_name)
+        cert = self.backend.add_cert(cert_name, path=path)
+        return {'upload_server_certificate_response': {
+            'upload_server_certificate_result': {
+                'server_certificate_metadata': cert}}}
+
+    @api
+    def get_server_certificate(self, cert_name):
+        cert = self.backend.certs.get(cert_name)
+        if not cert:
+            raise _error(404, 'NoSuchEntity',
+                         'Server Certificate %s not found.' % cert_name)
+        return {'get_server_certificate_response': {
+            'get_server_certificate_result': {
+                'server_certificate': {
+                    'server_certificate_metadata': cert}}}}
+
+    @api
+    def delete_server_cert(self, cert_name):
+        if cert_name not in self.backend.certs:
+            raise _error(404, 'NoSuchEntity',
+                         'Server Certificate %s not found.' % cert_name)
+        del self.backend.certs[cert_name]
+        return True
+
+
+class FakeEC2Connection(FakeConnection):
+
+    @api
+    def get_all_zones(self):
+        zones = []
+        for letter in 'abc':
+            zone = ec2_zone.Zone(self)
+            zone.name = '%s%s' % (self.region.name, letter)
+            zone.state = 'available'
+            zones.append(zone)
+        return zones
+
+
+class FakeELBConnection(FakeConnection):
+
+    def _get(self, name):
+        if name not in self.backend.elbs:
+            raise _error(400, 'LoadBalancerNotFound',
+                         'Cannot find Load Balancer %s' % name)
+        return self.backend.elbs[name]
+
+    @api
+    def get_all_load_balancers(self, load_balancer_names=None):
+        if load_balancer_names is None:
+            return self.backend.elbs.values()
+        if isinstance(load_balancer_names, basestring):
+            load_balancer_names = [load_balancer_names]
+        return [self._get(name) for name in load_balancer_names]
+
+    @api
+    def describe_instance_health(self, load_balancer_name, instances=None):
+        self._get(load_balancer_name)
+        health = self.backend.elb_health[load_balancer_name]
+        states = []
+        for instance_id, pending in sorted(health.items()):
+            if instances and instance_id not in instances:
+                continue
+            state = instancestate.InstanceState(self)
+            state.instance_id = instance_id
+            state.state = 'InService' if pending.done() else 'OutOfService'
+            states.append(state)
+        return states
+
+    @api
+    def register_instances(self, load_balancer_name, instances):
+        self._get(load_balancer_name)
+        health = self.backend.elb_health[load_balancer_name]
+        for instance_id in instances:
+            health.setdefault(instance_id, fake.Pending())
+        return sorted(health)
+
+    @api
+    def deregister_instances(self, load_balancer_name, instances):
+        self._get(load_balancer_name)
+        health = self.backend.elb_health[load_balancer_name]
+        for instance_id in instances:
+            health.pop(instance_id, None)
+        return sorted(health)
+
+    @api
+    def enable_availability_zones(self, load_balancer_name, zones_to_add):
+        elb = self._get(load_balancer_name)
+        return sorted(set(elb.availability_zones) | set(zones_to_add))
+
+    @api
+    def set_lb_listener_SSL_certificate(self, lb_name, lb_port,
+                                        ssl_certificate_id):
+        elb = self._get(lb_name)
+        arns = [c['arn'] for c in self.backend.certs.values()]
+        if ssl_certificate_id not in arns:
+            raise _error(400, 'CertificateNotFound',
+                         'Certificate "%s" not found.' % ssl_certificate_id)
+        for lis in elb.listeners:
+            if lis.load_balancer_port == lb_port:
+                lis.ssl_certificate_id = ssl_certificate_id
+                return True
+        raise _error(400, 'ListenerNotFound',
+                     'No listener on port %s' % lb_port)
+
+
+class FakeCloudFormationConnection(FakeConnection):
+
+    valid_states = cf_connection.CloudFormationConnection.valid_states
+
+    @api
+    def list_stacks(self, stack_status_filters=None):
+        summaries = []
+        for name, stack in sorted(self.backend.stacks.items()):
+            if stack['pending'] and stack['pending'].done():
+                stack['status'] = stack.pop('final')
+                stack['pending'] = None
+            if (stack_status_filters and
+                    stack['status'] not in stack_status_filters):
+                continue
+            summary = cf_stack.StackSummary(self)
+            summary.stack_id = stack['id']
+            summary.stack_name = name
+            summary.stack_status = stack['status']
+            summaries.append(summary)
+        return summaries
+
+    @api
+    def validate_template(self, template_body=None, template_url=None):
+        if template_body is not None:
+            try:
+                json.loads(template_body)
+            except ValueError as e:
+                raise _error(400, 'ValidationError',
+                             'Template format error: %s' % e)
+        return True
+
+    @api
+    def create_stack(self, stack_name, template_body=None, template_url=None,
+                     parameters=None, disable_rollback=False,
+                     timeout_in_minutes=None, capabilities=None, **kwargs):
+        stack = self.backend.stacks.get(stack_name)
+        if stack and stack['status'] != 'DELETE_COMPLETE':
+            raise _error(400, 'AlreadyExistsException',
+                         'Stack [%s] already exists' % stack_name)
+        return self.backend.add_stack(stack_name, status='CREATE_IN_PROGRESS',
+                                      final='CREATE_COMPLETE')
+
+    @api
+    def delete_stack(self, stack_name_or_id):
+        stack = self.backend.stacks.get(stack_name_or_id)
+        if stack and stack['status'] != 'DELETE_COMPLETE':
+            stack['status'] = 'DELETE_IN_PROGRESS'
+            stack['final'] = 'DELETE_COMPLETE'
+            stack['pending'] = fake.Pending()
+        return {'DeleteStackResponse': {}}
+
+
+class FakeSQSConnection(FakeConnection):
+
+    def _queue(self, name):
+        return sqs_queue.Queue(
+            self, 'https://queue.amazonaws.com/%s/%s' % (ACCOUNT_ID, name))
+
+    @api
+    def get_all_queues(self, prefix=''):
+        return [self._queue(name) for name in sorted(self.backend.queues)
+                if name.startswith(prefix)]
+
+    @api
+    def create_queue(self, queue_name, visibility_timeout=None):
+        if queue_name not in self.backend.queues:
+            self.backend.add_queue(queue_name)
+        return self._queue(queue_name)
+
+    @api
+    def delete_queue(self, queue, force_deletion=False):
+        return self.backend.queues.pop(queue.name, None) is not None
+
+    @api
+    def get_queue_attributes(self, queue, attribute='All'):
+        state = self.backend.queues.get(queue.name)
+        if state is None:
+            raise _error(400, 'AWS.SimpleQueueService.NonExistentQueue',
+                         'The specified queue does not exist.')
+        if state['messages'] and state['pending'].done():
+            state['messages'] = 0
+        attributes = {'ApproximateNumberOfMessages': str(state['messages']),
+                      'ApproximateNumberOfMessagesNotVisible': '0'}
+        if attribute == 'All':
+            return attributes
+        return {attribute: attributes[attribute]}
+
+
+class FakeAWS(object):
+
+    """Holds the state of the fake AWS account.
+
+    Args:
+        behavior: A `kingpin.actors.support.fake.Behavior` object
+    """
+
+    def __init__(self, behavior=None):
+        self.behavior = behavior or fake.Behavior()
+        self.lock = threading.RLock()
+        self.certs = {}
+        self.elbs = {}
+        self.elb_health = {}
+        self.stacks = {}
+        self.queues = {}
+
+    def add_cert(self, name, path=None):
+        """Adds an IAM server certificate and returns its metadata."""
+        path = path or '/'
+        self.certs[name] = {
+            'server_certificate_name': name,
+            'server_certificate_id': uuid.uuid4().hex.upper()[:21],
+            'path': path,
+            'arn': 'arn:aws:iam::%s:server-certificate%s%s' % (
+                ACCOUNT_ID, path, name)}
+        return self.certs[name]
+
+    def add_elb(self, name, zones=None, instances=(), listeners=()):
+        """Adds an ELB, with all of its `instances` in service."""
+        connection = FakeELBConnection(self)
+        elb = loadbalancer.LoadBalancer(connection, name)
+        elb.availability_zones = zones or ['us-east-1a']
+        elb.listeners = [
+            elb_listener.Listener(elb, *lis[:3], ssl_certificate_id=lis[4],
+                                  instance_protocol=lis[3])
+            for lis in listeners]
+        self.elbs[name] = elb
+        self.elb_health[name] = dict(
+            (instance_id, fake.Pending(0)) for instance_id in instances)
+        return elb
+
+    def add_stack(self, name, status='CREATE_COMPLETE', final=None):
+        """Adds a CloudFormation stack and returns its ID.
+
+        If `final` is supplied, the stack moves from `status` to `final`
+        after being listed a few times.
+        """
+        stack_id = 'arn:aws:cloudformation:us-east-1:%s:stack/%s/%s' % (
+            ACCOUNT_ID, name, uuid.uuid4())
+        self.stacks[name] = {'id': stack_id,
+                             'status': status,
+                             'final': final,
+                             'pending': fake.Pending() if final else None}
+        return stack_id
+
+    def add_queue(self, name, messages=0):
+        """Adds an SQS queue, which empties after being counted a few times.
+        """
+        self.queues[name] = {'messages': messages, 'pending': fake.Pending()}
+
+    def load(self, state):
+        """Populates the fake account from a dict (see above)."""
+        for name in state.get('certs', []):
+            self.add_cert(name)
+        for elb in state.get('elbs', []):
+            self.add_elb(**elb)
+        for stack in state.get('stacks', []):
+            self.add_stack(**stack)
+        for queue in state.get('queues', []):
+            self.add_queue(**queue)
+
+
+def _patch(module, name, value):
+    _ORIGINALS.append((module, name, getattr(module, name)))
+    setattr(module, name, value)
+
+
+def install(behavior=None):
+    """Replaces the boto connections used by the AWS actors with fakes.
+
+    Returns:
+        The FakeAWS backend
+    """
+    backend = FakeAWS(behavior)
+
+    def connector(connection_class):
+        def connect_to_region(region_name, **kwargs):
+            return connection_class(backend, region_name)
+        return connect_to_region
+
+    _patch(boto.iam.connection, 'IAMConnection',
+           lambda **kwargs: FakeIAMConnection(backend))
+    _patch(boto.ec2, 'connect_to_region', connector(FakeEC2Connection))
+    _patch(boto.ec2.elb, 'connect_to_region', connector(FakeELBConnection))
+    _patch(boto.cloudformation, 'connect_to_region',
+           connector(FakeCloudFormationConnection))
+    _patch(boto.sqs, 'connect_to_region', connector(FakeSQSConnection))
+
+    # The actors refuse to start without credentials
+    if not aws_settings.AWS_ACCESS_KEY_ID:
+        _patch(aws_settings, 'AWS_ACCESS_KEY_ID', 'fake')
+    if not aws_settings.AWS_SECRET_ACCESS_KEY:
+        _patch(aws_settings, 'AWS_SECRET_ACCESS_KEY', 'fake')
+
+    return backend
+
+
+def uninstall():
+    """Puts back everything that install() replaced."""
+    while _ORIGINALS:
+        module, name, value = _ORIGINALS.pop()
+        setattr(module, name, value)
@@ -84,6 +84,13 @@ class UploadCert(IAMBaseActor):
 
     Checks that the passed file paths are valid. In the future will also
     validate that the files are of correct format and content.
+
+    **Runtime Context**
+
+    With an ``id``, this actor publishes the ``arn`` of the new cert. Passing
+    that to `kingpin.actors.aws.elb.SetCert` (ie, ``"cert_name":
+    "{@new_cert.arn}"``) saves it from looking up the cert again, which can
+    fail for a little while after the cert was uploaded.
     """
 
     all_options = {
@@ -97,8 +104,12 @@ class UploadCert(IAMBaseActor):
 
     @gen.coroutine
     def _upload(self, cert_name, cert_body, private_key, cert_chain, path):
-        """Create a new server certificate in AWS IAM."""
-        yield self.thread(
+        """Create a new server certificate in AWS IAM.
+
+        Returns:
+            string: the ARN value of the new certificate
+        """
+        response = yield self.thread(
             self.iam_conn.upload_server_cert,
             cert_name=cert_name,
             cert_body=cert_body,
@@ -106,6 +117,11 @@ class UploadCert(IAMBaseActor):
             cert_chain=cert_chain,
             path=path)
 
+        arn = response['upload_server_certificate_response'][
+            'upload_server_certificate_result'][
+            'server_certificate_metadata']['arn']
+        raise gen.Return(arn)
+
     @gen.coroutine
     def _execute(self):
         """Gather all the cert data and upload it.
@@ -123,16 +139,17 @@ class UploadCert(IAMBaseActor):
 
         # Upload it
         if self._dry:
-            self.log.info('Would upload cert "%s"' % self.option('name'))
+            self.log.info('Would upload cert "%s"', self.option('name'))
             raise gen.Return()
 
-        self.log.info('Uploading cert "%s"' % self.option('name'))
-        yield self._upload(
+        self.log.info('Uploading cert "%s"', self.option('name'))
+        arn = yield self._upload(
             cert_name=self.option('name'),
             cert_body=cert_body,
             private_key=private_key,
             cert_chain=cert_chain_body,
             path=self.option('path'))
+        self.publish('arn', arn)
 
 
 class DeleteCert(IAMBaseActor):
@@ -168,7 +185,7 @@ class DeleteCert(IAMBaseActor):
     def _find_cert(self, name):
         """Find a cert by name."""
 
-        self.log.debug('Searching for cert "%s"...' % name)
+        self.log.debug('Searching for cert "%s"...', name)
         try:
             yield self.thread(self.iam_conn.get_server_certificate, name)
         except BotoServerError as e:
@@ -185,8 +202,8 @@ class DeleteCert(IAMBaseActor):
         if self._dry:
             self.log.info('Checking that the cert exists...')
             yield self._find_cert(self.option('name'))
-            self.log.info('Would delete cert "%s"' % self.option('name'))
+            self.log.info('Would delete cert "%s"', self.option('name'))
             raise gen.Return()
 
-        self.log.info('Deleting cert "%s"' % self.option('name'))
+        self.log.info('Deleting cert "%s"', self.option('name'))
         yield self._delete(cert_name=self.option('name'))
@@ -35,9 +35,10 @@ AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY', '')
 SQS_RETRY_DELAY = 30
 
 
-# Common Settings for the retrying.retry() decorator
+# Common Settings for the retrying.retry() (or kingpin.utils.async_retry())
+# decorator
 #
-# Use like this: @retrying.retry(**settings.RETRYING_SETTINGS)
+# Use like this: @utils.async_retry(**settings.RETRYING_SETTINGS)
 #
 def is_retriable_exception(exception):
     """Return true if this AWS exception is transient and should be retried.
@@ -54,7 +55,10 @@ def is_retriable_exception(exception):
         return False
 
     # Boto exceptions should have a code attribute
-    return exception.error_code in retry_codes
+    if exception.error_code not in retry_codes:
+        return False
+
+    return True
 
 
 RETRYING_SETTINGS = {
@@ -65,7 +69,8 @@ RETRYING_SETTINGS = {
     # Wait up to 10 times
     'stop_max_attempt_number': 10,
 
-    # Add 250ms of random jitter to every retry
+    # Add 250ms of random jitter to every retry (only retrying.retry() does,
+    # async_retry() gets its randomness from wait_random_min/max below)
     'wait_jitter_max': 250,
 
     # Add 250ms of sleep to every retry
@@ -31,6 +31,7 @@ from kingpin import utils
 from kingpin.actors import exceptions
 from kingpin.actors.aws import base
 from kingpin.actors.aws import settings as aws_settings
+from kingpin.actors.support import metrics
 from kingpin.constants import REQUIRED
 
 log = logging.getLogger(__name__)
@@ -112,6 +113,10 @@ class Create(SQSBaseActor):
          }
        }
 
+    **Runtime Context**
+
+    With an ``id``, this actor publishes the ``url`` of the new queue.
+
     **Dry Mode**
 
     Will not create any queue, or even contact SQS. Will create a mock.Mock
@@ -137,15 +142,22 @@ class Create(SQSBaseActor):
             An SQS Queue Object
         """
         if not self._dry:
-            self.log.info('Creating a new queue: %s' % name)
+            self.log.info('Creating a new queue: %s', name)
             new_queue = yield self.thread(self.sqs_conn.create_queue, name)
         else:
-            self.log.info('Would create a new queue: %s' % name)
+            self.log.info('Would create a new queue: %s', name)
             new_queue = mock.Mock(name=name)
 
-        self.log.debug('Returning queue object: %s' % new_queue)
+        self.log.debug('Returning queue object: %s', new_queue)
         raise gen.Return(new_queue)
 
+    @gen.coroutine
+    def needs_execution(self):
+        """Whether the queue is missing."""
+        name = self.option('name')
+        queues = yield self.thread(self.sqs_conn.get_all_queues, name)
+        raise gen.Return(name not in [q.name for q in queues])
+
     @gen.coroutine
     def _execute(self):
         """Executes an actor and yields the results when its finished.
@@ -156,9 +168,10 @@ class Create(SQSBaseActor):
         q = yield self._create_queue(name=self.option('name'))
 
         if q.__class__ == boto.sqs.queue.Queue:
-            self.log.info('Queue Created: %s' % q.url)
+            self.log.info('Queue Created: %s', q.url)
+            self.publish('url', q.url)
         elif self._dry:
-            self.log.info('Fake Queue: %s' % q)
+            self.log.info('Fake Queue: %s', q)
         else:
             raise exceptions.UnrecoverableActorFailure(
                 'All hell broke loose: %s' % q)
@@ -232,10 +245,10 @@ class Delete(SQSBaseActor):
           QueueDeletionFailed if queue deletion failed.
         """
         if not self._dry:
-            self.log.info('Deleting Queue: %s...' % queue.url)
+            self.log.info('Deleting Queue: %s...', queue.url)
             ok = yield self.thread(self.sqs_conn.delete_queue, queue)
         else:
-            self.log.info('Would delete the queue: %s' % queue.url)
+            self.log.info('Would delete the queue: %s', queue.url)
             ok = True
 
         # Raise an exception if the tasks failed
@@ -263,7 +276,7 @@ class Delete(SQSBaseActor):
             raise QueueNotFound(
                 'No queues with pattern "%s" found.' % pattern)
 
-        self.log.info('Deleting SQS Queues: %s' % matched_queues)
+        self.log.info('Deleting SQS Queues: %s', matched_queues)
 
         tasks = []
         for q in matched_queues:
@@ -335,20 +348,21 @@ class WaitUntilEmpty(SQSBaseActor):
 
         count = 0
         while True:
+            metrics.POLLS.inc(loop='sqs.WaitUntilEmpty')
             if not self._dry:
-                self.log.debug('Counting %s' % queue.url)
+                self.log.debug('Counting %s', queue.url)
                 visible = yield self.thread(queue.count)
                 attr = 'ApproximateNumberOfMessagesNotVisible'
                 invisible = yield self.thread(queue.get_attributes, attr)
                 invisible_int = int(invisible[attr])
                 count = visible + invisible_int
             else:
-                self.log.info('Pretending that count is 0 for %s' % queue.url)
+                self.log.info('Pretending that count is 0 for %s', queue.url)
                 count = 0
 
-            self.log.debug('Queue has %s messages in it.' % count)
+            self.log.debug('Queue has %s messages in it.', count)
             if count > 0:
-                self.log.info('Waiting on %s to become empty...' % queue.name)
+                self.log.info('Waiting on %s to become empty...', queue.name)
                 yield utils.tornado_sleep(sleep)
             else:
                 self.log.debug('Queue is empty!')
@@ -370,14 +384,14 @@ class WaitUntilEmpty(SQSBaseActor):
             raise QueueNotFound(
                 'No queues like "%s" were found!' % pattern)
 
-        self.log.info('Waiting for "%s" queues to become empty.' %
+        self.log.info('Waiting for "%s" queues to become empty.',
                       self.option('name'))
 
         sleepers = []
         for q in matched_queues:
             sleepers.append(self._wait(queue=q))
 
-        self.log.info('%s queues need to be empty.' % len(matched_queues))
+        self.log.info('%s queues need to be empty.', len(matched_queues))
         self.log.info([q.name for q in matched_queues])
         yield sleepers
         self.log.info('All queues report empty.')
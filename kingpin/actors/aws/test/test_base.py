@@ -8,6 +8,7 @@ import mock
 from kingpin.actors.aws import settings
 from kingpin.actors import exceptions
 from kingpin.actors.aws import base
+from kingpin.actors.test.helper import tornado_value
 
 log = logging.getLogger(__name__)
 
@@ -29,6 +30,18 @@ class TestBase(testing.AsyncTestCase):
         actor = base.AWSBaseActor('Unit Test Action',
                                   {'region': 'us-west-1d'})
         self.assertEquals(actor.ec2_conn.region.name, 'us-west-1')
+        self.assertEquals(actor._region, 'us-west-1')
+
+    @testing.gen_test
+    def test_thread_budget(self):
+        actor = base.AWSBaseActor('Unit Test Action',
+                                  {'region': 'us-west-1d'})
+        with mock.patch.object(base.budget, 'acquire') as acquire:
+            acquire.return_value = tornado_value(mock.MagicMock())
+            ret = yield actor.thread(lambda: 'done')
+
+        self.assertEquals(ret, 'done')
+        acquire.assert_called_once_with('aws', 'us-west-1')
 
     @testing.gen_test
     def test_thread_exception(self):
@@ -270,6 +270,28 @@ class TestCreate(testing.AsyncTestCase):
         with self.assertRaises(cloudformation.StackAlreadyExists):
             yield actor._execute()
 
+    @testing.gen_test
+    def test_needs_execution(self):
+        actor = cloudformation.Create(
+            'Unit Test Action',
+            {'name': 'unit-test-cf',
+             'region': 'us-west-2',
+             'template':
+                 'examples/test/aws.cloudformation/cf.integration.json'})
+        stack = mock.MagicMock(stack_status='CREATE_COMPLETE')
+        actor._get_stack = mock.MagicMock()
+        actor._get_stack.side_effect = [tornado_value(None),
+                                        tornado_value(stack),
+                                        tornado_value(stack)]
+
+        needed = yield actor.needs_execution()
+        self.assertTrue(needed)
+        needed = yield actor.needs_execution()
+        self.assertFalse(needed)
+        stack.stack_status = 'CREATE_IN_PROGRESS'
+        needed = yield actor.needs_execution()
+        self.assertTrue(needed)
+
     @testing.gen_test
     def test_execute_dry(self):
         actor = cloudformation.Create(
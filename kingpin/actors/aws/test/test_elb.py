@@ -335,6 +335,23 @@ class TestSetCert(testing.AsyncTestCase):
         settings.RETRYING_SETTINGS = {'stop_max_attempt_number': 1}
         reload(elb_actor)
 
+    @testing.gen_test
+    def test_needs_execution(self):
+        actor = elb_actor.SetCert('Unit Test', {
+            'name': 'unit-test', 'region': 'us-east-1',
+            'cert_name': 'unit-cert'})
+        elb = mock.Mock()
+        elb.listeners = [(443, 443, 'HTTPS', 'HTTPS', 'arn:old')]
+        actor._find_elb = helper.mock_tornado(elb)
+
+        actor._get_cert_arn = helper.mock_tornado('arn:old')
+        needed = yield actor.needs_execution()
+        self.assertFalse(needed)
+
+        actor._get_cert_arn = helper.mock_tornado('arn:new')
+        needed = yield actor.needs_execution()
+        self.assertTrue(needed)
+
     @testing.gen_test
     def test_check_access(self):
         elb = mock.Mock()
@@ -383,6 +400,11 @@ class TestSetCert(testing.AsyncTestCase):
         # New name supplied, call count should be 2
         self.assertEquals(actor.iam_conn.get_server_certificate.call_count, 2)
 
+        # ARNs are not looked up
+        arn = yield actor._get_cert_arn('arn:aws:iam::1:server-certificate/a')
+        self.assertEquals(arn, 'arn:aws:iam::1:server-certificate/a')
+        self.assertEquals(actor.iam_conn.get_server_certificate.call_count, 2)
+
     @testing.gen_test
     def test_get_cert_arn_fail(self):
         actor = elb_actor.SetCert(
@@ -466,3 +488,25 @@ class TestSetCert(testing.AsyncTestCase):
 
         self.assertEquals(actor._check_access._call_count, 1)
         self.assertEquals(actor._use_cert._call_count, 0)
+
+    @testing.gen_test
+    def test_execute_dry_unpublished(self):
+        actor = elb_actor.SetCert(
+            'Unit Test', {'name': 'unit-test',
+                          'region': 'us-east-1',
+                          'cert_name': '{@cert.arn}'},
+            dry=True)
+
+        actor._find_elb = helper.mock_tornado(mock.Mock())
+        actor._get_cert_arn = helper.mock_tornado('arn')
+        actor._check_access = helper.mock_tornado()
+        actor._use_cert = helper.mock_tornado()
+
+        needed = yield actor.needs_execution()
+        self.assertTrue(needed)
+        yield actor.execute()
+
+        # The cert was not uploaded for real, so it can't be looked up
+        self.assertEquals(actor._get_cert_arn._call_count, 0)
+        self.assertEquals(actor._check_access._call_count, 1)
+        self.assertEquals(actor._use_cert._call_count, 0)
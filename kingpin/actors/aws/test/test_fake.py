@@ -0,0 +1,176 @@
+import logging
+import tempfile
+
+from boto.exception import BotoServerError
+from tornado import testing
+import boto.sqs
+
+from kingpin.actors import group
+from kingpin.actors.aws import base
+from kingpin.actors.aws import elb as elb_actor
+from kingpin.actors.aws import fake
+from kingpin.actors.aws import iam
+from kingpin.actors.aws import settings
+from kingpin.actors.support import fake as support_fake
+from kingpin.actors.support import runtime
+
+log = logging.getLogger(__name__)
+
+
+class TestFakeAWS(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestFakeAWS, self).setUp()
+        settings.RETRYING_SETTINGS = {'stop_max_attempt_number': 1}
+        reload(base)
+        self.behavior = support_fake.Behavior(latency=0, error_rate=0,
+                                              throttle_rate=0)
+        self.backend = fake.install(self.behavior)
+        self.actor = base.AWSBaseActor('Unit', {'region': 'us-west-2'})
+
+    def tearDown(self):
+        fake.uninstall()
+        super(TestFakeAWS, self).tearDown()
+
+    def test_uninstall(self):
+        fake.uninstall()
+        self.assertNotEquals(boto.sqs.connect_to_region.__module__,
+                             fake.__name__)
+
+    @testing.gen_test
+    def test_find_elb(self):
+        self.backend.add_elb('unit', instances=['i-1'])
+        elb = yield self.actor._find_elb('unit')
+        self.assertEquals(elb.name, 'unit')
+
+        health = yield self.actor.thread(elb.get_instance_health)
+        self.assertEquals([(h.instance_id, h.state) for h in health],
+                          [('i-1', 'InService')])
+
+        with self.assertRaises(base.ELBNotFound):
+            yield self.actor._find_elb('missing')
+
+    @testing.gen_test
+    def test_register_instances(self):
+        elb = self.backend.add_elb('unit')
+        yield self.actor.thread(elb.register_instances, ['i-2'])
+        self.assertEquals(elb.instances, ['i-2'])
+
+        # New instances take a few polls to come into service
+        states = []
+        for i in range(2):
+            health = yield self.actor.thread(elb.get_instance_health)
+            states.append(health[0].state)
+        self.assertEquals(states, ['OutOfService', 'InService'])
+
+        yield self.actor.thread(elb.deregister_instances, ['i-2'])
+        health = yield self.actor.thread(elb.get_instance_health)
+        self.assertEquals(health, [])
+
+    @testing.gen_test
+    def test_set_cert(self):
+        elb = self.backend.add_elb(
+            'unit', listeners=[(443, 80, 'HTTPS', 'HTTP', '')])
+        yield self.actor.thread(
+            self.actor.iam_conn.upload_server_cert, 'cert', 'body', 'key')
+        arn = self.backend.certs['cert']['arn']
+
+        yield self.actor.thread(elb.set_listener_SSL_certificate, 443, arn)
+        self.assertEquals(elb.listeners[0][4], arn)
+
+        with self.assertRaises(BotoServerError) as e:
+            yield self.actor.thread(elb.set_listener_SSL_certificate, 443, '')
+        self.assertEquals(e.exception.error_code, 'CertificateNotFound')
+
+    @testing.gen_test
+    def test_upload_and_set_cert(self):
+        # The example from the "Runtime Tokens" docs. The actors have to
+        # subclass the freshly reloaded base.
+        reload(iam)
+        reload(elb_actor)
+        elb = self.backend.add_elb(
+            'prod-elb', listeners=[(443, 80, 'HTTPS', 'HTTP', '')])
+        key = tempfile.NamedTemporaryFile()
+        config = {'acts': [
+            {'desc': 'Upload the cert', 'actor': 'aws.iam.UploadCert',
+             'id': 'cert',
+             'options': {'name': 'new-cert', 'public_key_path': key.name,
+                         'private_key_path': key.name}},
+            {'desc': 'Use the cert', 'actor': 'aws.elb.SetCert',
+             'options': {'name': 'prod-elb', 'region': 'us-west-2',
+                         'cert_name': '{@cert.arn}'}}]}
+        self.addCleanup(runtime.reset)
+
+        # Nothing is uploaded (or published) in the dry run, so SetCert must
+        # not go looking for a cert named "{@cert.arn}"
+        yield group.Sync('Dry', config, dry=True).execute()
+        self.assertEquals(self.backend.certs, {})
+        self.assertEquals(elb.listeners[0][4], '')
+
+        yield group.Sync('Real', config).execute()
+        arn = self.backend.certs['new-cert']['arn']
+        self.assertEquals(runtime.get('cert.arn'), arn)
+        self.assertEquals(elb.listeners[0][4], arn)
+
+    @testing.gen_test
+    def test_stack_lifecycle(self):
+        cf_conn = self.actor.cf_conn
+        yield self.actor.thread(cf_conn.create_stack, 'unit',
+                                template_body='{}')
+        with self.assertRaises(BotoServerError):
+            yield self.actor.thread(cf_conn.create_stack, 'unit')
+
+        statuses = []
+        for i in range(2):
+            stacks = yield self.actor.thread(cf_conn.list_stacks)
+            statuses.append(stacks[0].stack_status)
+        self.assertEquals(statuses, ['CREATE_IN_PROGRESS', 'CREATE_COMPLETE'])
+
+        yield self.actor.thread(cf_conn.delete_stack, 'unit')
+        for i in range(2):
+            stacks = yield self.actor.thread(
+                cf_conn.list_stacks, stack_status_filters=['DELETE_COMPLETE'])
+        self.assertEquals(stacks[0].stack_name, 'unit')
+
+    @testing.gen_test
+    def test_validate_template(self):
+        with self.assertRaises(BotoServerError) as e:
+            yield self.actor.thread(self.actor.cf_conn.validate_template,
+                                    template_body='not json')
+        self.assertEquals(e.exception.status, 400)
+
+    @testing.gen_test
+    def test_queues(self):
+        self.backend.add_queue('unit-1', messages=3)
+        sqs_conn = self.actor.sqs_conn
+        created = yield self.actor.thread(sqs_conn.create_queue, 'unit-2')
+        self.assertTrue(isinstance(created, boto.sqs.queue.Queue))
+
+        queues = yield self.actor.thread(sqs_conn.get_all_queues)
+        self.assertEquals([q.name for q in queues], ['unit-1', 'unit-2'])
+
+        # Queues drain after a few polls
+        counts = []
+        for i in range(2):
+            count = yield self.actor.thread(queues[0].count)
+            counts.append(count)
+        self.assertEquals(counts, [3, 0])
+
+        ok = yield self.actor.thread(sqs_conn.delete_queue, queues[0])
+        self.assertTrue(ok)
+        self.assertEquals(sorted(self.backend.queues), ['unit-2'])
+
+    @testing.gen_test
+    def test_throttling(self):
+        self.behavior.throttle_rate = 1
+        with self.assertRaises(BotoServerError) as e:
+            yield self.actor.thread(self.actor.ec2_conn.get_all_zones)
+        self.assertEquals(e.exception.error_code, 'Throttling')
+
+    @testing.gen_test
+    def test_errors(self):
+        self.behavior.error_rate = 1
+        with self.assertRaises(BotoServerError) as e:
+            yield self.actor.thread(self.actor.iam_conn.get_server_certificate,
+                                    'unit')
+        self.assertEquals(e.exception.status, 500)
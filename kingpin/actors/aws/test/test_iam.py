@@ -32,10 +32,15 @@ class TestUploadCert(testing.AsyncTestCase):
         actor.iam_conn = mock.Mock()
 
         actor.readfile = mock.Mock()
-        actor.iam_conn.upload_server_cert.side_effect = [
-            None
+        actor.iam_conn.upload_server_cert.side_effect = [{
+            'upload_server_certificate_response': {
+                'upload_server_certificate_result': {
+                    'server_certificate_metadata': {
+                        'arn': 'arn:unit-test'}}}}
         ]
+        actor.publish = mock.Mock()
         yield actor._execute()
+        actor.publish.assert_called_once_with('arn', 'arn:unit-test')
 
         # call count is 1 -- one extra retry due to BotoServerError above.
         self.assertEquals(actor.iam_conn.upload_server_cert.call_count, 1)
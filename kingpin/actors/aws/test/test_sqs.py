@@ -71,6 +71,23 @@ class TestCreateSQSQueueActor(SQSTestCase):
         self.assertEquals(ret, None)
         self.sqs_conn().create_queue.assert_called_once_with('unit-test-queue')
 
+    @testing.gen_test
+    def test_needs_execution(self):
+        self.actor = sqs.Create('Unit Test Action',
+                                {'name': 'unit-test-queue',
+                                 'region': 'us-west-2'})
+        q = mock.Mock()
+        q.name = 'unit-test-queue-2'
+        self.sqs_conn().get_all_queues.return_value = [q]
+        needed = yield self.actor.needs_execution()
+        self.assertTrue(needed)
+        self.sqs_conn().get_all_queues.assert_called_once_with(
+            'unit-test-queue')
+
+        q.name = 'unit-test-queue'
+        needed = yield self.actor.needs_execution()
+        self.assertFalse(needed)
+
     @testing.gen_test
     def test_execute_dry(self):
         self.actor = sqs.Create('Unit Test Action',
@@ -31,6 +31,8 @@ any live changes. It is up to the developer of the Actor to define what
 'dry' mode looks like for that particular action.
 """
 
+import datetime
+import itertools
 import json
 import logging
 import os
@@ -40,9 +42,16 @@ import time
 from tornado import gen
 from tornado import httpclient
 from tornado import httputil
+from tornado import stack_context
 
 from kingpin import utils
 from kingpin.actors import exceptions
+from kingpin.actors.support import cancel
+from kingpin.actors.support import checkpoint
+from kingpin.actors.support import journal
+from kingpin.actors.support import runtime
+from kingpin.actors.support import trace
+from kingpin.actors.support import transport
 from kingpin.constants import REQUIRED
 
 log = logging.getLogger(__name__)
@@ -61,13 +70,69 @@ if os.getenv('URLLIB_DEBUG', None):
 # environment variable
 DEFAULT_TIMEOUT = os.getenv('DEFAULT_TIMEOUT', 3600)
 
+# Source of the run-unique BaseActor._id numbers
+_ACTOR_IDS = itertools.count(1)
+
+
+def check_condition(condition):
+    """Check if the `condition` of an actor allows it to run.
+
+    The only exception to simply casting the condition to bool is if it is a
+    string "False" or string "0".
+    """
+    try:  # Treat as string
+        value = condition.lower()
+        return value not in ('false', '0')
+    except AttributeError:  # Not a string
+        return bool(condition)
+
 
 class LogAdapter(logging.LoggerAdapter):
 
+    """Prefixes log messages with the (dry) description of the actor.
+
+    The stock Python 2.7 LoggerAdapter builds the prefixed message before the
+    logger checks whether the level is enabled at all. This adapter drops
+    messages for disabled levels first, and when the message has arguments
+    it leaves the prefix to the logging module too -- so nothing is formatted
+    unless a handler actually emits the record.
+    """
+
     def process(self, msg, kwargs):
         return ('[%s%s] %s' % (self.extra['dry'], self.extra['desc'], msg),
                 kwargs)
 
+    def log(self, level, msg, *args, **kwargs):
+        if not self.isEnabledFor(level):
+            return
+
+        if args:
+            msg = '[%s%s] ' + msg
+            args = (self.extra['dry'], self.extra['desc']) + args
+        else:
+            msg, kwargs = self.process(msg, kwargs)
+
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        kwargs['exc_info'] = 1
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        self.log(logging.CRITICAL, msg, *args, **kwargs)
+
 
 class BaseActor(object):
 
@@ -98,12 +163,13 @@ class BaseActor(object):
 
     # Ensure that at __init__ time, if the self._options dict is not completely
     # filled in properly (meaning there are no left-over {KEY}'s), we throw an
-    # exception. This will change in the future when we have some concept of a
-    # second 'global runtime context object'.
+    # exception. Values that only exist at runtime are referenced with the
+    # {@ID.NAME} tokens of the runtime context instead, which are filled in
+    # right before the actor executes.
     strict_init_context = True
 
     def __init__(self, desc, options, dry=False, warn_on_failure=False,
-                 condition=True, init_context={}, timeout=None):
+                 condition=True, init_context={}, timeout=None, id=None):
         """Initializes the Actor.
 
         Args:
@@ -118,7 +184,10 @@ class BaseActor(object):
                 time to replace {KEY} strings in the actor definition.
                 This is usually driven by the group.Sync/Async actors.
             timeout: (Str/Int/Float) Timeout in seconds for the actor.
+            id: (Str) Name that the values this actor publishes are
+                published under (see publish()).
         """
+        self._id = next(_ACTOR_IDS)
         self._type = '%s.%s' % (self.__module__, self.__class__.__name__)
         self._desc = desc
         self._options = options
@@ -126,13 +195,20 @@ class BaseActor(object):
         self._warn_on_failure = warn_on_failure
         self._condition = condition
         self._init_context = init_context
+        self._act_id = id
+
+        # The values published by this actor (see publish())
+        self._outputs = {}
 
         self._timeout = timeout
         if timeout is None:
             self._timeout = self.default_timeout
 
-        # strict about this -- but in the future, when we have a
-        # runtime_context object, we may loosen this restriction).
+        # Result of the last probe() -- None until the actor is probed
+        self._needs_execution = None
+
+        # strict about this -- values that only exist at runtime come from the
+        # runtime context instead, see _fill_in_runtime_context()).
         self._fill_in_contexts(context=self._init_context,
                                strict=self.strict_init_context)
 
@@ -142,8 +218,10 @@ class BaseActor(object):
 
         # Fill in any options with the supplied initialization context. Be
         self.log.debug('Initialized (warn_on_failure=%s, '
-                       'strict_init_context=%s)' %
-                       (warn_on_failure, self.strict_init_context))
+                       'strict_init_context=%s)',
+                       warn_on_failure, self.strict_init_context)
+        self._checkpoint_key = checkpoint.key(self)
+        journal.actor_initialized(self)
 
     def _setup_log(self):
         """Create a customized logging object based on the LogAdapter."""
@@ -177,7 +255,7 @@ class BaseActor(object):
                     for (opt_name, definition) in self.all_options.items()
                     if definition[1] is REQUIRED]
 
-        self.log.debug('Checking for required options: %s' % required)
+        self.log.debug('Checking for required options: %s', required)
         option_errors = []
         option_warnings = []
         for opt in required:
@@ -239,6 +317,10 @@ class BaseActor(object):
         out in debug statements. Used primarily for tracking Actor execute()
         methods, but can be used elsewhere as well.
 
+        When tracing is enabled (see `kingpin.actors.support.trace`), the
+        call is also recorded as a Span, which is the "current" span for all
+        of the work done on its behalf.
+
         Example usage:
             >>> @gen.coroutine
             ... @timer()
@@ -249,14 +331,26 @@ class BaseActor(object):
         def _wrap_in_timer(self, *args, **kwargs):
             # Log the start time
             start_time = time.time()
-
-            # Begin the execution
-            ret = yield gen.coroutine(f)(self, *args, **kwargs)
+            span = trace.start_span(self)
+
+            # Begin the execution. The StackContext must be exited before we
+            # yield, so only the creation of the Future happens inside of it.
+            if span is None:
+                ret = yield gen.coroutine(f)(self, *args, **kwargs)
+            else:
+                with stack_context.StackContext(span.activate):
+                    fut = gen.coroutine(f)(self, *args, **kwargs)
+                try:
+                    ret = yield fut
+                except Exception as e:
+                    span.finish(error=e)
+                    raise
+                span.finish()
 
             # Log the finished execution time
             exec_time = "%.2f" % (time.time() - start_time)
-            self.log.debug('%s.%s() execution time: %ss' %
-                           (self._type, f.__name__, exec_time))
+            self.log.debug('%s.%s() execution time: %ss',
+                           self._type, f.__name__, exec_time)
 
             raise gen.Return(ret)
         return _wrap_in_timer
@@ -269,45 +363,72 @@ class BaseActor(object):
         ActorTimedOut exception if an actor takes too long to execute.
 
         *Note, Tornado 4+ does not allow you to actually kill a task on the
-        IOLoop.*  This means that all we are doing here is notifying the caller
-        (through the raised exception) that a problem has happened.
-
-        Fairly simple Actors should actually 'stop executing' when this
-        exception is raised. Complex actors with very unique behaviors though
-        (like the rightsacle.server_array.Execute actor) have the ability to
-        continue to execute in the background until the Kingpin application
-        quits. It is not the job of this method to try to kill these actors,
-        but just to let the user know that a failure has happened.
+        IOLoop.*  Instead, the execution runs under a
+        `kingpin.actors.support.cancel.Token`, which is cancelled when the
+        deadline passes (or the execution fails). The sleeps, retries and API
+        polls of the actor -- and of any actors it started -- check the token
+        and stop with an ActorCancelled exception, rather than running in the
+        background until the Kingpin application quits.
+
+        The token also carries the deadline down to everything the actor
+        starts. An actor may run for its own timeout or for whatever time is
+        left of the timeouts of the groups around it, whichever is shorter --
+        and if that time is already up, the actor is not started at all.
         """
 
-        # Get our timeout setting, or fallback to the default
-        self.log.debug('%s.%s() deadline: %s(s)' %
-                       (self._type, f.__name__, self._timeout))
+        # Get our timeout setting, or fallback to the default. Timeouts of
+        # none (or 0) mean that only the deadlines of our parents apply.
+        timeout = float(self._timeout) if self._timeout else None
+        token = cancel.Token(parent=cancel.current(), timeout=timeout)
+        remaining = token.remaining()
+        self.log.debug('%s.%s() deadline: %s(s)',
+                       self._type, f.__name__, remaining)
+
+        if remaining is not None and remaining <= 0:
+            msg = ('%s.%s() not started, the deadline has already passed' %
+                   (self._type, f.__name__))
+            self.log.error(msg)
+            raise exceptions.ActorTimedOut(msg)
 
         # Get our Future object but don't yield on it yet, This starts the
         # execution, but allows us to wrap it below with the
-        # 'gen.with_timeout' function.
-        fut = f(*args, **kwargs)
-
-        # If no timeout is set (none, or 0), then we just yield the Future and
-        # return its results.
-        if not self._timeout:
-            ret = yield fut
-            raise gen.Return(ret)
+        # 'gen.with_timeout' function. The StackContext must be exited before
+        # we yield, so only the creation of the Future happens inside of it.
+        with stack_context.StackContext(token.activate):
+            fut = f(*args, **kwargs)
 
-        # Generate a timestamp in the future at which point we will raise
-        # an alarm if the actor is still executing
-        deadline = time.time() + float(self._timeout)
-
-        # Now we yield on the gen_with_timeout function
         try:
-            ret = yield gen.with_timeout(
-                deadline, fut, quiet_exceptions=(exceptions.ActorTimedOut))
-        except gen.TimeoutError:
-            msg = ('%s.%s() execution exceeded deadline: %ss' %
-                   (self._type, f.__name__, self._timeout))
-            self.log.error(msg)
-            raise exceptions.ActorTimedOut(msg)
+            # If there is no deadline at all, then we just yield the Future
+            # and return its results.
+            if remaining is None:
+                ret = yield fut
+                raise gen.Return(ret)
+
+            # Now we yield on the gen_with_timeout function, which raises an
+            # alarm if the actor is still executing when the time is up.
+            try:
+                ret = yield gen.with_timeout(
+                    datetime.timedelta(seconds=remaining), fut,
+                    quiet_exceptions=(exceptions.ActorTimedOut,
+                                      exceptions.ActorCancelled))
+            except (gen.TimeoutError,
+                    exceptions.RecoverableActorFailure) as e:
+                # The sleeps and polls of the actor (or the acts of a group,
+                # which share its deadline) may notice that the deadline has
+                # passed just before gen.with_timeout() does.
+                if (not isinstance(e, gen.TimeoutError) and
+                        token.remaining() > 0):
+                    raise
+                msg = ('%s.%s() execution exceeded deadline: %.2fs' %
+                       (self._type, f.__name__, remaining))
+                self.log.error(msg)
+                raise exceptions.ActorTimedOut(msg)
+        except gen.Return:
+            raise
+        except Exception as e:
+            # Whatever this execution started is no longer needed.
+            token.cancel('%s: %s' % (self._desc, e))
+            raise
 
         raise gen.Return(ret)
 
@@ -318,15 +439,112 @@ class BaseActor(object):
         The only exception to simply casting this variable to bool is if
         the value of self._condition is a string "False" or string "0".
         """
+        return check_condition(self._condition)
+
+    @gen.coroutine
+    def needs_execution(self):
+        """Probes whether executing this actor would change anything.
+
+        Actors that can cheaply tell that their target state already holds
+        (ie, the ELB already uses the cert) override this method and return
+        False in that case. The probe must not make any changes, and runs in
+        both the dry and the real run.
+
+        Raises:
+            gen.Return(True) unless it is known that nothing needs doing.
+        """
+        raise gen.Return(True)
+
+    @gen.coroutine
+    def probe(self):
+        """Runs the needs_execution() probe and remembers the answer.
+
+        Actors that are not going to run (because of their condition) are
+        not probed. A probe that fails is treated as "needs execution", so
+        that the failure is reported by the real execution.
+
+        Raises:
+            gen.Return(<Boolean result of the probe>)
+        """
+        if not self._check_condition():
+            raise gen.Return(True)
+
+        try:
+            self._fill_in_runtime_context(strict=False)
+            needed = yield self.needs_execution()
+        except Exception as e:
+            self.log.debug('Probe failed, assuming execution is needed: %s',
+                           e)
+            needed = True
 
-        try:  # Treat as string
-            value = self._condition.lower()
-            check = (value not in ('false', '0'))
-        except AttributeError:  # Not a string
-            value = self._condition
-            check = bool(value)
+        self._needs_execution = bool(needed)
+        raise gen.Return(self._needs_execution)
 
-        return check
+    def publish(self, name, value):
+        """Publishes a value in the runtime context, for later actors to use.
+
+        Actors publish whatever they created or resolved that a later actor
+        would otherwise have to look up again (ie, an href or an ARN). The
+        value is published as `<id>.<name>`, and later actors refer to it
+        with a `{@<id>.<name>}` token. Nothing is published for actors that
+        have no `id`.
+
+        Args:
+            name: Name of the value, unique within the actor
+            value: A string (or number)
+
+        Raises:
+            exceptions.InvalidOptions: if another actor (with the same `id`)
+                                       already published this value.
+        """
+        if self._act_id is None:
+            return
+
+        # The rehearsal and the real run create separate actors, so a real
+        # actor may replace what its dry counterpart published.
+        name = '%s.%s' % (self._act_id, name)
+        owner = runtime.publisher(name)
+        if (owner is not None and owner is not self and
+                owner._dry == self._dry):
+            raise exceptions.InvalidOptions(
+                'Another actor already published %s. Every actor needs an '
+                'id of its own (ie, "clone-{ARRAY}" in a group with '
+                'contexts).' % name)
+
+        self._outputs[name] = value
+        runtime.publish(name, value, publisher=self)
+
+    def _unpublished(self, option):
+        """Whether an option still holds {@TOKEN}s of the runtime context.
+
+        That only happens in a dry run, where the actors that would have
+        published the values did not really run. Actors that look up (or
+        check) the value of such an option should skip that in a dry run.
+
+        Args:
+            option: Name of the option
+        """
+        return bool(runtime.find_tokens(self.option(option)))
+
+    def _fill_in_runtime_context(self, strict=True):
+        """Fills in the {@TOKEN}s of the runtime context in self._options.
+
+        Args:
+            strict: bool whether to raise an exception for tokens that
+                    nothing was published for, or to just leave them.
+
+        Returns:
+            The names of the tokens that were left in place.
+
+        Raises:
+            exceptions.InvalidOptions
+        """
+        self._options = runtime.fill_in(self._options)
+        missing = runtime.find_tokens(self._options)
+        if missing and strict:
+            raise exceptions.InvalidOptions(
+                'Nothing was published for runtime tokens: %s' % missing)
+        return missing
 
     def _fill_in_contexts(self, context={}, strict=True):
         """Parses self._options and updates it with the supplied context.
@@ -354,6 +572,20 @@ class BaseActor(object):
             msg = 'Context for description failed: %s' % e
             raise exceptions.InvalidOptions(msg)
 
+        # The acts of a group with several contexts need an id per context
+        # (ie, "clone-{ARRAY}") to publish their values under.
+        if self._act_id is not None:
+            try:
+                self._act_id = utils.populate_with_tokens(
+                    self._act_id,
+                    context,
+                    self.left_context_separator,
+                    self.right_context_separator,
+                    strict=strict)
+            except LookupError as e:
+                msg = 'Context for id failed: %s' % e
+                raise exceptions.InvalidOptions(msg)
+
         # Convert our self._options dict into a string for fast parsing
         options_string = json.dumps(self._options)
 
@@ -403,12 +635,34 @@ class BaseActor(object):
         result = None
 
         if not self._check_condition():
-            self.log.warning('Skipping execution. Condition: %s' %
+            self.log.warning('Skipping execution. Condition: %s',
                              self._condition)
+            trace.set_result(trace.SKIPPED)
+            raise gen.Return()
+
+        if checkpoint.is_completed(self):
+            self.log.info('Skipping execution. Completed in a previous run.')
+            trace.set_result(trace.SKIPPED)
+            raise gen.Return()
+
+        if self._needs_execution is False:
+            self.log.info('Skipping execution. Nothing needs to change.')
+            trace.set_result(trace.SKIPPED)
             raise gen.Return()
 
         try:
+            # In a dry run, the actors that would publish these values did
+            # not create anything, so they usually did not publish either.
+            missing = self._fill_in_runtime_context(strict=not self._dry)
+            if missing:
+                self.log.info('Runtime tokens %s are not filled in until the '
+                              'real run', missing)
             result = yield self.timeout(self._execute)
+        except exceptions.ActorCancelled as e:
+            # Whoever started this execution has already given up on it (and
+            # reported why), so this is not worth more than a warning.
+            self.log.warning(e)
+            raise
         except exceptions.ActorException as e:
             # If exception is not RecoverableActorFailure
             # or if warn_on_failure is not set, then escalate.
@@ -418,10 +672,11 @@ class BaseActor(object):
                 raise
 
             # Otherwise - flag this failure as a warning, and continue
+            trace.set_result(trace.WARNING)
             self.log.warning(e)
             self.log.warning(
                 'Continuing execution even though a failure was '
-                'detected (warn_on_failure=%s)' % self._warn_on_failure)
+                'detected (warn_on_failure=%s)', self._warn_on_failure)
         except Exception as e:
             # We don't like general exception catch clauses like this, but
             # because actors can be written by third parties and automatically
@@ -430,17 +685,49 @@ class BaseActor(object):
             # warning.
             log.critical('Unexpected exception caught! '
                          'Please contact the author (%s) and provide them '
-                         'with this stacktrace' %
+                         'with this stacktrace',
                          sys.modules[self.__module__].__author__)
             self.log.exception(e)
             raise exceptions.ActorException(e)
         else:
-            self.log.debug('Finished successfully, return value: %s' % result)
+            self.log.debug('Finished successfully, return value: %s', result)
+            checkpoint.record(self)
 
         # If we got here, we're exiting the actor cleanly and moving on.
         raise gen.Return(result)
 
 
+class Disabled(BaseActor):
+
+    """Stands in for an actor whose condition is false.
+
+    The condition of an actor can't change after it is created, so an actor
+    whose condition is false will never run. Building it anyways is wasted
+    work: a disabled group would build every actor in its tree, and AWS and
+    RightScale actors create their API clients when they are built.
+    `kingpin.actors.utils.get_actor` creates this placeholder instead, which
+    only logs that the actor was skipped.
+
+    **Options**
+
+    :actor:
+      Name of the actor that was not built.
+    """
+
+    all_options = {
+        'actor': (str, REQUIRED, 'Name of the actor that was not built.')
+    }
+
+    # The context tokens of the disabled actor may be meant for its children,
+    # which are never built.
+    strict_init_context = False
+
+    @gen.coroutine
+    def _execute(self):
+        # Never called, execute() skips actors whose condition is false.
+        raise gen.Return()
+
+
 class HTTPBaseActor(BaseActor):
 
     """Abstract base class for an HTTP-client based Actor object.
@@ -458,7 +745,8 @@ class HTTPBaseActor(BaseActor):
     def _get_http_client(self):
         """Returns an asynchronous web client object
 
-        The object is actually of type SimpleAsyncHTTPClient
+        The implementation (curl or simple) and its connection limits are
+        configured process-wide in `kingpin.actors.support.transport`.
         """
         return httpclient.AsyncHTTPClient()
 
@@ -503,7 +791,7 @@ class HTTPBaseActor(BaseActor):
 
         # Now generate the URL
         full_url = httputil.url_concat(url, sorted(args.items()))
-        self.log.debug('Generated URL: %s' % full_url)
+        self.log.debug('Generated URL: %s', full_url)
 
         return full_url
 
@@ -511,18 +799,37 @@ class HTTPBaseActor(BaseActor):
     # garbled data (ie, maybe a 500 errror or something else thats not in
     # JSON format, we should back off and try again.
     @gen.coroutine
-    def _fetch(self, url, post=None, auth_username=None, auth_password=None):
+    def _fetch(self, url, post=None, auth_username=None, auth_password=None,
+               decoder=json.loads, streaming_callback=None, cache=False):
         """Executes a web request asynchronously and yields the body.
 
+        By default the response body is parsed as JSON. Pass in a different
+        `decoder` (ie, `str` to get the raw body back) for endpoints that
+        return something else.
+
+        For very large responses, pass in a `streaming_callback` instead.
+        Each chunk of the body is handed to it as it arrives, the body is
+        never buffered in memory, and nothing is returned.
+
+        Requests that have no side effects (like credential checks) can set
+        `cache`. Identical requests from any actor then share one response
+        for a few minutes (see `kingpin.actors.support.transport.fetch()`).
+
         Args:
             url: (Str) The full url path of the API call
             post: (Str) POST body data to submit (if any)
             auth_username: (str) HTTP auth username
             auth_password: (str) HTTP auth password
+            decoder: Callable that turns the response body into the return
+                     value. Should raise ValueError if it cannot.
+            streaming_callback: Callable that receives each chunk of the
+                                response body.
+            cache: (Bool) Whether the response may be shared with identical
+                   requests.
         """
 
         # Generate the full request URL and log out what we're doing...
-        self.log.debug('Making HTTP request to %s with data: %s' % (url, post))
+        self.log.debug('Making HTTP request to %s with data: %s', url, post)
 
         # Create the http_request object
         http_client = self._get_http_client()
@@ -534,18 +841,25 @@ class HTTPBaseActor(BaseActor):
             auth_username=auth_username,
             auth_password=auth_password,
             follow_redirects=True,
-            max_redirects=10)
+            max_redirects=10,
+            streaming_callback=streaming_callback,
+            **transport.request_options())
 
         # Execute the request and raise any exception. Exceptions are not
         # caught here because they are unique to the API endpoints, and thus
         # should be handled by the individual Actor that called this method.
-        http_response = yield http_client.fetch(http_request)
+        http_response = yield transport.fetch(
+            http_client, http_request, cache=cache)
+
+        # The body has already been handed off, chunk by chunk.
+        if streaming_callback:
+            raise gen.Return()
 
         try:
-            body = json.loads(http_response.body)
+            body = decoder(http_response.body)
         except ValueError as e:
             raise exceptions.UnparseableResponseFromEndpoint(
-                'Unable to parse response from remote API as JSON: %s' % e)
+                'Unable to parse response from remote API: %s' % e)
 
         # Receive a successful return
         raise gen.Return(body)
@@ -56,6 +56,11 @@ class ActorTimedOut(RecoverableActorFailure):
     """Raised when an Actor takes too long to execute"""
 
 
+class ActorCancelled(RecoverableActorFailure):
+
+    """Raised when an Actor's execution was abandoned (ie, it timed out)"""
+
+
 class InvalidActor(UnrecoverableActorFailure):
 
     """Raised when an invalid Actor name was supplied"""
@@ -18,11 +18,33 @@
 
 Group a series of other `BaseActor` into either synchronous
 or asynchronous stages.
+
+**Skipping satisfied actors**
+
+When ``SKIP_SATISFIED`` is set (``kingpin --skip-satisfied``), the outermost
+group first runs the `kingpin.actors.base.BaseActor.needs_execution` probe
+of every actor in its tree, all in parallel. Actors whose target state
+already holds are then skipped. Because an actor can change the state that a
+later actor's probe looked at, a `Sync` group probes each of its acts again
+once an earlier act has actually executed, and a `Graph` group probes an act
+again once its dependencies finished.
+
+**Parallel dry runs**
+
+A dry run makes no changes, so the order of the acts of a `Sync` group does
+not matter in it. When ``PARALLEL_DRY`` is set to a number (``kingpin
+--parallel-dry=N``), dry `Sync` groups validate all of their acts at the same
+time instead, with at most ``N`` (non-group) acts running at once across the
+whole tree. The errors are collected and reported just like in a sequential
+dry run.
 """
 
 import logging
+import math
+import os
 
 from tornado import gen
+from tornado import locks
 
 from kingpin.actors import base
 from kingpin.actors import exceptions
@@ -33,6 +55,24 @@ log = logging.getLogger(__name__)
 
 __author__ = 'Matt Wise <matt@nextdoor.com>'
 
+# Probe the whole tree, and skip the actors that have nothing to do
+SKIP_SATISFIED = bool(os.getenv('SKIP_SATISFIED', False))
+
+# Number of acts that dry Sync groups may run at the same time (0 runs them
+# one after the other)
+PARALLEL_DRY = int(os.getenv('PARALLEL_DRY', 0))
+
+# The (PARALLEL_DRY, Semaphore) that limits the parallel dry runs
+_DRY_SLOTS = (None, None)
+
+
+def _get_dry_slots():
+    """Returns the Semaphore shared by all of the parallel dry runs."""
+    global _DRY_SLOTS
+    if _DRY_SLOTS[0] != PARALLEL_DRY:
+        _DRY_SLOTS = (PARALLEL_DRY, locks.Semaphore(PARALLEL_DRY))
+    return _DRY_SLOTS[1]
+
 
 class BaseGroupActor(base.BaseActor):
 
@@ -74,6 +114,18 @@ class BaseGroupActor(base.BaseActor):
         # Pre-initialize all of our actions!
         self._actions = self._build_actions()
 
+    def _fill_in_runtime_context(self, strict=True):
+        """Leaves the {@TOKEN}s in our options alone.
+
+        Our options are the definitions of the acts, which were built long
+        ago. Their tokens belong to the acts, and each act fills them in right
+        before it executes -- after the acts ahead of it have published.
+
+        Returns:
+            An empty list
+        """
+        return []
+
     def _build_actions(self):
         """Builds either a single set of actions, or multiple sets.
 
@@ -96,7 +148,7 @@ class BaseGroupActor(base.BaseActor):
         for context in self.option('contexts'):
             combined_context = dict(self._init_context.items() +
                                     context.items())
-            self.log.debug('Building acts with parameters: %s' %
+            self.log.debug('Building acts with parameters: %s',
                            combined_context)
             for action in self._build_action_group(context=combined_context):
                 actions.append(action)
@@ -139,6 +191,15 @@ class BaseGroupActor(base.BaseActor):
                 wrapper_base = exceptions.UnrecoverableActorFailure
         return wrapper_base
 
+    @gen.coroutine
+    def needs_execution(self):
+        """Probes all of the acts in parallel.
+
+        A group needs to execute if any one of its acts does.
+        """
+        needed = yield [act.probe() for act in self._actions]
+        raise gen.Return(any(needed))
+
     @gen.coroutine
     def _execute(self):
         """Executes the actions configured, and returns.
@@ -148,7 +209,11 @@ class BaseGroupActor(base.BaseActor):
         If an actor execution fails in _run_actions(), then that exception is
         raised up the stack.
         """
-        self.log.info('Beginning %s actions' % len(self._actions))
+        # The outermost group probes the whole tree before anything runs.
+        if SKIP_SATISFIED and self._needs_execution is None:
+            yield self.probe()
+
+        self.log.info('Beginning %s actions', len(self._actions))
         yield self._run_actions()
         raise gen.Return()
 
@@ -171,6 +236,14 @@ class Sync(BaseGroupActor):
       actor defined in ``acts`` will be instantiated once for each item in the
       ``contexts`` list.
 
+    :pipeline:
+      Pipeline the ``contexts`` through the ``acts``, like an assembly line:
+      each act is a *stage*, and the next context enters a stage as soon as
+      the previous context has left it. The acts of each single context still
+      run in order. ``true`` lets one context into each stage at a time, and a
+      number ``N`` lets up to ``N`` contexts into each stage at a time.
+      (default: ``false``)
+
     **Timeouts**
 
     Timeouts are disabled specifically in this actor. The sub-actors can still
@@ -212,6 +285,40 @@ class Sync(BaseGroupActor):
          }
        }
 
+    Relaunches several arrays, one after the other. While the second array
+    is renamed, the first one is already being cloned, and so on:
+
+    .. code-block:: json
+
+       { "desc": "Rolling relaunch",
+         "actor": "group.Sync",
+         "options": {
+           "pipeline": true,
+           "contexts": [
+             { "ARRAY": "first" },
+             { "ARRAY": "second" },
+             { "ARRAY": "third" }
+           ],
+           "acts": [
+             { "desc": "Rename {ARRAY} to {ARRAY}.orig",
+               "actor": "rightscale.server_array.Update",
+               "options": {
+                 "array": "{ARRAY}",
+                 "params": { "name": "{ARRAY}.orig" }
+               }
+             },
+             { "desc": "Clone {ARRAY}.orig to {ARRAY}",
+               "actor": "rightscale.server_array.Clone",
+               "options": { "source": "{ARRAY}.orig", "dest": "{ARRAY}" }
+             },
+             { "desc": "Launch {ARRAY}",
+               "actor": "rightscale.server_array.Launch",
+               "options": { "array": "{ARRAY}", "enable": true }
+             }
+           ]
+         }
+       }
+
     **Dry Mode**
 
     Passes on the Dry mode setting to the acts that are called. Does **not**
@@ -221,15 +328,78 @@ class Sync(BaseGroupActor):
     This provides the user with an insight to all the errors that are possible
     to encounter, rather than abort and quit on the first one.
 
+    With ``PARALLEL_DRY`` (``kingpin --parallel-dry=N``), the acts are all
+    validated at the same time (see above).
+
     **Failure**
 
     In the event that an act fails, this actor will return the failure
     immediately.  Because the acts are executed in-order of definition, the
     failure will prevent any further acts from executing.
 
+    With ``pipeline``, no more acts are started once one has failed, but the
+    acts of other contexts that are already running are allowed to finish
+    before the failure is returned.
+
     The behavior is different in the dry run (read above.)
     """
 
+    all_options = dict(BaseGroupActor.all_options, pipeline=(
+        (bool, int, str), False,
+        'Pipeline the contexts through the acts, with this many contexts '
+        'per act at a time.'))
+
+    def __init__(self, *args, **kwargs):
+        super(Sync, self).__init__(*args, **kwargs)
+        self._stage_limit = self._get_stage_limit()
+
+    def _get_stage_limit(self):
+        """Parses the pipeline option.
+
+        Returns:
+            The number of contexts allowed into each act at a time, or None
+            when the contexts are not pipelined.
+
+        Raises:
+            exceptions.InvalidOptions
+        """
+        value = self.option('pipeline')
+        if isinstance(value, basestring):
+            value = value.strip().lower()
+            if value in ('true', 'false'):
+                value = (value == 'true')
+
+        if value is None or value is False:
+            return None
+        if value is True:
+            return 1
+
+        try:
+            limit = int(value)
+        except ValueError:
+            limit = -1
+
+        if limit < 0:
+            raise exceptions.InvalidOptions(
+                'pipeline must be true, false or a number: %s' %
+                self.option('pipeline'))
+        return limit or None
+
+    @gen.coroutine
+    def _execute_act(self, act):
+        """Executes a single act, probing it again if needed.
+
+        With SKIP_SATISFIED, the probe of an act is out of date once any
+        act before it has run.
+        """
+        if SKIP_SATISFIED and self._changed:
+            yield act.probe()
+        if act._check_condition() and act._needs_execution is not False:
+            self._changed = True
+
+        self.log.debug('Beginning "%s"..', act._desc)
+        yield act.execute()
+
     @gen.coroutine
     def _run_actions(self):
         """Synchronously executes all of the Actor.execute() methods.
@@ -244,25 +414,109 @@ class Sync(BaseGroupActor):
 
         errors = []
 
+        # Whether any act has run -- the probes of the acts after it may be
+        # out of date.
+        self._changed = False
+
+        if self._dry and PARALLEL_DRY > 0:
+            yield self._run_parallel_dry(errors)
+            self._raise_errors(errors)
+            raise gen.Return()
+
+        if self._stage_limit and self.option('contexts'):
+            yield self._run_pipeline(errors)
+            self._raise_errors(errors)
+            raise gen.Return()
+
         for act in self._actions:
-            self.log.debug('Beginning "%s"..' % act._desc)
             try:
-                yield act.execute()
+                yield self._execute_act(act)
             except exceptions.ActorException as e:
                 if self._dry:
-                    self.log.error('%s failed: %s' % (act._desc, str(e)))
+                    self.log.error('%s failed: %s', act._desc, str(e))
                     self.log.warning('Continuing since this is a dry run.')
                     errors.append(e)
                 else:
                     self.log.error('Aborting sequential execution because '
-                                   '"%s" failed' % act._desc)
+                                   '"%s" failed', act._desc)
                     raise
 
+        self._raise_errors(errors)
+
+    def _raise_errors(self, errors):
         if errors:
             ExcType = self._get_exc_type(errors)
             raise ExcType('Exceptions raised by %s of %s actors in "%s".' % (
                           len(errors), len(self._actions), self._desc))
 
+    @gen.coroutine
+    def _run_parallel_dry(self, errors):
+        """Dry runs all of the acts at the same time.
+
+        The acts that are not groups take one of the PARALLEL_DRY slots while
+        they run. Group acts do not, because they would hold on to a slot
+        while their own acts wait for one.
+
+        Args:
+            errors: List that the raised ActorExceptions are appended to.
+        """
+        slots = _get_dry_slots()
+
+        @gen.coroutine
+        def run(act):
+            try:
+                if isinstance(act, BaseGroupActor):
+                    yield self._execute_act(act)
+                else:
+                    with (yield slots.acquire()):
+                        yield self._execute_act(act)
+            except exceptions.ActorException as e:
+                self.log.error('%s failed: %s', act._desc, str(e))
+                errors.append(e)
+
+        self.log.debug('Dry running %s acts in parallel', len(self._actions))
+        yield [run(act) for act in self._actions]
+
+    @gen.coroutine
+    def _run_pipeline(self, errors):
+        """Pipelines the contexts through the acts.
+
+        The actions are built one context after the other, so every
+        len(acts) actions belong to one context. Each context runs through
+        its own acts in order, and a Semaphore per act (stage) limits how
+        many contexts are in it at a time.
+
+        Args:
+            errors: List that the raised ActorExceptions are appended to. In
+                    a real run, no more acts are started after the first one.
+        """
+        width = len(self.option('acts'))
+        stages = [locks.Semaphore(self._stage_limit) for _ in range(width)]
+        rows = [self._actions[i:i + width]
+                for i in range(0, len(self._actions), width)]
+
+        @gen.coroutine
+        def run_context(row):
+            for stage, act in zip(stages, row):
+                with (yield stage.acquire()):
+                    if errors and not self._dry:
+                        raise gen.Return()
+                    try:
+                        yield self._execute_act(act)
+                    except exceptions.ActorException as e:
+                        errors.append(e)
+                        if not self._dry:
+                            self.log.error('Aborting pipelined execution '
+                                           'because "%s" failed', act._desc)
+                            raise gen.Return()
+                        self.log.error('%s failed: %s', act._desc, str(e))
+                        self.log.warning('Continuing since this is a dry '
+                                         'run.')
+
+        self.log.debug('Pipelining %s contexts through %s acts, %s at a '
+                       'time', len(rows), width, self._stage_limit)
+        yield [run_context(row) for row in rows]
+
 
 class Async(BaseGroupActor):
 
@@ -282,6 +536,12 @@ class Async(BaseGroupActor):
       actor defined in ``acts`` will be instantiated once for each item in the
       ``contexts`` list.
 
+    :fail_fast:
+      Stop waiting for the rest of the ``acts`` once enough of them have
+      failed. ``true`` gives up on the first failure, a number ``N`` after
+      ``N`` failures and a percentage (ie, ``"10%"``) once that share of the
+      ``acts`` has failed. (default: ``false``)
+
     **Timeouts**
 
     Timeouts are disabled specifically in this actor. The sub-actors can still
@@ -316,9 +576,37 @@ class Async(BaseGroupActor):
          }
        }
 
+    Clone several arrays, but give up as soon as half of them failed:
+
+    .. code-block:: json
+
+       { "desc": "Clone many arrays",
+         "actor": "group.Async",
+         "options": {
+           "fail_fast": "50%",
+           "contexts": [
+             { "ARRAY": "NewArray1" },
+             { "ARRAY": "NewArray2" },
+             { "ARRAY": "NewArray3" },
+             { "ARRAY": "NewArray4" }
+           ],
+           "acts": [
+             { "desc": "do something",
+               "actor": "server_array.Clone",
+               "options": {
+                 "source": "template",
+                 "dest": "{ARRAY}",
+               }
+             }
+           ]
+         }
+       }
+
     **Dry Mode**
 
     Passes on the Dry mode setting to the sub-actors that are called.
+    ``fail_fast`` is ignored in the dry run, so that all of the problems are
+    reported at once.
 
     **Failure**
 
@@ -326,8 +614,54 @@ class Async(BaseGroupActor):
     acts will return a failure to Kingpin. Because multiple actors are
     executing all at the same time, the all of these actors will be allowed to
     finish before the failure is returned.
+
+    With ``fail_fast``, the failure is returned as soon as the threshold is
+    reached instead. The ``acts`` that are still running are cancelled (see
+    `kingpin.actors.support.cancel`), and stop at their next poll or retry.
     """
 
+    all_options = dict(BaseGroupActor.all_options, fail_fast=(
+        (bool, int, str), False,
+        'Give up after this many (or this % of) failures.'))
+
+    def __init__(self, *args, **kwargs):
+        super(Async, self).__init__(*args, **kwargs)
+        self._fail_threshold = self._get_fail_threshold()
+
+    def _get_fail_threshold(self):
+        """Parses the fail_fast option.
+
+        Returns:
+            The number of failed acts after which to give up, or None to
+            wait for all of them.
+
+        Raises:
+            exceptions.InvalidOptions
+        """
+        value = self.option('fail_fast')
+        if isinstance(value, basestring):
+            value = value.strip().lower()
+            if value in ('true', 'false'):
+                value = (value == 'true')
+
+        try:
+            if value is None or value is False:
+                return None
+            if value is True:
+                return 1
+            if isinstance(value, basestring) and value.endswith('%'):
+                share = float(value[:-1]) / 100
+                return max(1, int(math.ceil(share * len(self._actions))))
+            threshold = int(value)
+        except ValueError:
+            threshold = -1
+
+        if threshold < 0:
+            raise exceptions.InvalidOptions(
+                'fail_fast must be true, false, a number or a percentage: '
+                '%s' % self.option('fail_fast'))
+        return threshold or None
+
     @gen.coroutine
     def _run_actions(self):
         """Asynchronously executes all of the Actor.execute() methods.
@@ -346,16 +680,31 @@ class Async(BaseGroupActor):
         for act in self._actions:
             tasks.append(act.execute())
 
-        # Now that we've fired them off, we walk through them one-by-one and
-        # check on their status. If they've raised an exception, we catch it
-        # and log it into a list for further processing.
+        # Now that we've fired them off, we walk through them as they finish
+        # and check on their status. If they've raised an exception, we catch
+        # it and log it into a list for further processing.
         errors = []
-        for t in tasks:
+        threshold = None if self._dry else self._fail_threshold
+        waiter = gen.WaitIterator(*tasks)
+        while not waiter.done():
             try:
-                yield t
+                yield waiter.next()
             except exceptions.ActorException as e:
                 errors.append(e)
 
+            if threshold and len(errors) >= threshold:
+                # Raising cancels the acts that are still running, through
+                # the cancel.Token of this execution. Nobody will look at
+                # their results anymore.
+                running = [t for t in tasks if not t.done()]
+                for t in running:
+                    t.add_done_callback(lambda f: f.exception())
+                self.log.error('Giving up on %s running actors after %s '
+                               'failure(s)', len(running), len(errors))
+                ExcType = self._get_exc_type(errors)
+                raise ExcType('%s of %s actors failed in "%s", aborted.' % (
+                              len(errors), len(self._actions), self._desc))
+
         # Now, if there are exceptions in the list, we generate the appropriate
         # exception type (recoverable vs unrecoverable), and raise it up the
         # stack. The individual exceptions are swallowed here, but thats OK
@@ -365,3 +714,238 @@ class Async(BaseGroupActor):
             ExcType = self._get_exc_type(errors)
             raise ExcType('Exceptions raised by %s of %s actors in "%s".' % (
                           len(errors), len(self._actions), self._desc))
+
+
+class Graph(BaseGroupActor):
+
+    """Execute `kingpin.actors.base.BaseActor` objects in dependency order.
+
+    Every act may have an ``id``, and may list the ``id`` s of the acts that
+    it ``depends_on``. Each act starts as soon as all of its dependencies have
+    finished, and acts without dependencies start right away. This runs
+    everything that can run in parallel at the same time, without the
+    barriers that nesting `Sync` and `Async` groups would add.
+
+    **Options**
+
+    :acts:
+      An array of individual Actor definitions. Besides the usual settings,
+      each act may have:
+
+      ``id``
+        A name for the act, unique within the group.
+
+      ``depends_on``
+        The ``id`` (or a list of the ``id`` s) of the acts that have to
+        finish before this act starts.
+
+    :contexts:
+      A list of dictionaries with *contextual tokens* to pass into the actors
+      at instantiation time. If the list has more than one element, then every
+      actor defined in ``acts`` will be instantiated once for each item in the
+      ``contexts`` list. Each set of acts gets its own graph: the
+      dependencies of an act are looked up among the acts of the same
+      context.
+
+    **Timeouts**
+
+    Timeouts are disabled specifically in this actor. The sub-actors can still
+    raise their own `kingpin.actors.exceptions.ActorTimedOut` exceptions, but
+    since the group actors run an arbitrary number of sub actors, we have
+    chosen to not have this actor specifically raise its own
+    `kingpin.actors.exceptions.ActorTimedOut` exception unless the user sets
+    the ``timeout`` setting.
+
+    **Examples**
+
+    Clone two arrays in parallel, and launch each one as soon as it exists.
+    Announce the release once both were cloned:
+
+    .. code-block:: json
+
+       { "desc": "Clone and launch",
+         "actor": "group.Graph",
+         "options": {
+           "acts": [
+             { "id": "clone-a",
+               "desc": "clone A",
+               "actor": "server_array.Clone",
+               "options": { "source": "template", "dest": "A" }
+             },
+             { "id": "clone-b",
+               "desc": "clone B",
+               "actor": "server_array.Clone",
+               "options": { "source": "template", "dest": "B" }
+             },
+             { "depends_on": "clone-a",
+               "desc": "launch A",
+               "actor": "server_array.Launch",
+               "options": { "array": "A" }
+             },
+             { "depends_on": ["clone-a", "clone-b"],
+               "desc": "announce",
+               "actor": "hipchat.Message",
+               "options": { "room": "Oncall", "message": "Cloned!" }
+             }
+           ]
+         }
+       }
+
+    **Dry Mode**
+
+    Passes on the Dry mode setting to the acts that are called. Like `Sync`,
+    it does **not** stop when an act fails: the acts that depend on it are
+    executed anyway, and the worst of all of the errors is raised at the end.
+
+    **Failure**
+
+    When an act fails, the acts that depend on it (directly or not) are
+    skipped. All of the other acts are allowed to finish, and then the
+    failure is returned -- just like `Async`.
+
+    An ``id`` that is used twice, a dependency on an unknown ``id`` or a
+    circular dependency raise `kingpin.actors.exceptions.InvalidOptions`
+    when the group is created.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # Filled in by _build_action_group(), which is called by the
+        # BaseGroupActor.__init__()
+        self._depends_on = {}
+        super(Graph, self).__init__(*args, **kwargs)
+        self._order = self._sort_actions()
+
+    def _build_action_group(self, context=None):
+        """Builds the acts, and looks up the acts that each one depends on.
+
+        Returns:
+            A list of references to <actor objects>.
+
+        Raises:
+            exceptions.InvalidOptions
+        """
+        actions = []
+        ids = {}
+        depends_on = []
+        for act in self.option('acts'):
+            act = dict(act)
+            act_id = act.get('id')
+            deps = act.pop('depends_on', [])
+            if isinstance(deps, basestring):
+                deps = [deps]
+
+            act['init_context'] = context
+            actor = utils.get_actor(act, dry=self._dry)
+            actions.append(actor)
+            depends_on.append(deps)
+
+            if act_id is None:
+                continue
+            if act_id in ids:
+                raise exceptions.InvalidOptions(
+                    'Act id "%s" is used more than once.' % act_id)
+            ids[act_id] = actor
+
+        for actor, deps in zip(actions, depends_on):
+            missing = [dep for dep in deps if dep not in ids]
+            if missing:
+                raise exceptions.InvalidOptions(
+                    '"%s" depends on unknown act(s): %s' % (
+                        actor._desc, ', '.join(missing)))
+            self._depends_on[actor] = [ids[dep] for dep in deps]
+
+        return actions
+
+    def _sort_actions(self):
+        """Orders the acts so that every act comes after its dependencies.
+
+        Acts keep the order they were defined in, as far as the
+        dependencies allow.
+
+        Returns:
+            A list of references to <actor objects>.
+
+        Raises:
+            exceptions.InvalidOptions: If the dependencies are circular
+        """
+        order = []
+        done = set()
+        remaining = list(self._actions)
+        while remaining:
+            ready = [act for act in remaining
+                     if all(dep in done for dep in self._depends_on[act])]
+            if not ready:
+                raise exceptions.InvalidOptions(
+                    'Circular dependency between: %s' % ', '.join(
+                        '"%s"' % act._desc for act in remaining))
+            order.extend(ready)
+            done.update(ready)
+            remaining = [act for act in remaining if act not in done]
+        return order
+
+    @gen.coroutine
+    def _run_act(self, act, dependencies):
+        """Executes a single act once its dependencies have finished.
+
+        Args:
+            act: The <actor object> to execute
+            dependencies: The Futures of the acts that `act` depends on
+
+        Raises:
+            gen.Return(True) if the act ran, gen.Return(False) if it was
+            skipped because a dependency failed. The exception of the act
+            itself, if it failed.
+        """
+        failed = False
+        for dep in dependencies:
+            ran = False
+            try:
+                ran = yield dep
+            except exceptions.ActorException:
+                pass
+            failed = failed or not ran
+
+        if failed and not self._dry:
+            self.log.warning('Skipping "%s" because a dependency failed',
+                             act._desc)
+            raise gen.Return(False)
+
+        # Whatever the dependencies did may have satisfied this act.
+        if SKIP_SATISFIED and dependencies:
+            yield act.probe()
+
+        self.log.debug('Beginning "%s"..', act._desc)
+        yield act.execute()
+        raise gen.Return(True)
+
+    @gen.coroutine
+    def _run_actions(self):
+        """Executes all of the acts, each as soon as it can.
+
+        All acts are scheduled up front (in dependency order), and each one
+        waits on the Futures of its own dependencies.
+
+        raises:
+            The worst of all the raised errors.
+        """
+        tasks = {}
+        for act in self._order:
+            tasks[act] = self._run_act(
+                act, [tasks[dep] for dep in self._depends_on[act]])
+
+        errors = []
+        skipped = 0
+        for act in self._order:
+            try:
+                ran = yield tasks[act]
+            except exceptions.ActorException as e:
+                errors.append(e)
+            else:
+                skipped += not ran
+
+        if errors:
+            ExcType = self._get_exc_type(errors)
+            raise ExcType(
+                'Exceptions raised by %s of %s actors (%s skipped) in '
+                '"%s".' % (len(errors), len(self._actions), skipped,
+                           self._desc))
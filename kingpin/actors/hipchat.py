@@ -209,8 +209,8 @@ class Message(HipchatBase):
 
         raises: gen.Return()
         """
-        self.log.info('Sending message "%s" to Hipchat room "%s"' %
-                      (self.option('message'), self.option('room')))
+        self.log.info('Sending message "%s" to Hipchat room "%s"',
+                      self.option('message'), self.option('room'))
         res = yield self._post_message(self.option('room'),
                                        self.option('message'))
 
@@ -225,7 +225,7 @@ class Message(HipchatBase):
         # message send, but just validated the API token against the API.
         if 'success' in res:
             if res['success']['code'] == 202:
-                self.log.info('API Token Validated: %s' %
+                self.log.info('API Token Validated: %s',
                               res['success']['message'])
 
         raise gen.Return()
@@ -295,8 +295,8 @@ class Topic(HipchatBase):
 
         raises: gen.Return()
         """
-        self.log.info('Setting room "%s" topic to: %s' %
-                      (self.option('room'), self.option('topic')))
+        self.log.info('Setting room "%s" topic to: %s',
+                      self.option('room'), self.option('topic'))
         res = yield self._set_topic(self.option('room'),
                                     self.option('topic'))
 
@@ -311,7 +311,7 @@ class Topic(HipchatBase):
         # message send, but just validated the API token against the API.
         if 'success' in res:
             if res['success']['code'] == 202:
-                self.log.info('API Token Validated: %s' %
+                self.log.info('API Token Validated: %s',
                               res['success']['message'])
 
         raise gen.Return()
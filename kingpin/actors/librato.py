@@ -141,12 +141,13 @@ class Annotation(base.HTTPBaseActor):
             self.log.info(msg % (self.option('name'), self.option('title'),
                                  self.option('description')))
             yield self._fetch_wrapper(
-                METRICS_URL, auth_username=EMAIL, auth_password=TOKEN)
+                METRICS_URL, auth_username=EMAIL, auth_password=TOKEN,
+                cache=True)
         else:
             self.log.info(
-                "Annotating metric '%s' with title:'%s', description:'%s'" % (
-                    self.option('name'), self.option('title'),
-                    self.option('description')))
+                "Annotating metric '%s' with title:'%s', description:'%s'",
+                self.option('name'), self.option('title'),
+                self.option('description'))
             url = ANNOTATIONS_URL + self.option('name')
             args = urllib.urlencode(
                 {'title': self.option('title'),
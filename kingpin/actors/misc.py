@@ -135,7 +135,7 @@ class Macro(base.BaseActor):
         # Temporary check that macro is a local file.
         self._check_macro()
 
-        self.log.info('Preparing actors from %s' % self.option('macro'))
+        self.log.info('Preparing actors from %s', self.option('macro'))
 
         # Copy the tmp file / download a remote macro
         macro_file = self._get_macro()
@@ -208,7 +208,7 @@ class Macro(base.BaseActor):
                 if parsing json or inserting env vars fails.
         """
 
-        self.log.debug('Parsing %s' % json_file)
+        self.log.debug('Parsing %s', json_file)
         try:
             config = utils.convert_json_to_dict(
                 json_file=json_file,
@@ -220,7 +220,7 @@ class Macro(base.BaseActor):
 
     def _check_schema(self, config):
         # Run the dict through our schema validator quickly
-        self.log.debug('Validating schema for %s' % self.option('macro'))
+        self.log.debug('Validating schema for %s', self.option('macro'))
         try:
             schema.validate(config)
         except kingpin_exceptions.InvalidJSON as e:
@@ -268,7 +268,7 @@ class Sleep(base.BaseActor):
     def _execute(self):
         """Executes an actor and yields the results when its finished."""
 
-        self.log.debug('Sleeping for %s seconds' % self.option('sleep'))
+        self.log.debug('Sleeping for %s seconds', self.option('sleep'))
 
         sleep = self.option('sleep')
 
@@ -329,8 +329,8 @@ class GenericHTTP(base.HTTPBaseActor):
         is_post = bool(self.option('data'))
         method = ['POST', 'GET'][is_post]
 
-        self.log.info("Would do a %s request to %s"
-                      % (method, self.option('url')))
+        self.log.info('Would do a %s request to %s',
+                      method, self.option('url'))
         raise gen.Return()
 
     @gen.coroutine
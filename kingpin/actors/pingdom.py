@@ -60,7 +60,7 @@ class PingdomAPI(api.RestConsumer):
         'attrs': {
             'checks': {
                 'path': '/api/2.0/checks',
-                'http_methods': {'get': {}}
+                'http_methods': {'get': {'cache': True}}
             },
             'check': {
                 'path': '/api/2.0/checks/%check_id%',
@@ -79,7 +79,9 @@ class PingdomClient(api.RestClient):
     # The default exception handling is fine, but the Pingdom API uses a 599 to
     # represent a timeout on the backend of their service.
     _EXCEPTIONS = dict(api.RestClient._EXCEPTIONS)
-    _EXCEPTIONS[httpclient.HTTPError]['599'] = None
+    _EXCEPTIONS[httpclient.HTTPError] = dict(
+        api.RestClient._EXCEPTIONS[httpclient.HTTPError])
+    _EXCEPTIONS[httpclient.HTTPError][599] = None
 
 
 class PingdomBase(base.BaseActor):
@@ -152,11 +154,11 @@ class Pause(PingdomBase):
         check = yield self._get_check()
 
         if self._dry:
-            self.log.info('Would pause %s (%s) pingdom check.' % (
-                check['name'], check['hostname']))
+            self.log.info('Would pause %s (%s) pingdom check.',
+                          check['name'], check['hostname'])
             raise gen.Return()
 
-        self.log.info('Pausing %s' % check['name'])
+        self.log.info('Pausing %s', check['name'])
         yield self._pingdom_client.check(
             check_id=check['id']).http_put(paused='true')
 
@@ -193,10 +195,10 @@ class Unpause(PingdomBase):
         check = yield self._get_check()
 
         if self._dry:
-            self.log.info('Would unpause %s (%s) pingdom check.' % (
-                check['name'], check['hostname']))
+            self.log.info('Would unpause %s (%s) pingdom check.',
+                          check['name'], check['hostname'])
             raise gen.Return()
 
-        self.log.info('Unpausing %s' % check['name'])
+        self.log.info('Unpausing %s', check['name'])
         yield self._pingdom_client.check(
             check_id=check['id']).http_put(paused='false')
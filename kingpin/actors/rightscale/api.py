@@ -50,7 +50,6 @@ from datetime import datetime
 from os import path
 import logging
 
-from retrying import retry as sync_retry
 from rightscale import util as rightscale_util
 from tornado import concurrent
 from tornado import gen
@@ -60,6 +59,8 @@ import rightscale
 import simplejson
 
 from kingpin import utils
+from kingpin.actors.support import budget
+from kingpin.actors.support import metrics
 
 log = logging.getLogger(__name__)
 
@@ -75,7 +76,12 @@ DEFAULT_ENDPOINT = 'https://my.rightscale.com'
 # decorator. We would like this to be a class variable so its shared
 # across RightScale objects, but we see testing IO errors when we
 # do this.
-EXECUTOR = concurrent.futures.ThreadPoolExecutor(10)
+EXECUTOR = metrics.ThreadPoolExecutor(10, name='rightscale')
+
+API_CALLS = metrics.histogram(
+    'kingpin_rightscale_call_seconds',
+    'Duration of every attempt (including retries) at a RightScale API call.',
+    labels=('method',))
 
 
 class ServerArrayException(Exception):
@@ -107,8 +113,8 @@ class RightScale(object):
         r_log = logging.getLogger('requests.packages.urllib3.connectionpool')
         r_log.setLevel(logging.WARNING)
 
-        log.debug('%s initialized (token=<hidden>, endpoint=%s)' %
-                  (self.__class__.__name__, endpoint))
+        log.debug('%s initialized (token=<hidden>, endpoint=%s)',
+                  self.__class__.__name__, endpoint)
 
     def get_res_id(self, resource):
         """Returns the Resource ID of a given RightScale Resource object.
@@ -121,8 +127,10 @@ class RightScale(object):
         """
         return int(path.split(resource.self.path)[-1])
 
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def find_server_arrays(self, name, exact=True):
         """Search for a list of ServerArray by name and return the resources.
 
@@ -133,27 +141,56 @@ class RightScale(object):
         Returns:
             <rightscale.Resource object(s)>
         """
-        log.debug('Searching for ServerArrays matching: %s (exact match: %s)' %
-                  (name, exact))
+        log.debug('Searching for ServerArrays matching: %s (exact match: %s)',
+                  name, exact)
 
         found_arrays = rightscale_util.find_by_name(
             self._client.server_arrays, name, exact=exact)
 
         if not found_arrays:
-            log.debug('ServerArray matching "%s" not found' % name)
+            log.debug('ServerArray matching "%s" not found', name)
             return
 
-        if isinstance(found_arrays, list):
-            names = [s.soul['name'] for s in found_arrays]
-        else:
-            names = [found_arrays.soul['name']]
+        if log.isEnabledFor(logging.DEBUG):
+            if isinstance(found_arrays, list):
+                names = [s.soul['name'] for s in found_arrays]
+            else:
+                names = [found_arrays.soul['name']]
 
-        log.debug('Got ServerArray(s): %s' % ', '.join(names))
+            log.debug('Got ServerArray(s): %s', ', '.join(names))
 
         return found_arrays
 
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
+    def show_server_array(self, href):
+        """Returns the ServerArray at an href (ie, /api/server_arrays/1234).
+
+        Unlike find_server_arrays(), this reads the array itself rather than
+        searching through all of them, so it also finds an array that was
+        only just created.
+
+        Args:
+            href: The href of the ServerArray
+
+        Returns:
+            <rightscale.Resource object>, or None if there is no such array
+        """
+        log.debug('Reading ServerArray %s', href)
+        array_id = int(path.split(href)[-1])
+        try:
+            return self._client.server_arrays.show(res_id=array_id)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code != 404:
+                raise
+            log.debug('ServerArray %s not found', href)
+
+    @budget.limit('rightscale')
+    @concurrent.run_on_executor
+    @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def find_cookbook(self, name):
         """Search for a Cookbook by-name and return the resource.
 
@@ -165,7 +202,7 @@ class RightScale(object):
         """
         cookbook = name.split('::')[0]
 
-        log.debug('Searching for Cookbooks matching: %s' % name)
+        log.debug('Searching for Cookbooks matching: %s', name)
         found_cookbooks = self._client.cookbooks.index(
             params={'filter[]': ['name==%s' % cookbook],
                     'view': 'extended'})
@@ -174,18 +211,20 @@ class RightScale(object):
             found_cookbooks)
 
         if not found_recipes:
-            log.debug('Recipe matching "%s" could not be found.' % name)
-            log.debug('Found cookbooks %s' % found_cookbooks)
+            log.debug('Recipe matching "%s" could not be found.', name)
+            log.debug('Found cookbooks %s', found_cookbooks)
             return
 
         recipe = found_recipes[0]
 
-        log.debug('Found recipe: %s' % recipe)
+        log.debug('Found recipe: %s', recipe)
 
         return recipe
 
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def find_right_script(self, name):
         """Search for a RightScript by-name and return the resource.
 
@@ -195,20 +234,22 @@ class RightScale(object):
         Return:
             rightscale.Resource object
         """
-        log.debug('Searching for RightScript matching: %s' % name)
+        log.debug('Searching for RightScript matching: %s', name)
         found_script = rightscale_util.find_by_name(
             self._client.right_scripts, name, exact=True)
 
         if not found_script:
-            log.debug('RightScript matching "%s" could not be found.' % name)
+            log.debug('RightScript matching "%s" could not be found.', name)
             return
 
-        log.debug('Got RightScript: %s' % found_script)
+        log.debug('Got RightScript: %s', found_script)
 
         return found_script
 
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def clone_server_array(self, array):
         """Clone a Server Array.
 
@@ -221,14 +262,16 @@ class RightScale(object):
         Return:
             <rightscale.Resource object>
         """
-        log.debug('Cloning ServerArray %s' % array.soul['name'])
+        log.debug('Cloning ServerArray %s', array.soul['name'])
         source_id = self.get_res_id(array)
         new_array = self._client.server_arrays.clone(res_id=source_id)
-        log.debug('New ServerArray %s created!' % new_array.soul['name'])
+        log.debug('New ServerArray %s created!', new_array.soul['name'])
         return new_array
 
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def destroy_server_array(self, array):
         """Destroys a Server Array.
 
@@ -240,13 +283,15 @@ class RightScale(object):
         Args:
             array: ServerArray Resource Object
         """
-        log.debug('Destroying ServerArray %s' % array.soul['name'])
+        log.debug('Destroying ServerArray %s', array.soul['name'])
         array_id = self.get_res_id(array)
         self._client.server_arrays.destroy(res_id=array_id)
         log.debug('Array Destroyed')
 
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def update_server_array(self, array, params):
         """Updates a ServerArray with the supplied parameters.
 
@@ -264,14 +309,16 @@ class RightScale(object):
             <updated rightscale array object>
         """
 
-        log.debug('Patching ServerArray (%s) with new params: %s' %
-                  (array.soul['name'], params))
+        log.debug('Patching ServerArray (%s) with new params: %s',
+                  array.soul['name'], params)
         array.self.update(params=params)
         updated_array = array.self.show()
         return updated_array
 
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def get_server_array_inputs(self, array):
         """Looks up ServerArray 'Next Instance' inputs.
 
@@ -289,8 +336,10 @@ class RightScale(object):
 
         return all_inputs
 
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def update_server_array_inputs(self, array, inputs):
         """Updates a ServerArray 'Next Instance' with the supplied inputs.
 
@@ -309,17 +358,19 @@ class RightScale(object):
                 { 'inputs[ELB_NAME]': 'text:foobar' }
         """
 
-        log.debug('Patching ServerArray (%s) with new inputs: %s' %
-                  (array.soul['name'], inputs))
+        log.debug('Patching ServerArray (%s) with new inputs: %s',
+                  array.soul['name'], inputs)
 
         next_inst = array.next_instance.show()
         next_inst.inputs.multi_update(params=inputs)
 
+    @utils.async_retry(stop_max_attempt_number=10,
+                       wait_exponential_multiplier=5000,
+                       wait_exponential_max=60000)
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
-    @sync_retry(stop_max_attempt_number=10,
-                wait_exponential_multiplier=5000,
-                wait_exponential_max=60000)
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def launch_server_array(self, array, count=1):
         """Launches an instance of a ServerArray..
 
@@ -351,17 +402,19 @@ class RightScale(object):
         if count > 1:
             params = {'count': count}
 
-        log.debug('Launching a new instance of ServerArray %s' %
+        log.debug('Launching a new instance of ServerArray %s',
                   array.soul['name'])
         array_id = self.get_res_id(array)
         return self._client.server_arrays.launch(
             res_id=array_id, params=params)
 
+    @utils.async_retry(stop_max_attempt_number=10,
+                       wait_exponential_multiplier=1000,
+                       wait_exponential_max=10000)
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
-    @sync_retry(stop_max_attempt_number=10,
-                wait_exponential_multiplier=1000,
-                wait_exponential_max=10000)
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def get_server_array_current_instances(
             self, array, filters=['state<>terminated']):
         """Returns a list of ServerArray current running instances.
@@ -383,13 +436,15 @@ class RightScale(object):
         Returns:
             [<list of rightscale.Resource objects>]
         """
-        log.debug('Searching for current instances of ServerArray (%s)' %
+        log.debug('Searching for current instances of ServerArray (%s)',
                   array.soul['name'])
         params = {'filter[]': filters}
         return array.current_instances.index(params=params)
 
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def terminate_server_array_instances(self, array):
         """Executes a terminate on all of the current running instances.
 
@@ -408,7 +463,7 @@ class RightScale(object):
         Return:
             <task object for termination request>
         """
-        log.debug('Terminating all instances of ServerArray (%s)' %
+        log.debug('Terminating all instances of ServerArray (%s)',
                   array.soul['name'])
         array_id = self.get_res_id(array)
         try:
@@ -467,30 +522,32 @@ class RightScale(object):
         now = datetime.utcnow()
         tasks_start = now.strftime('%Y/%m/%d %H:%M:%S +0000')
 
-        while True:
-            # Get the task status
-            output = yield self._get_task_info(task)
-            summary = output.soul['summary']
-            stamp = datetime.now()
-
-            if 'success' in summary or 'completed' in summary:
-                status = True
-                break
+        try:
+            while True:
+                metrics.POLLS.inc(loop='rightscale.wait_for_task')
+                # Get the task status
+                output = yield self._get_task_info(task)
+                summary = output.soul['summary']
+                stamp = datetime.now()
 
-            if 'failed' in summary:
-                status = False
-                break
+                if 'success' in summary or 'completed' in summary:
+                    status = True
+                    break
 
-            loc_log.debug('Task (%s) status: %s (updated at: %s)' %
-                          (output.path, output.soul['summary'], stamp))
+                if 'failed' in summary:
+                    status = False
+                    break
 
-            yield utils.tornado_sleep(min(sleep, 5))
+                loc_log.debug('Task (%s) status: %s (updated at: %s)',
+                              output.path, output.soul['summary'], stamp)
 
-        loc_log.debug('Task (%s) status: %s (updated at: %s)' %
-                      (output.path, output.soul['summary'], stamp))
+                yield utils.tornado_sleep(min(sleep, 5))
+        finally:
+            if timeout_id:
+                utils.clear_repeating_log(timeout_id)
 
-        if timeout_id:
-            utils.clear_repeating_log(timeout_id)
+        loc_log.debug('Task (%s) status: %s (updated at: %s)',
+                      output.path, output.soul['summary'], stamp)
 
         if status is True:
             raise gen.Return(True)
@@ -504,7 +561,7 @@ class RightScale(object):
         now = datetime.utcnow()
         tasks_finish = now.strftime('%Y/%m/%d %H:%M:%S +0000')
 
-        loc_log.error('Task failed. Instance: "%s".' % instance.soul['name'])
+        loc_log.error('Task failed. Instance: "%s".', instance.soul['name'])
 
         audit_logs = yield self.get_audit_logs(
             instance=instance,
@@ -516,18 +573,20 @@ class RightScale(object):
         [loc_log.error(l) for l in audit_logs]
 
         if not audit_logs:
-            loc_log.error('No audit logs for %s' % instance)
+            loc_log.error('No audit logs for %s', instance)
 
-        loc_log.debug('Task finished, return value: %s, summary: %s' %
-                      (status, summary))
+        loc_log.debug('Task finished, return value: %s, summary: %s',
+                      status, summary)
 
         raise gen.Return(status)
 
+    @utils.async_retry(stop_max_attempt_number=20,
+                       wait_exponential_multiplier=1000,
+                       wait_exponential_max=10000)
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
-    @sync_retry(stop_max_attempt_number=20,
-                wait_exponential_multiplier=1000,
-                wait_exponential_max=10000)
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def _get_task_info(self, task):
         """Fetch data for a particular RightScale task.
 
@@ -536,11 +595,13 @@ class RightScale(object):
         """
         return task.self.show()
 
+    @utils.async_retry(stop_max_attempt_number=10,
+                       wait_exponential_multiplier=5000,
+                       wait_exponential_max=60000)
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
-    @sync_retry(stop_max_attempt_number=10,
-                wait_exponential_multiplier=5000,
-                wait_exponential_max=60000)
     @utils.exception_logger
+    @metrics.timed(API_CALLS, label='method')
     def get_audit_logs(self, instance, start, end, match=None):
         """Fetch a set of audit logs belonging to an instance.
 
@@ -569,15 +630,15 @@ class RightScale(object):
             'end_date': end
         })
 
-        log.debug('Found %s audit logs.' % len(all_entries))
+        log.debug('Found %s audit logs.', len(all_entries))
 
         logs = []
         for entry in all_entries:
             summary = entry.soul['summary']
             if match and match not in summary:
-                log.debug('Skipping details for "%s"' % summary)
+                log.debug('Skipping details for "%s"', summary)
                 continue
-            log.debug('Fetching details for "%s"' % summary)
+            log.debug('Fetching details for "%s"', summary)
 
             # grabbing raw output because RightScale doesn't reply via JSON
             # when accessing details of a log.
@@ -632,7 +693,7 @@ class RightScale(object):
 
             params['right_script_href'] = script.href
 
-        log.debug('Executing %s with params: %s' % (script_type, params))
+        log.debug('Executing %s with params: %s', script_type, params)
 
         # Walk through the list of instances and fire off the execution on each
         # instance. For each execution, we will store a reference to the
@@ -642,7 +703,7 @@ class RightScale(object):
         # iterate over the responses to these requests.
         task_pairs = []
         for i in instances:
-            log.debug('Executing %s on %s' % (name, i.soul['name']))
+            log.debug('Executing %s on %s', name, i.soul['name'])
             url = '%s/run_executable' % i.links['self']
             req = self.make_generic_request(url, post=params)
             task_pairs.append((i, req))
@@ -678,10 +739,12 @@ class RightScale(object):
 
         raise gen.Return(yielded_tasks)
 
+    @utils.async_retry(stop_max_attempt_number=3,
+                       wait_exponential_multiplier=1000,
+                       wait_exponential_max=10000)
+    @budget.limit('rightscale')
     @concurrent.run_on_executor
-    @sync_retry(stop_max_attempt_number=3,
-                wait_exponential_multiplier=1000,
-                wait_exponential_max=10000)
+    @metrics.timed(API_CALLS, label='method')
     def make_generic_request(self, url, post=None):
         """Make a generic API call and return a Resource Object.
 
@@ -700,7 +763,7 @@ class RightScale(object):
             <rightscale.Resource object>
         """
         # Make the initial web call
-        log.debug('Making generic API call: %s (%s)' % (url, post))
+        log.debug('Making generic API call: %s (%s)', url, post)
 
         # Here we're reaching into the rightscale client library and getting
         # access directly to its requests client object.
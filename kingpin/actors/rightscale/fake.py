@@ -0,0 +1,519 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+
+"""
+:mod:`kingpin.actors.rightscale.fake`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+An in-process fake of the RightScale API endpoints used by
+`kingpin.actors.rightscale.api.RightScale`. See
+`kingpin.actors.support.fake` for how to enable it.
+
+The fake replaces the `requests` session underneath the python-rightscale
+client, and answers each HTTP request with the same status codes, headers and
+JSON bodies that RightScale would. Everything above it -- the
+python-rightscale `Resource` objects, our `api.RightScale` wrapper and its
+retry decorators -- runs exactly as it does against the real API. Throttled
+calls get a ``429`` response and failed calls a ``500``.
+
+**State**
+
+The `FakeRightScale.load()` method takes a dict like this:
+
+.. code-block:: json
+
+    { "server_arrays": [ { "name": "prod-web", "instances": 2,
+                           "min_count": 2,
+                           "inputs": { "ELB_NAME": "text:prod-web" } } ],
+      "right_scripts": [ "restart-nginx" ],
+      "cookbooks": { "nginx": [ "nginx::restart" ] } }
+"""
+
+import functools
+import json
+import logging
+import re
+import threading
+import urlparse
+
+from requests import structures
+import requests
+import rightscale
+
+from kingpin.actors.rightscale import base as rightscale_base
+from kingpin.actors.support import fake
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+CLOUD = '/api/clouds/1'
+
+REASONS = {200: 'OK', 201: 'Created', 202: 'Accepted', 204: 'No Content',
+           404: 'Not Found', 422: 'Unprocessable Entity',
+           429: 'Too Many Requests', 500: 'Internal Server Error'}
+
+# (method, path regex, FakeRightScale method) tuples. Trailing slashes are
+# stripped from the request path before matching.
+ROUTES = [
+    ('post', r'/api/oauth2', 'login'),
+    ('get', r'/api/sessions', 'session'),
+    ('get', r'/api/server_arrays', 'index_server_arrays'),
+    ('get', r'/api/server_arrays/(\d+)', 'show_server_array'),
+    ('put', r'/api/server_arrays/(\d+)', 'update_server_array'),
+    ('delete', r'/api/server_arrays/(\d+)', 'destroy_server_array'),
+    ('post', r'/api/server_arrays/(\d+)/clone', 'clone_server_array'),
+    ('post', r'/api/server_arrays/(\d+)/launch', 'launch'),
+    ('post', r'/api/server_arrays/(\d+)/multi_terminate', 'multi_terminate'),
+    ('get', r'/api/server_arrays/(\d+)/current_instances',
+     'current_instances'),
+    ('get', CLOUD + r'/instances/(\w+)', 'show_instance'),
+    ('get', CLOUD + r'/instances/(\w+)/inputs', 'index_inputs'),
+    ('put', CLOUD + r'/instances/(\w+)/inputs/multi_update', 'update_inputs'),
+    ('post', CLOUD + r'/instances/(\w+)/run_executable', 'run_executable'),
+    ('get', r'/api/tasks/(\d+)', 'show_task'),
+    ('get', r'/api/right_scripts', 'index_right_scripts'),
+    ('get', r'/api/cookbooks', 'index_cookbooks'),
+    ('get', r'/api/audit_entries', 'index_audit_entries'),
+]
+
+# Calls that the Behavior never fails. python-rightscale swallows any error
+# while discovering the API (and then claims that every collection is
+# missing), which would hide the failure we meant to inject.
+RELIABLE = ('login', 'session')
+
+# The original python-rightscale HTTPClient, replaced by install()
+_ORIGINAL_CLIENT = None
+_ORIGINAL_TOKEN = None
+
+
+class Response(object):
+
+    """A canned reply from the fake API."""
+
+    def __init__(self, status=200, body=None, kind=None, location=None):
+        self.status = status
+        self.body = body
+        self.kind = kind
+        self.location = location
+
+    def build(self, url):
+        """Returns the equivalent `requests.Response` object."""
+        response = requests.Response()
+        response.status_code = self.status
+        response.reason = REASONS.get(self.status, '')
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers = structures.CaseInsensitiveDict()
+        response._content = b''
+        if self.location:
+            response.headers['location'] = self.location
+        if self.body is not None:
+            response._content = json.dumps(self.body)
+            content_type = 'application/vnd.rightscale.%s+json' % self.kind
+            if isinstance(self.body, list):
+                content_type += ';type=collection'
+            response.headers['content-type'] = content_type
+        return response
+
+
+class NotFound(Exception):
+
+    """Raised by a FakeRightScale method to return a 404."""
+
+
+def _links(**links):
+    return [{'rel': rel, 'href': href} for rel, href in links.items()]
+
+
+def _pairs(kwargs):
+    """Returns the request params and form data as a list of tuples."""
+    pairs = []
+    for key in ('params', 'data'):
+        values = kwargs.get(key) or []
+        if isinstance(values, dict):
+            values = values.items()
+        for name, value in values:
+            if isinstance(value, list):
+                pairs.extend((name, v) for v in value)
+            else:
+                pairs.append((name, value))
+    return pairs
+
+
+def _filters(pairs):
+    """Turns RightScale filter[] params into a list of (key, op, value)."""
+    filters = []
+    for name, value in pairs:
+        if name == 'filter[]':
+            key, op, value = re.match(r'(\w+)(==|<>)(.*)', value).groups()
+            filters.append((key, op, value))
+    return filters
+
+
+def _matches(soul, filters):
+    """Mimics RightScale filtering, where names match on a substring."""
+    for key, op, value in filters:
+        actual = soul.get(key, '')
+        if key == 'name':
+            found = value in actual
+        else:
+            found = value == actual
+        if found != (op == '=='):
+            return False
+    return True
+
+
+class FakeSession(object):
+
+    """Stands in for the `requests.Session` of the RightScale HTTPClient."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.headers = {}
+
+    def request(self, method, url, **kwargs):
+        path = urlparse.urlparse(url).path.rstrip('/')
+        for route_method, pattern, name in ROUTES:
+            match = re.match(pattern + '$', path)
+            if route_method == method.lower() and match:
+                response = self.backend.call(name, match.groups(), kwargs)
+                break
+        else:
+            response = Response(404)
+        return response.build(url)
+
+
+class FakeHTTPClient(rightscale.rightscale.HTTPClient):
+
+    """The python-rightscale HTTPClient, wired up to a FakeSession."""
+
+    backend = None
+
+    def __init__(self, *args, **kwargs):
+        super(FakeHTTPClient, self).__init__(*args, **kwargs)
+        self.s = FakeSession(self.backend)
+
+
+def api(f):
+    """Turns a NotFound exception into a 404 response."""
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return f(self, *args, **kwargs)
+        except NotFound:
+            return Response(404)
+    return wrapper
+
+
+class FakeRightScale(object):
+
+    """Holds the state of the fake RightScale account.
+
+    Args:
+        behavior: A `kingpin.actors.support.fake.Behavior` object
+    """
+
+    def __init__(self, behavior=None):
+        self.behavior = behavior or fake.Behavior()
+        self.lock = threading.RLock()
+        self.server_arrays = {}
+        self.instances = {}
+        self.inputs = {}
+        self.tasks = {}
+        self.right_scripts = []
+        self.cookbooks = {}
+        self._ids = 0
+
+    def _next_id(self):
+        self._ids += 1
+        return self._ids
+
+    def call(self, name, args, kwargs):
+        """Makes a fake API call, subject to the Behavior."""
+        outcome = None
+        if name not in RELIABLE:
+            outcome = self.behavior.roll(name)
+        if outcome == fake.THROTTLED:
+            return Response(429)
+        if outcome == fake.FAILED:
+            return Response(500)
+        with self.lock:
+            return getattr(self, name)(*args, pairs=_pairs(kwargs))
+
+    def add_server_array(self, name, instances=0, min_count=1, max_count=10,
+                         state='enabled', inputs=None):
+        """Adds a ServerArray with `instances` operational instances."""
+        array_id = self._next_id()
+        href = '/api/server_arrays/%s' % array_id
+        next_instance = 'N%s' % array_id
+        self.server_arrays[array_id] = {
+            'name': name,
+            'state': state,
+            'instances_count': 0,
+            'elasticity_params': {'bounds': {'min_count': str(min_count),
+                                             'max_count': str(max_count)}},
+            'links': _links(
+                self=href,
+                current_instances='%s/current_instances' % href,
+                next_instance='%s/instances/%s' % (CLOUD, next_instance))}
+        self.inputs[next_instance] = dict(inputs or {})
+        for i in range(instances):
+            self._add_instance(array_id, fake.Pending(0))
+        return self.server_arrays[array_id]
+
+    def _add_instance(self, array_id, pending):
+        instance_id = 'I%s' % self._next_id()
+        href = '%s/instances/%s' % (CLOUD, instance_id)
+        array = self.server_arrays[array_id]
+        array['instances_count'] += 1
+        self.instances[instance_id] = {
+            'array': array_id,
+            'pending': pending,
+            'soul': {'name': '%s #%s' % (array['name'],
+                                         array['instances_count']),
+                     'state': 'pending',
+                     'links': _links(self=href, inputs=href + '/inputs')}}
+        self.inputs[instance_id] = {}
+        return instance_id
+
+    def add_right_script(self, name):
+        self.right_scripts.append(name)
+
+    def add_cookbook(self, name, recipes):
+        self.cookbooks[name] = list(recipes)
+
+    def load(self, state):
+        """Populates the fake account from a dict (see above)."""
+        for array in state.get('server_arrays', []):
+            self.add_server_array(**array)
+        for name in state.get('right_scripts', []):
+            self.add_right_script(name)
+        for name, recipes in state.get('cookbooks', {}).items():
+            self.add_cookbook(name, recipes)
+
+    def _array(self, array_id):
+        try:
+            return self.server_arrays[int(array_id)]
+        except KeyError:
+            raise NotFound()
+
+    def _instance(self, instance_id, advance=True):
+        """Returns the soul of an instance.
+
+        Args:
+            instance_id: The ID of the instance
+            advance: Whether this read counts as a poll of a launching or
+                     terminating instance
+        """
+        try:
+            instance = self.instances[instance_id]
+        except KeyError:
+            raise NotFound()
+
+        soul = instance['soul']
+        if advance and instance['pending'] and instance['pending'].done():
+            instance['pending'] = None
+            soul['state'] = {'pending': 'operational',
+                             'terminating': 'terminated'}[soul['state']]
+        return soul
+
+    def _task(self, summary):
+        task_id = self._next_id()
+        self.tasks[task_id] = {'pending': fake.Pending(), 'summary': summary}
+        return Response(202, location='/api/tasks/%s' % task_id)
+
+    # Fake API endpoints. Each one is called with the regex groups from its
+    # route, and the request params as a list of tuples.
+
+    def login(self, pairs):
+        return Response(200, {'access_token': 'fake', 'expires_in': 7200},
+                        'oauth2')
+
+    def session(self, pairs):
+        return Response(200, {'links': []}, 'session')
+
+    @api
+    def index_server_arrays(self, pairs):
+        filters = _filters(pairs)
+        return Response(200, [a for _, a in sorted(self.server_arrays.items())
+                              if _matches(a, filters)], 'server_array')
+
+    @api
+    def show_server_array(self, array_id, pairs):
+        return Response(200, self._array(array_id), 'server_array')
+
+    @api
+    def update_server_array(self, array_id, pairs):
+        array = self._array(array_id)
+        for name, value in pairs:
+            keys = re.findall(r'\[(\w+)\]', name)
+            target = array
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+        return Response(204)
+
+    @api
+    def destroy_server_array(self, array_id, pairs):
+        self._array(array_id)
+        del self.server_arrays[int(array_id)]
+        return Response(204)
+
+    @api
+    def clone_server_array(self, array_id, pairs):
+        source = self._array(array_id)
+        bounds = source['elasticity_params']['bounds']
+        clone = self.add_server_array(
+            name='%s v1' % source['name'], state='disabled',
+            min_count=bounds['min_count'], max_count=bounds['max_count'])
+        links = dict((l['rel'], l['href']) for l in clone['links'])
+        source_links = dict((l['rel'], l['href']) for l in source['links'])
+        self.inputs[links['next_instance'].split('/')[-1]].update(
+            self.inputs[source_links['next_instance'].split('/')[-1]])
+        return Response(201, location=links['self'])
+
+    @api
+    def launch(self, array_id, pairs):
+        self._array(array_id)
+        count = int(dict(pairs).get('count', 1))
+        ids = [self._add_instance(int(array_id), fake.Pending())
+               for i in range(count)]
+        return Response(201, location='%s/instances/%s' % (CLOUD, ids[0]))
+
+    def _array_instances(self, array_id):
+        return [i for i, instance in sorted(self.instances.items())
+                if instance['array'] == int(array_id)]
+
+    @api
+    def multi_terminate(self, array_id, pairs):
+        self._array(array_id)
+        live = [i for i in self._array_instances(array_id)
+                if self._instance(i)['state'] not in
+                ('terminating', 'terminated')]
+        if not live:
+            return Response(422)
+        for instance_id in live:
+            self.instances[instance_id]['soul']['state'] = 'terminating'
+            self.instances[instance_id]['pending'] = fake.Pending()
+        return self._task('queued: terminating %s instances' % len(live))
+
+    @api
+    def current_instances(self, array_id, pairs):
+        self._array(array_id)
+        filters = _filters(pairs)
+        souls = [self._instance(i) for i in self._array_instances(array_id)]
+        return Response(200, [s for s in souls if _matches(s, filters)],
+                        'instance')
+
+    @api
+    def show_instance(self, instance_id, pairs):
+        if instance_id.startswith('N') and instance_id in self.inputs:
+            href = '%s/instances/%s' % (CLOUD, instance_id)
+            return Response(200, {
+                'name': 'Next instance',
+                'state': 'inactive',
+                'links': _links(self=href, inputs=href + '/inputs')},
+                'instance')
+        return Response(200, self._instance(instance_id, advance=False),
+                        'instance')
+
+    @api
+    def index_inputs(self, instance_id, pairs):
+        if instance_id not in self.inputs:
+            raise NotFound()
+        return Response(200, [{'name': name, 'value': value}
+                              for name, value in
+                              sorted(self.inputs[instance_id].items())],
+                        'input')
+
+    @api
+    def update_inputs(self, instance_id, pairs):
+        if instance_id not in self.inputs:
+            raise NotFound()
+        for name, value in pairs:
+            self.inputs[instance_id][re.match(r'inputs\[(.*)\]',
+                                              name).group(1)] = value
+        return Response(204)
+
+    @api
+    def run_executable(self, instance_id, pairs):
+        self._instance(instance_id)
+        params = dict(pairs)
+        script = params.get('recipe_name') or params.get('right_script_href')
+        return self._task('queued: %s' % script)
+
+    @api
+    def show_task(self, task_id, pairs):
+        try:
+            task = self.tasks[int(task_id)]
+        except KeyError:
+            raise NotFound()
+        summary = task['summary']
+        if task['pending'].done():
+            summary = summary.replace('queued', 'completed')
+        href = '/api/tasks/%s' % task_id
+        return Response(200, {'summary': summary, 'links': _links(self=href)},
+                        'task')
+
+    @api
+    def index_right_scripts(self, pairs):
+        filters = _filters(pairs)
+        return Response(200, [
+            {'name': name,
+             'links': _links(self='/api/right_scripts/%s' % i)}
+            for i, name in enumerate(self.right_scripts)
+            if _matches({'name': name}, filters)], 'right_script')
+
+    @api
+    def index_cookbooks(self, pairs):
+        filters = _filters(pairs)
+        return Response(200, [
+            {'name': name,
+             'metadata': {'recipes': dict((r, 'Recipe %s' % r)
+                                          for r in recipes)},
+             'links': _links(self='/api/cookbooks/%s' % name)}
+            for name, recipes in sorted(self.cookbooks.items())
+            if _matches({'name': name}, filters)], 'cookbook')
+
+    def index_audit_entries(self, pairs):
+        return Response(200, [], 'audit_entry')
+
+
+def install(behavior=None):
+    """Points the python-rightscale client at a FakeRightScale.
+
+    Returns:
+        The FakeRightScale backend
+    """
+    global _ORIGINAL_CLIENT, _ORIGINAL_TOKEN
+    backend = FakeRightScale(behavior)
+    FakeHTTPClient.backend = backend
+
+    _ORIGINAL_CLIENT = rightscale.rightscale.HTTPClient
+    rightscale.rightscale.HTTPClient = FakeHTTPClient
+
+    # The actors refuse to start without a token
+    _ORIGINAL_TOKEN = rightscale_base.TOKEN
+    rightscale_base.TOKEN = rightscale_base.TOKEN or 'fake'
+
+    return backend
+
+
+def uninstall():
+    """Puts back the real python-rightscale client."""
+    if _ORIGINAL_CLIENT:
+        rightscale.rightscale.HTTPClient = _ORIGINAL_CLIENT
+        rightscale_base.TOKEN = _ORIGINAL_TOKEN
+    FakeHTTPClient.backend = None
@@ -19,6 +19,7 @@
 
 from random import randint
 import logging
+import re
 
 from tornado import gen
 import mock
@@ -28,12 +29,16 @@ from kingpin import utils
 from kingpin.actors import exceptions
 from kingpin.actors.rightscale import api
 from kingpin.actors.rightscale import base
+from kingpin.actors.support import metrics
 from kingpin.constants import REQUIRED
 
 log = logging.getLogger(__name__)
 
 __author__ = 'Matt Wise <matt@nextdoor.com>'
 
+# Matches the href of a ServerArray, which may be used instead of its name
+ARRAY_HREF = re.compile(r'^/api/server_arrays/\d+$')
+
 
 class ArrayNotFound(exceptions.RecoverableActorFailure):
 
@@ -67,7 +72,8 @@ class ServerArrayBaseActor(base.RightScaleBaseActor):
         """Find a ServerArray by name and return it.
 
         Args:
-            array_name: String name of the ServerArray to find.
+            array_name: String name of the ServerArray to find, or its href
+                        (ie, published by the Clone actor)
             raise_on: Either None, 'notfound' or 'found'
             allow_mock: Boolean whether or not to allow a Mock object to be
                         returned instead.
@@ -90,12 +96,16 @@ class ServerArrayBaseActor(base.RightScaleBaseActor):
                 'Invalid "raise_on" setting in actor code.')
 
         self.log.debug(msg)
-        array = yield self._client.find_server_arrays(array_name, exact=exact)
+        if ARRAY_HREF.match(array_name):
+            array = yield self._client.show_server_array(array_name)
+        else:
+            array = yield self._client.find_server_arrays(array_name,
+                                                          exact=exact)
 
         if not array and self._dry and allow_mock:
             # Create a fake ServerArray object thats mocked up to help with
             # execution of the rest of the code.
-            self.log.info('Array "%s" not found -- creating a mock.' %
+            self.log.info('Array "%s" not found -- creating a mock.',
                           array_name)
             array = mock.MagicMock(name=array_name)
             # Give the mock a real identity and give it valid elasticity
@@ -121,7 +131,7 @@ class ServerArrayBaseActor(base.RightScaleBaseActor):
         # note to the user so they know whats going on.
         if isinstance(array, list):
             for a in array:
-                self.log.info('Matching array found: %s' % a.soul['name'])
+                self.log.info('Matching array found: %s', a.soul['name'])
 
         raise gen.Return(array)
 
@@ -146,9 +156,9 @@ class ServerArrayBaseActor(base.RightScaleBaseActor):
 
         tasks = []
         for array in arrays:
-            self.log.debug('Adding %s(%s, %s, %s) to async call list' %
-                           (function.__name__, array.soul['name'],
-                            args, kwargs))
+            self.log.debug('Adding %s(%s, %s, %s) to async call list',
+                           function.__name__, array.soul['name'],
+                           args, kwargs)
             tasks.append(function(array, *args, **kwargs))
 
         self.log.debug('Calling all functions in async call list')
@@ -225,6 +235,30 @@ class Clone(ServerArrayBaseActor):
          }
        }
 
+    **Runtime Context**
+
+    With an ``id``, this actor publishes the ``href`` and ``name`` of the new
+    array. The other ServerArray actors accept the href in place of the array
+    name, and then read the array directly instead of searching for it by
+    name. This is faster, and it works right away, while a new array can take
+    a moment to show up in the search.
+
+    .. code-block:: json
+
+       [ { "desc": "Clone my array",
+           "actor": "rightscale.server_array.Clone",
+           "id": "clone",
+           "options": {
+             "source": "my-template-array",
+             "dest": "my-new-array"
+           }
+         },
+         { "desc": "Launch it",
+           "actor": "rightscale.server_array.Launch",
+           "options": { "array": "{@clone.href}" }
+         }
+       ]
+
     **Dry Mode**
 
     In Dry mode this actor *does* validate that the ``source`` array exists. If
@@ -282,7 +316,7 @@ class Clone(ServerArrayBaseActor):
             allow_mock=self._dest_allow_mock)
 
         # Now, clone the array!
-        self.log.info('Cloning array "%s"' % source_array.soul['name'])
+        self.log.info('Cloning array "%s"', source_array.soul['name'])
         if not self._dry:
             # We're really doin this!
             new_array = yield self._client.clone_server_array(source_array)
@@ -296,9 +330,13 @@ class Clone(ServerArrayBaseActor):
         # Lastly, rename the array
         params = self._generate_rightscale_params(
             'server_array', {'name': self.option('dest')})
-        self.log.info('Renaming array "%s" to "%s"' % (new_array.soul['name'],
-                                                       self.option('dest')))
+        self.log.info('Renaming array "%s" to "%s"',
+                      new_array.soul['name'], self.option('dest'))
         yield self._client.update_server_array(new_array, params)
+
+        self.publish('name', self.option('dest'))
+        if not self._dry:
+            self.publish('href', new_array.self.path)
         raise gen.Return()
 
 
@@ -426,7 +464,7 @@ class Update(ServerArrayBaseActor):
         for input_name, _ in inputs.items():
             # Inputs have to be there. If not -- it's a problem.
             if input_name not in all_input_names:
-                self.log.error('Input not found: "%s"' % input_name)
+                self.log.error('Input not found: "%s"', input_name)
                 success = False
 
         if not success:
@@ -434,6 +472,34 @@ class Update(ServerArrayBaseActor):
 
         raise gen.Return()
 
+    @gen.coroutine
+    def needs_execution(self):
+        """Whether any of the arrays has different inputs.
+
+        Comparing the params is not cheap (they are nested, and RightScale
+        returns them in a different shape), so if any are supplied the
+        arrays are always updated.
+        """
+        if self.option('params') or not self.option('inputs'):
+            raise gen.Return(True)
+
+        arrays = yield self._client.find_server_arrays(
+            self.option('array'), exact=self.option('exact'))
+        if not arrays:
+            raise gen.Return(True)
+        if not isinstance(arrays, list):
+            arrays = [arrays]
+
+        all_inputs = yield [self._client.get_server_array_inputs(array)
+                            for array in arrays]
+        for inputs in all_inputs:
+            current = dict((i.soul['name'], i.soul['value']) for i in inputs)
+            for name, value in self.option('inputs').items():
+                if current.get(name) != value:
+                    raise gen.Return(True)
+
+        raise gen.Return(False)
+
     @gen.coroutine
     def _update_params(self, array):
         """Update the parameters on a RightScale ServerArray.
@@ -445,8 +511,8 @@ class Update(ServerArrayBaseActor):
         if not self.option('params'):
             raise gen.Return()
 
-        self.log.info('Updating array "%s" with params: %s' %
-                      (array.soul['name'], self._params))
+        self.log.info('Updating array "%s" with params: %s',
+                      array.soul['name'], self._params)
         try:
             yield self._client.update_server_array(array, self._params)
         except requests.exceptions.HTTPError as e:
@@ -470,8 +536,8 @@ class Update(ServerArrayBaseActor):
         if not self.option('inputs'):
             raise gen.Return()
 
-        self.log.info('Updating array "%s" with inputs: %s' %
-                      (array.soul['name'], self._inputs))
+        self.log.info('Updating array "%s" with inputs: %s',
+                      array.soul['name'], self._inputs)
         yield self._client.update_server_array_inputs(array, self._inputs)
 
     @gen.coroutine
@@ -484,9 +550,9 @@ class Update(ServerArrayBaseActor):
         if self._dry:
             self.log.debug('Not making any changes.')
             if self.option('params'):
-                self.log.info('Params would be: %s' % self.option('params'))
+                self.log.info('Params would be: %s', self.option('params'))
             if self.option('inputs'):
-                self.log.info('Inputs would be: %s' % self.option('inputs'))
+                self.log.info('Inputs would be: %s', self.option('inputs'))
                 yield self._apply(self._check_array_inputs,
                                   arrays, self.option('inputs'))
 
@@ -567,11 +633,11 @@ class Terminate(ServerArrayBaseActor):
     @gen.coroutine
     def _terminate_all_instances(self, array):
         if self._dry:
-            self.log.info('Would have terminated all array "%s" instances.' %
+            self.log.info('Would have terminated all array "%s" instances.',
                           array.soul['name'])
             raise gen.Return()
 
-        self.log.info('Terminating all instances in array "%s"' %
+        self.log.info('Terminating all instances in array "%s"',
                       array.soul['name'])
         task = yield self._client.terminate_server_array_instances(array)
         # We don't care if it succeeded -- the multi-terminate job
@@ -597,14 +663,15 @@ class Terminate(ServerArrayBaseActor):
         """
         if self._dry:
                 self.log.info('Pretending that array %s instances '
-                              'are terminated.' % array.soul['name'])
+                              'are terminated.', array.soul['name'])
                 raise gen.Return()
 
         while True:
+            metrics.POLLS.inc(loop='server_array.Terminate')
             instances = yield self._client.get_server_array_current_instances(
                 array)
             count = len(instances)
-            self.log.info('%s instances found' % count)
+            self.log.info('%s instances found', count)
 
             if count < 1:
                 raise gen.Return()
@@ -624,11 +691,11 @@ class Terminate(ServerArrayBaseActor):
             'server_array', {'state': 'disabled'})
 
         if self._dry:
-            self.log.info('Would have updated array "%s" with params: %s' %
-                          (array.soul['name'], params))
+            self.log.info('Would have updated array "%s" with params: %s',
+                          array.soul['name'], params)
             raise gen.Return()
 
-        self.log.info('Disabling Array "%s"' % array.soul['name'])
+        self.log.info('Disabling Array "%s"', array.soul['name'])
         yield self._client.update_server_array(array, params)
         raise gen.Return()
 
@@ -728,11 +795,11 @@ class Destroy(Terminate):
         TODO: Handle exceptions if the array is not terminatable.
         """
         if self._dry:
-            self.log.info('Pretending to destroy array "%s"' %
+            self.log.info('Pretending to destroy array "%s"',
                           array.soul['name'])
             raise gen.Return()
 
-        self.log.info('Destroying array "%s"' % array.soul['name'])
+        self.log.info('Destroying array "%s"', array.soul['name'])
         yield self._client.destroy_server_array(array)
         raise gen.Return()
 
@@ -877,8 +944,8 @@ class Launch(ServerArrayBaseActor):
             sleep: Integer time to sleep between checks (def: 60)
         """
         if self._dry:
-            self.log.info('Pretending that array %s instances are launched.'
-                          % array.soul['name'])
+            self.log.info('Pretending that array %s instances are launched.',
+                          array.soul['name'])
             raise gen.Return()
 
         # Get the current min_count setting from the ServerArray object, or get
@@ -890,11 +957,12 @@ class Launch(ServerArrayBaseActor):
                             ['bounds']['min_count'])
 
         while True:
+            metrics.POLLS.inc(loop='server_array.Launch')
             instances = yield self._client.get_server_array_current_instances(
                 array, filters=['state==operational'])
             count = len(instances)
-            self.log.info('%s instances found, waiting for %s' %
-                          (count, min_count))
+            self.log.info('%s instances found, waiting for %s',
+                          count, min_count)
 
             if min_count <= count:
                 raise gen.Return()
@@ -938,23 +1006,23 @@ class Launch(ServerArrayBaseActor):
                 count = 0
 
         if self._dry:
-            self.log.info('Would have launched %s instances of array %s' % (
-                          count, array.soul['name']))
+            self.log.info('Would have launched %s instances of array %s',
+                          count, array.soul['name'])
             raise gen.Return()
 
         if count < 1:
             self.log.warning((
                 'This array already has %s instances, and '
-                'min_count is set to %s') % (current_count, min_count))
+                'min_count is set to %s'), current_count, min_count)
             raise gen.Return()
 
-        self.log.info('Launching %s instances of array %s' % (
-                      count, array.soul['name']))
+        self.log.info('Launching %s instances of array %s',
+                      count, array.soul['name'])
 
         # Launch!
         yield self._client.launch_server_array(array, count=count)
-        self.log.info('Launched %s instances for array %s' % (
-                      count, array.soul['name']))
+        self.log.info('Launched %s instances for array %s',
+                      count, array.soul['name'])
 
         raise gen.Return()
 
@@ -970,12 +1038,12 @@ class Launch(ServerArrayBaseActor):
         # newly updated array.
         if self.option('enable'):
             if not self._dry:
-                self.log.info('Enabling Array "%s"' % array.soul['name'])
+                self.log.info('Enabling Array "%s"', array.soul['name'])
                 params = self._generate_rightscale_params(
                     'server_array', {'state': 'enabled'})
                 array = yield self._client.update_server_array(array, params)
             else:
-                self.log.info('Would enable array "%s"' % array.soul['name'])
+                self.log.info('Would enable array "%s"', array.soul['name'])
 
     @gen.coroutine
     def _execute(self):
@@ -1110,11 +1178,11 @@ class Execute(ServerArrayBaseActor):
         if non_op_count > 0:
             self.log.warning(
                 'Found %s instances (in %s) in a non-Operational state, '
-                'will not execute on these hosts!' %
-                (non_op_count, array.soul['name']))
+                'will not execute on these hosts!',
+                non_op_count, array.soul['name'])
 
-        self.log.info('Found %s instances (in %s) in the Operational state.' %
-                      (len(op), array.soul['name']))
+        self.log.info('Found %s instances (in %s) in the Operational state.',
+                      len(op), array.soul['name'])
         raise gen.Return(op)
 
     @gen.coroutine
@@ -1141,8 +1209,8 @@ class Execute(ServerArrayBaseActor):
         for key, value in inputs.items():
             if value.split(':')[0] not in types:
                 issues = True
-                self.log.error('Value for %s needs to begin with %s'
-                               % (key, types))
+                self.log.error('Value for %s needs to begin with %s',
+                               key, types)
 
         if issues:
             raise exceptions.InvalidOptions('One or more inputs has a problem')
@@ -1160,7 +1228,7 @@ class Execute(ServerArrayBaseActor):
         """
 
         task_count = len(task_pairs)
-        self.log.info('Queueing %s tasks' % task_count)
+        self.log.info('Queueing %s tasks', task_count)
         task_waiting = []
 
         for instance, task in task_pairs:
@@ -1175,7 +1243,7 @@ class Execute(ServerArrayBaseActor):
                 instance=instance
             ))
 
-        self.log.info('Waiting for %s tasks to finish...' % task_count)
+        self.log.info('Waiting for %s tasks to finish...', task_count)
         statuses = yield task_waiting
 
         raise gen.Return(all(statuses))
@@ -1201,21 +1269,21 @@ class Execute(ServerArrayBaseActor):
 
         if self._dry:
             self.log.info(
-                'Would have executed "%s" with inputs "%s" on "%s".'
-                % (self.option('script'), inputs, array.soul['name']))
+                'Would have executed "%s" with inputs "%s" on "%s".',
+                self.option('script'), inputs, array.soul['name'])
             raise gen.Return()
 
         count = len(instances)
         # Execute the script on all of the servers in the array and store the
         # task status resource records.
         self.log.info(
-            'Executing "%s" on %s instances in the array "%s"' %
-            (self.option('script'), count, array.soul['name']))
+            'Executing "%s" on %s instances in the array "%s"',
+            self.option('script'), count, array.soul['name'])
         try:
             task_pairs = yield self._client.run_executable_on_instances(
                 self.option('script'), inputs, instances)
         except api.ServerArrayException as e:
-            self.log.critical('Script execution error: %s' % e)
+            self.log.critical('Script execution error: %s', e)
             raise exceptions.RecoverableActorFailure(
                 'Invalid parameters supplied to execute script.')
 
@@ -1227,7 +1295,7 @@ class Execute(ServerArrayBaseActor):
             self.log.critical('One or more tasks failed.')
             raise TaskExecutionFailed()
         else:
-            self.log.info('Completed %s tasks.' % count)
+            self.log.info('Completed %s tasks.', count)
 
         raise gen.Return()
 
@@ -0,0 +1,133 @@
+import logging
+
+from tornado import testing
+import requests
+
+from kingpin.actors.rightscale import api
+from kingpin.actors.rightscale import fake
+from kingpin.actors.support import fake as support_fake
+
+
+log = logging.getLogger(__name__)
+
+
+class TestFakeRightScale(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestFakeRightScale, self).setUp()
+        self.behavior = support_fake.Behavior(latency=0, error_rate=0,
+                                              throttle_rate=0)
+        self.backend = fake.install(self.behavior)
+        self.backend.load({
+            'server_arrays': [{'name': 'unit-array', 'instances': 1,
+                               'inputs': {'ELB_NAME': 'text:unit'}}],
+            'right_scripts': ['unit-script'],
+            'cookbooks': {'unit': ['unit::recipe']}})
+        self.client = api.RightScale('unit-test')
+
+    def tearDown(self):
+        fake.uninstall()
+        super(TestFakeRightScale, self).tearDown()
+
+    @testing.gen_test
+    def test_find_server_arrays(self):
+        array = yield self.client.find_server_arrays('unit-array')
+        self.assertEquals(array.soul['name'], 'unit-array')
+        self.assertEquals(self.client.get_res_id(array), 1)
+
+        self.backend.add_server_array('unit-array-2')
+        arrays = yield self.client.find_server_arrays('unit', exact=False)
+        self.assertEquals([a.soul['name'] for a in arrays],
+                          ['unit-array', 'unit-array-2'])
+
+        missing = yield self.client.find_server_arrays('missing')
+        self.assertEquals(missing, None)
+
+        array = yield self.client.show_server_array('/api/server_arrays/1')
+        self.assertEquals(array.soul['name'], 'unit-array')
+        missing = yield self.client.show_server_array('/api/server_arrays/9')
+        self.assertEquals(missing, None)
+
+    @testing.gen_test
+    def test_find_scripts(self):
+        script = yield self.client.find_right_script('unit-script')
+        self.assertEquals(script.soul['name'], 'unit-script')
+        recipe = yield self.client.find_cookbook('unit::recipe')
+        self.assertEquals(recipe.soul['name'], 'unit')
+        recipe = yield self.client.find_cookbook('unit::missing')
+        self.assertEquals(recipe, None)
+
+    @testing.gen_test
+    def test_clone_update_destroy(self):
+        array = yield self.client.find_server_arrays('unit-array')
+        clone = yield self.client.clone_server_array(array)
+        self.assertEquals(clone.soul['name'], 'unit-array v1')
+
+        params = [('server_array[name]', 'unit-clone'),
+                  ('server_array[elasticity_params][bounds][min_count]', '3')]
+        updated = yield self.client.update_server_array(clone, params)
+        self.assertEquals(updated.soul['name'], 'unit-clone')
+        self.assertEquals(
+            updated.soul['elasticity_params']['bounds']['min_count'], '3')
+
+        inputs = yield self.client.get_server_array_inputs(updated)
+        self.assertEquals([(i.soul['name'], i.soul['value']) for i in inputs],
+                          [('ELB_NAME', 'text:unit')])
+        yield self.client.update_server_array_inputs(
+            updated, {'inputs[ELB_NAME]': 'text:clone'})
+        inputs = yield self.client.get_server_array_inputs(updated)
+        self.assertEquals(inputs[0].soul['value'], 'text:clone')
+
+        yield self.client.destroy_server_array(updated)
+        missing = yield self.client.find_server_arrays('unit-clone')
+        self.assertEquals(missing, None)
+
+    @testing.gen_test
+    def test_launch_and_terminate(self):
+        array = yield self.client.find_server_arrays('unit-array')
+        yield self.client.launch_server_array(array, count=2)
+
+        operational = []
+        for i in range(2):
+            instances = yield self.client.get_server_array_current_instances(
+                array, filters=['state==operational'])
+            operational.append(len(instances))
+        self.assertEquals(operational, [1, 3])
+
+        task = yield self.client.terminate_server_array_instances(array)
+        ok = yield self.client.wait_for_task(task, sleep=0)
+        self.assertTrue(ok)
+
+        # Nothing left to terminate
+        for i in range(2):
+            instances = yield self.client.get_server_array_current_instances(
+                array)
+        self.assertEquals(instances, [])
+        task = yield self.client.terminate_server_array_instances(array)
+        self.assertEquals(task, None)
+
+    @testing.gen_test
+    def test_run_executable(self):
+        array = yield self.client.find_server_arrays('unit-array')
+        instances = yield self.client.get_server_array_current_instances(
+            array)
+        pairs = yield self.client.run_executable_on_instances(
+            'unit-script', {'inputs[FOO]': 'text:bar'}, instances)
+        self.assertEquals(len(pairs), 1)
+        ok = yield self.client.wait_for_task(pairs[0][1], sleep=0)
+        self.assertTrue(ok)
+
+    @testing.gen_test
+    def test_throttling(self):
+        self.behavior.throttle_rate = 1
+        with self.assertRaises(requests.exceptions.HTTPError) as e:
+            yield self.client.find_server_arrays('unit-array')
+        self.assertEquals(e.exception.response.status_code, 429)
+
+    @testing.gen_test
+    def test_not_found(self):
+        session = fake.FakeSession(self.backend)
+        response = session.request('get', 'https://unit/api/server_arrays/9')
+        self.assertEquals(response.status_code, 404)
+        response = session.request('get', 'https://unit/api/nothing')
+        self.assertEquals(response.status_code, 404)
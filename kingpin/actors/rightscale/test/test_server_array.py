@@ -9,6 +9,7 @@ from kingpin.actors import exceptions
 from kingpin.actors.rightscale import api
 from kingpin.actors.rightscale import base
 from kingpin.actors.rightscale import server_array
+from kingpin.actors.support import runtime
 from kingpin.actors.test.helper import mock_tornado, tornado_value
 
 log = logging.getLogger(__name__)
@@ -99,6 +100,17 @@ class TestServerArrayBaseActor(testing.AsyncTestCase):
         ret = yield self.actor._find_server_arrays('t', raise_on=None)
         self.assertEquals(None, ret)
 
+    @testing.gen_test
+    def test_find_server_arrays_by_href(self):
+        mocked_array = mock.MagicMock(name='mocked array')
+        self.client_mock.show_server_array = mock_tornado(mocked_array)
+        self.client_mock.find_server_arrays = mock_tornado()
+
+        ret = yield self.actor._find_server_arrays('/api/server_arrays/1')
+        self.assertEquals(mocked_array, ret)
+        self.assertEquals(self.client_mock.show_server_array._call_count, 1)
+        self.assertEquals(self.client_mock.find_server_arrays._call_count, 0)
+
     @testing.gen_test
     def test_apply(self):
         # Fake method used to test the apply function
@@ -160,6 +172,23 @@ class TestCloneActor(testing.AsyncTestCase):
         ret = yield self.actor.execute()
         self.assertEquals(None, ret)
 
+    @testing.gen_test
+    def test_execute_publishes(self):
+        self.addCleanup(runtime.reset)
+        actor = server_array.Clone('Clone', {'source': 'unittestarray',
+                                             'dest': 'newunitarray'},
+                                   id='clone')
+        actor._client = self.client_mock
+        actor._find_server_arrays = mock_tornado(mock.MagicMock())
+        new_array = mock.MagicMock(name='unittestarray v1')
+        new_array.self.path = '/api/server_arrays/124'
+        self.client_mock.clone_server_array = mock_tornado(new_array)
+        self.client_mock.update_server_array = mock_tornado()
+
+        yield actor.execute()
+        self.assertEquals(runtime.get('clone.href'), '/api/server_arrays/124')
+        self.assertEquals(runtime.get('clone.name'), 'newunitarray')
+
     @testing.gen_test
     def test_execute_in_dry_mode(self):
         self.actor._dry = True
@@ -191,6 +220,34 @@ class TestUpdateActor(testing.AsyncTestCase):
         self.client_mock = mock.MagicMock()
         self.actor._client = self.client_mock
 
+    @testing.gen_test
+    def test_needs_execution(self):
+        # With params, the arrays are always updated
+        needed = yield self.actor.needs_execution()
+        self.assertTrue(needed)
+
+        actor = server_array.Update(
+            'Patch', {'array': 'unittestarray',
+                      'inputs': {'test': 'text:test'}})
+        actor._client = self.client_mock
+        array = mock.MagicMock(name='unittestarray')
+        test_input = mock.MagicMock(name='input')
+        test_input.soul = {'name': 'test', 'value': 'text:old'}
+        self.client_mock.find_server_arrays = mock_tornado(array)
+        self.client_mock.get_server_array_inputs = mock_tornado(
+            [test_input])
+
+        needed = yield actor.needs_execution()
+        self.assertTrue(needed)
+
+        test_input.soul['value'] = 'text:test'
+        needed = yield actor.needs_execution()
+        self.assertFalse(needed)
+
+        self.client_mock.find_server_arrays = mock_tornado(None)
+        needed = yield actor.needs_execution()
+        self.assertTrue(needed)
+
     @testing.gen_test
     def test_check_inputs_empty(self):
         array = mock.Mock()
@@ -641,7 +698,7 @@ class TestLaunchActor(testing.AsyncTestCase):
         yield self.actor._launch_instances(array_mock)
         self.assertEquals(1, self.client_mock.launch_server_array.call_count)
         self.client_mock.launch_server_array.assert_has_calls(
-            mock.call(array_mock, count=4))
+            [mock.call(array_mock, count=4)])
 
         # Regular function call with some servers already existing.
         self.client_mock.get_server_array_current_instances = mock_tornado([
@@ -649,7 +706,7 @@ class TestLaunchActor(testing.AsyncTestCase):
         self.client_mock.launch_server_array.reset_mock()
         yield self.actor._launch_instances(array_mock)
         self.client_mock.launch_server_array.assert_has_calls(
-            mock.call(array_mock, count=2))
+            [mock.call(array_mock, count=2)])
 
         # Regular function call more arrays than min_count
         self.client_mock.get_server_array_current_instances = mock_tornado([
@@ -787,7 +844,8 @@ class TestExecuteActor(testing.AsyncTestCase):
         ret = yield self.actor._execute_array(mock_array, 1)
 
         (self.client_mock.get_server_array_current_instances
-            .assert_called_twice_with(mock_array))
+            .assert_called_once_with(
+                mock_array, filters=['state<>terminated']))
         (self.client_mock.run_executable_on_instances
             .assert_called_once_with(
                 'test_script', 1, [mock_op_instance]))
@@ -131,7 +131,7 @@ class RollbarBase(base.HTTPBaseActor):
 
         args = self._build_potential_args({})
         url = self._generate_escaped_url(API_PROJECT_PATH, args)
-        res = yield self._fetch_wrapper(url)
+        res = yield self._fetch_wrapper(url, cache=True)
         raise gen.Return(res)
 
 
@@ -230,10 +230,10 @@ class Deploy(RollbarBase):
 
         if self._dry:
             self.log.info('Would have sent %s, but instead just validating '
-                          'API key.' % rollbar_string)
+                          'API key.', rollbar_string)
             yield self._project()
             raise gen.Return()
 
-        self.log.info('Sending %s' % rollbar_string)
+        self.log.info('Sending %s', rollbar_string)
         yield self._deploy()
         raise gen.Return()
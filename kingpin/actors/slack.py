@@ -57,7 +57,7 @@ class SlackAPI(api.RestConsumer):
         'attrs': {
             'auth_test': {
                 'path': '/api/auth.test',
-                'http_methods': {'post': {}},
+                'http_methods': {'post': {'cache': True}},
             },
             'chat_postMessage': {
                 'path': '/api/chat.postMessage',
@@ -158,8 +158,8 @@ class Message(SlackBase):
 
     @gen.coroutine
     def _execute(self):
-        self.log.info('Sending message "%s" to Slack channel "%s"' %
-                      (self.option('message'), self.option('channel')))
+        self.log.info('Sending message "%s" to Slack channel "%s"',
+                      self.option('message'), self.option('channel'))
 
         # Check if our authentication creds are valid
         auth_ok = yield self._slack_client.auth_test().http_post()
@@ -14,17 +14,19 @@
 """
 This package provides a quick way of creating custom API clients for JSON-based
 REST APIs. The majority of the work is in the creation of a _CONFIG dictionary
-for the class. This dictionary dynamically configures the object at
-instantiation time with the appropriate @gen.coroutine wrapped HTTP fetch
-methods.
+for the class. This dictionary dynamically configures the class at creation
+time with the appropriate @gen.coroutine wrapped HTTP fetch methods.
 
 See the documentation in docs/DEVELOPMENT.md for more details on how to use
 this package to create your own API client.
 """
 
+from email import utils as email_utils
 import logging
-import types
+import random
+import time
 import urllib
+import urlparse
 
 from tornado import gen
 from tornado import httpclient
@@ -33,28 +35,207 @@ import simplejson as json
 
 from kingpin import utils
 from kingpin.actors import exceptions
+from kingpin.actors.support import budget
+from kingpin.actors.support import cancel
+from kingpin.actors.support import metrics
+from kingpin.actors.support import trace
+from kingpin.actors.support import transport
 
 log = logging.getLogger(__name__)
 
 __author__ = 'Matt Wise <matt@nextdoor.com>'
 
 
+class CircuitOpen(exceptions.RecoverableActorFailure):
+
+    """Raised when a remote endpoint has failed too many times in a row."""
+
+
+class CircuitBreaker(object):
+
+    """Tracks the health of a single remote API endpoint.
+
+    After `threshold` consecutive server-side failures, the circuit 'opens'
+    and every request to that endpoint fails immediately with a CircuitOpen
+    exception rather than waiting on (and retrying against) a dead service.
+    Once `reset_timeout` seconds have passed, the circuit is 'half-open' and
+    a single request is let through. If it succeeds the circuit closes again,
+    otherwise it re-opens for another `reset_timeout` seconds.
+
+    Args:
+        name: Name of the endpoint (used for logging)
+        threshold: Number of consecutive failures before opening
+        reset_timeout: Seconds to wait before allowing a trial request
+    """
+
+    def __init__(self, name, threshold=5, reset_timeout=30):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    def check(self):
+        """Raises CircuitOpen if requests to this endpoint are blocked."""
+        if self.opened_at is None:
+            return
+
+        remaining = self.opened_at + self.reset_timeout - time.time()
+        if remaining > 0:
+            raise CircuitOpen(
+                'Circuit for %s is open after %s consecutive failures. '
+                'Retrying in %.0fs.' % (self.name, self.failures, remaining))
+
+        # Half-open: let this one request through, but push the next window
+        # out so that concurrent callers keep failing fast until it returns.
+        log.debug('Circuit for %s is half-open, allowing a trial request',
+                  self.name)
+        self.opened_at = time.time()
+
+    def success(self):
+        """Records a successful request and closes the circuit."""
+        if self.opened_at is not None:
+            log.info('Circuit for %s closed', self.name)
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        """Records a failed request, opening the circuit if necessary."""
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                log.warning('Circuit for %s opened after %s consecutive '
+                            'failures', self.name, self.failures)
+            self.opened_at = time.time()
+
+
+# Shared across every RestClient in the process, so that one dead service
+# fails fast for every actor that talks to it.
+CIRCUIT_BREAKERS = {}
+
+
+def get_circuit_breaker(url, **kwargs):
+    """Returns the (shared) CircuitBreaker for the host in `url`.
+
+    Args:
+        url: Full URL of the request
+        **kwargs: Passed to the CircuitBreaker if one has to be created
+
+    Returns:
+        A CircuitBreaker object
+    """
+    name = urlparse.urlparse(url).netloc
+    if name not in CIRCUIT_BREAKERS:
+        CIRCUIT_BREAKERS[name] = CircuitBreaker(name, **kwargs)
+    return CIRCUIT_BREAKERS[name]
+
+
+def _backoff_delay(attempt, delay, backoff, max_delay):
+    """Returns the number of seconds to wait before the next attempt.
+
+    The wait grows exponentially with every attempt (`delay * backoff ^
+    (attempt - 1)`), is capped at `max_delay`, and then has random jitter
+    applied so that many actors failing against the same endpoint at the
+    same time do not all retry in lock-step. Half of the wait is fixed, the
+    other half is random.
+
+    Args:
+        attempt: (Int) The attempt number that just failed (starting at 1)
+        delay: (Float) Base delay in seconds
+        backoff: (Float) Multiplier applied to the delay on every attempt
+        max_delay: (Float) Upper limit (in seconds) of the computed delay
+
+    Returns:
+        Float of seconds to wait
+    """
+    wait = min(delay * (backoff ** (attempt - 1)), max_delay)
+    return random.uniform(wait / 2.0, wait)
+
+
+def _get_retry_after(e):
+    """Returns the Retry-After value (in seconds) of an HTTP Error, if any.
+
+    Only 429 (Too Many Requests) and 503 (Service Unavailable) responses are
+    checked. The header can either be a number of seconds, or an HTTP date.
+
+    Args:
+        e: The Exception that was raised
+
+    Returns:
+        Float of seconds to wait, or None.
+    """
+    if getattr(e, 'code', None) not in (429, 503):
+        return None
+
+    response = getattr(e, 'response', None)
+    if response is None or response.headers is None:
+        return None
+
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    parsed = email_utils.parsedate_tz(value)
+    if parsed is None:
+        log.debug('Unable to parse Retry-After header: %s', value)
+        return None
+
+    return max(email_utils.mktime_tz(parsed) - time.time(), 0)
+
+
+def _match_exception(exc_conf, e):
+    """Finds the configured behavior for an exception in an _EXCEPTIONS dict.
+
+    Keys that are integers (or strings of digits) are compared against the
+    numeric status code of the exception (`e.code`), so that '500' never
+    matches an error message that just happens to contain '500'. All other
+    keys are searched for as a substring of the exception string.
+
+    Args:
+        exc_conf: The _EXCEPTIONS config dict for this exception type,
+                  without the '' default key.
+        e: The Exception that was raised
+
+    Returns:
+        A list of matching values from the exc_conf dict.
+    """
+    code = getattr(e, 'code', None)
+    matched = []
+    for key, exc in exc_conf.items():
+        if isinstance(key, int) or str(key).isdigit():
+            if code is not None and int(key) == code:
+                matched.append(exc)
+        elif key in str(e):
+            matched.append(exc)
+    return matched
+
+
 def _retry(*f_or_args, **options):
     """Coroutine-compatible Retry Decorator.
 
     This decorator provides a simple retry mechanism that compares the
     exceptions it received against a configuration list (self._EXCEPTIONS), and
     then performs the action defined in that list. For example, an HTTPError
-    with a '500' code might want to retry 3 times. On the otherhand, a 401/403
+    with a 500 code might want to retry 3 times. On the otherhand, a 401/403
     might want to throw an InvalidCredentials exception.
 
+    Between retries we back off exponentially (with jitter). If the remote
+    endpoint supplied a Retry-After header with a 429 or 503 response, that
+    value is used instead -- up to `max_delay`. If the Retry-After is past
+    the deadline of the calling actor, we give up right away.
+
     Examples:
 
     >>> @_retry
         def some_func(self):
             yield ...
 
-    >>> @_retry(retries=5):
+    >>> @_retry(retries=5, delay=1, max_delay=60):
         def some_func(self):
             yield ...
 
@@ -63,6 +244,8 @@ def _retry(*f_or_args, **options):
     # Defaults...
     retries = 3
     delay = 0.25
+    backoff = 2
+    max_delay = 30
 
     # Have to determine if invoked as @_retry or @_retry()
     if len(f_or_args) == 1 and callable(f_or_args[0]):
@@ -74,6 +257,8 @@ def _retry(*f_or_args, **options):
         _call_with_args = True
         retries = options.pop('retries', retries)
         delay = options.pop('delay', delay)
+        backoff = options.pop('backoff', backoff)
+        max_delay = options.pop('max_delay', max_delay)
 
     def decorator(f_or_self, *args, **kwargs):
         # Depending on how this decorator is invoked
@@ -102,8 +287,8 @@ def _retry(*f_or_args, **options):
             while True:
                 # Don't log out the first try as a 'Try' ... just do it
                 if i > 1:
-                    log.debug('Try (%s/%s) of %s(%s, %s)' %
-                              (i, retries, f, args, safe_kwargs))
+                    log.debug('Try (%s/%s) of %s(%s, %s)',
+                              i, retries, f, args, safe_kwargs)
 
                 # Attempt the method. Catch any exception listed in
                 # self._EXCEPTIONS.
@@ -115,11 +300,11 @@ def _retry(*f_or_args, **options):
                     error = str(e)
                     if hasattr(e, 'message'):
                         error = e.message
-                    log.warning('Exception raised on try %s: %s' % (i, error))
+                    log.warning('Exception raised on try %s: %s', i, error)
 
                     # If we've run out of retry attempts, raise the exception
                     if i >= retries:
-                        log.debug('Raising exception: %s' % e)
+                        log.debug('Raising exception: %s', e)
                         raise e
 
                     # Gather the config for this exception-type from
@@ -131,14 +316,13 @@ def _retry(*f_or_args, **options):
                     # It's optional, but can match before others match, so we
                     # pop it before searching.
                     default_exc = exc_conf.pop('', False)
-                    log.debug('Searching through %s' % exc_conf)
-                    matched_exc = [exc for key, exc in exc_conf.items()
-                                   if key in str(e)]
+                    log.debug('Searching through %s', exc_conf)
+                    matched_exc = _match_exception(exc_conf, e)
 
-                    log.debug('Matched exceptions: %s' % matched_exc)
+                    log.debug('Matched exceptions: %s', matched_exc)
                     if matched_exc and matched_exc[0] is not None:
                         exception = matched_exc[0]
-                        log.debug('Matched exception: %s' % exception)
+                        log.debug('Matched exception: %s', exception)
                         raise exception(error)
                     elif matched_exc and matched_exc[0] is None:
                         log.debug('Exception is retryable!')
@@ -152,10 +336,26 @@ def _retry(*f_or_args, **options):
                                   ' found. Raising.')
                         raise e
 
-                    # Must have been a retryable exception. Retry.
+                    # Must have been a retryable exception. Retry, but
+                    # honor the remote endpoints Retry-After header if one
+                    # was supplied.
+                    wait = _get_retry_after(e)
+                    remaining = cancel.remaining()
+                    if wait is None:
+                        wait = _backoff_delay(i, delay, backoff, max_delay)
+                    elif remaining is not None and wait >= remaining:
+                        log.debug('Retry-After of %.2fs is past the '
+                                  'deadline. Raising exception: %s', wait, e)
+                        raise e
+                    else:
+                        wait = min(wait, max_delay)
+                    if remaining is not None:
+                        wait = min(wait, max(remaining, 0))
                     i = i + 1
-                    log.debug('Retrying in %s...' % delay)
-                    yield utils.tornado_sleep(delay)
+                    trace.record_retry()
+                    metrics.RETRIES.inc(decorator='api._retry')
+                    log.debug('Retrying in %.2f...', wait)
+                    yield utils.tornado_sleep(wait)
 
                 log.debug('Retrying..')
 
@@ -171,20 +371,52 @@ def _retry(*f_or_args, **options):
     return decorator
 
 
-def create_http_method(name, http_method):
+def decode_json(body):
+    """Decodes a JSON response body.
+
+    Bodies that are not valid JSON are returned as-is, rather than raising an
+    exception. This is the default RestClient decoder.
+    """
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body
+
+
+def decode_raw(body):
+    """Returns the response body exactly as it was received."""
+    return body
+
+
+def create_http_method(name, http_method, config=None):
     """Creates the get/put/delete/post coroutined-method for a resource.
 
-    This method is called during the __init__ of a RestConsumer object. The
-    method creates a custom method thats handles a GET, PUT, POST or DELETE
-    through the Tornado HTTPClient class.
+    This method is called once per resource when a RestConsumer class is
+    created. The method creates a custom method thats handles a GET, PUT, POST
+    or DELETE through the Tornado HTTPClient class.
+
+    The method config may supply a 'decoder' (see RestClient.fetch()) for
+    endpoints that do not return JSON, and can set 'cache' for calls that
+    have no side effects:
+
+        'http_methods': {'get': {'decoder': api.decode_raw, 'cache': True}}
 
     Args:
+        name: Name of the generated method (http_get, http_put, ...)
         http_method: Name of the method (get, put, post, delete)
+        config: The configuration dict for this HTTP method
 
     Returns:
         A method appropriately configured and named.
     """
 
+    # Only pass the options that were actually configured on to fetch(), so
+    # that custom RestClient.fetch() methods need not support them all.
+    fetch_kwargs = {}
+    for option in ('decoder', 'cache'):
+        if config and option in config:
+            fetch_kwargs[option] = config[option]
+
     @gen.coroutine
     def method(self, *args, **kwargs):
         # We don't support un-named args. Throw an exception.
@@ -196,117 +428,177 @@ def create_http_method(name, http_method):
             method=http_method.upper(),
             params=kwargs,
             auth_username=self._CONFIG.get('auth', {}).get('user'),
-            auth_password=self._CONFIG.get('auth', {}).get('pass')
+            auth_password=self._CONFIG.get('auth', {}).get('pass'),
+            **fetch_kwargs
         )
         raise gen.Return(ret)
 
-    method.__name__ = http_method
+    method.__name__ = name
     return method
 
 
-def create_method(name, config):
-    """Creates a RestConsumer object.
-
-    Configures a fresh RestConsumer object with the supplied configuration
-    bits. The configuration includes information about the name of the method
-    being consumed and the configuration of that method (which HTTP methods it
-    supports, etc).
+def create_method(name, resource):
+    """Creates an access method that returns a RestConsumer resource object.
 
-    The final created method accepts any args (`*args, **kwargs`) and passes
-    them on to the RestConsumer object being created. This allows for passing
+    The final created method accepts any kwargs and passes them on to the
+    `resource` RestConsumer class being instantiated. This allows for passing
     in unique resource identifiers (ie, the '%res%' in
     '/v2/rooms/%res%/history').
 
     Args:
-        name: The name passed into the RestConsumer object
-        config: The config passed into the RestConsumer object
+        name: The name of the method
+        resource: The RestConsumer class to instantiate
 
     Returns:
-        A method that returns a fresh RestConsumer object
+        A method that returns a fresh `resource` object
     """
 
-    def method(self, *args, **kwargs):
+    def method(self, **kwargs):
         # Merge the supplied kwargs to the method with any kwargs supplied to
         # the RestConsumer parent object. This ensures that tokens replaced in
         # the 'path' variables are passed all the way down the instantiation
         # chain.
         merged_kwargs = dict(self._kwargs.items() + kwargs.items())
 
-        return self.__class__(
-            name=name,
-            config=self._attrs[name],
-            client=self._client,
-            *args, **merged_kwargs)
+        return resource(client=self._client, **merged_kwargs)
 
     method.__name__ = name
     return method
 
 
+class _Unsupported(object):
+
+    """Descriptor that hides an inherited method from a RestConsumer resource.
+
+    Resource classes are subclasses of the RestConsumer they were described
+    in, so they would otherwise inherit access methods that their own config
+    does not list (ie, http_delete() on a resource that only supports GETs).
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        raise AttributeError(self.name)
+
+
+class RestConsumerMeta(type):
+
+    """Builds the RestConsumer access methods once, at class-creation time.
+
+    For every class, the `_CONFIG` dictionary is read and the GET, PUT, POST
+    and DELETE methods listed in CONFIG['http_methods'] become @coroutine
+    wrapped `http_<method>()` methods on the class.
+
+    For each item listed in CONFIG['attrs'], a new RestConsumer subclass is
+    generated (with that item as its `_RESOURCE_CONFIG`), and an access method
+    that instantiates it is added to the class. These are generated
+    recursively, so the whole API tree is described up front and creating a
+    resource object does nothing more than fill in its path.
+    """
+
+    def __new__(mcs, name, bases, attrs):
+        # Resource objects only carry a path, kwargs and a client.
+        attrs.setdefault('__slots__', ())
+        cls = super(RestConsumerMeta, mcs).__new__(mcs, name, bases, attrs)
+
+        # User-defined classes are configured by their _CONFIG. Generated
+        # resource classes are handed their piece of the _CONFIG directly,
+        # along with the user-defined class they belong to.
+        if '_RESOURCE_CONFIG' not in attrs:
+            cls._RESOURCE_CONFIG = cls._CONFIG
+            cls._ROOT = cls
+        config = cls._RESOURCE_CONFIG
+
+        http_methods = config.get('http_methods') or {}
+        resources = config.get('attrs') or {}
+
+        # Record what we generate before building the resource classes
+        # below, so that they know which of our methods to hide.
+        methods = {}
+        inherited = set()
+        for base in cls.__mro__[1:]:
+            inherited.update(getattr(base, '_GENERATED', ()))
+        cls._GENERATED = frozenset(
+            ['http_%s' % m for m in http_methods] + resources.keys())
+
+        for method, method_config in http_methods.items():
+            full_method_name = 'http_%s' % method
+            methods[full_method_name] = create_http_method(
+                full_method_name, method, method_config)
+
+        for attr, attr_config in resources.items():
+            resource = mcs(name, (cls._ROOT,), {
+                '__module__': cls.__module__,
+                '_RESOURCE_CONFIG': attr_config,
+                '_ROOT': cls._ROOT})
+            methods[attr] = create_method(attr, resource)
+
+        # Hide any generated methods we inherited that this resource does
+        # not support.
+        for method_name in inherited:
+            methods.setdefault(method_name, _Unsupported(method_name))
+
+        for method_name, method in methods.items():
+            # Methods written by hand in the class body always win.
+            if method_name not in attrs:
+                setattr(cls, method_name, method)
+
+        return cls
+
+
 class RestConsumer(object):
 
     """An abstract object that self-defines its own API access methods.
 
-    At init time, this object reads its `_CONFIG` and pre-defines all of the
-    API access methods that have been described. It does not handle actual HTTP
-    calls directly, but is passed in a `client` object (anything that
-    subclasses the RestClient class) and leverages that for the actual web
-    calls.
+    When the class is created, its `_CONFIG` is read and all of the API access
+    methods that have been described are pre-defined (see RestConsumerMeta).
+    It does not handle actual HTTP calls directly, but is passed in a `client`
+    object (anything that subclasses the RestClient class) and leverages that
+    for the actual web calls.
     """
 
+    __metaclass__ = RestConsumerMeta
+    __slots__ = ('_path', '_kwargs', '_client')
+
     _CONFIG = {}
     _ENDPOINT = None
 
-    def __init__(self, name=None, config=None, client=None, *args, **kwargs):
+    def __init__(self, client=None, **kwargs):
         """Initialize the RestConsumer object.
 
-        The generic RestConsumer object (with no parameters passed in) looks at
-        the self.__class__._CONFIG dictionary and dynamically generates access
-        methods for the various API methods.
-
         The GET, PUT, POST and DELETE methods optionally listed in
         CONFIG['http_methods'] represent the possible types of HTTP methods
         that the CONFIG['path'] supports. For each one of these listed, a
-        @coroutine wrapped get/put/post/delete() method will be created in the
+        @coroutine wrapped get/put/post/delete() method exists on the
         RestConsumer that knows how to make the HTTP request.
 
-        For each item listed in CONFIG['attrs'], an access method is created
-        that will dynamically create and return a new RestConsumer object thats
-        configured for this endpoint. These methods are not asynchronous, but
-        are non-blocking.
+        For each item listed in CONFIG['attrs'], an access method exists that
+        will create and return a new RestConsumer object thats configured for
+        this endpoint. These methods are not asynchronous, but are
+        non-blocking.
 
         Args:
-            name: Name of the resource method (default: None)
-            config: The dictionary object with the configuration for this API
-                    endpoint call.
-            client: <TBD>
-            *args,**kwargs: <TBD>
+            client: RestClient object used to make the HTTP calls
+                    (default: a new RestClient)
+            **kwargs: Tokens used to fill in the path (ie, '%res%'). These
+                      are passed down to any resource objects created from
+                      this one.
         """
-        # If these aren't passed in, then get them from the class definition
-        name = name or self.__class__.__name__
-        config = config or self._CONFIG
-
-        # Get the basic options for this particular REST endpoint access object
-        self._path = config.get('path', None)
-        self._http_methods = config.get('http_methods', None)
-        self._attrs = config.get('attrs', None)
         self._kwargs = kwargs
 
         # If no client was supplied, then we
         self._client = client or RestClient()
 
-        # Ensure that any tokens that need filling-in in the self._path setting
-        # are pulled from the **kwargs passed into this init. This is used on
-        # API paths like Hipchats '/v2/room/%(res)/...' URLs.
-        self._path = self._replace_path_tokens(self._path, kwargs)
-
-        # Create all of the methods based on the self._http_methods and
-        # self._attrs dict.
-        self._create_methods()
-        self._create_attrs()
+        # Ensure that any tokens that need filling-in in the path setting are
+        # pulled from the **kwargs passed into this init. This is used on API
+        # paths like Hipchats '/v2/room/%(res)/...' URLs.
+        self._path = self._replace_path_tokens(
+            self._RESOURCE_CONFIG.get('path', None), kwargs)
 
         # Log some things
-        log.debug('%s/%s initialized' %
-                  (self.__class__.__name__, self._client))
+        log.debug('%s/%s initialized',
+                  self.__class__.__name__, self._client)
 
     def __repr__(self):
         return '%s(%s)' % (self.__class__.__name__, self)
@@ -338,41 +630,13 @@ class RestConsumer(object):
 
         return path
 
-    def _create_methods(self):
-        """Create @gen.coroutine wrapped HTTP methods.
-
-        Iterates through the methods described in self._methods and creates
-        @gen.coroutine wrapped access methods that perform these actions.
-        """
-        if not self._http_methods:
-            return
-
-        for name in self._http_methods.keys():
-            full_method_name = 'http_%s' % name
-            method = create_http_method(full_method_name, name)
-            setattr(self,
-                    full_method_name,
-                    types.MethodType(method, self, self.__class__))
-
-    def _create_attrs(self):
-        """Creates access methods to the attributes in self._attrs.
-
-        Iterates through the attributes described in self._attrs and creates
-        access methods that return RestConsumer objects for those attributes.
-        """
-        if not self._attrs:
-            return
-
-        for name in self._attrs.keys():
-            method = create_method(name, self._attrs[name])
-            setattr(self, name, types.MethodType(method, self, self.__class__))
-
 
 class RestClient(object):
 
     """Very simple REST client for the RestConsumer. Implements a
-    AsyncHTTPClient(), some convinience methods for URL escaping, and a single
-    fetch() method that can handle GET/POST/PUT/DELETEs.
+    AsyncHTTPClient() (see `kingpin.actors.support.transport`), some
+    convinience methods for URL escaping, and a single fetch() method that can
+    handle GET/POST/PUT/DELETEs.
 
     This code is nearly identical to the kingpin.actors.base.BaseHTTPActor
     class, but is not actor-specific.
@@ -383,20 +647,30 @@ class RestClient(object):
 
     _EXCEPTIONS = {
         httpclient.HTTPError: {
-            '401': exceptions.InvalidCredentials,
-            '403': exceptions.InvalidCredentials,
-            '500': None,
-            '502': None,
-            '503': None,
-            '504': None,
+            401: exceptions.InvalidCredentials,
+            403: exceptions.InvalidCredentials,
+
+            # Too Many Requests. Retried after the Retry-After header.
+            429: None,
+
+            500: None,
+            502: None,
+            503: None,
+            504: None,
 
             # Rrepresents a standard HTTP Timeout
-            '599': None,
+            599: None,
 
             '': exceptions.RecoverableActorFailure,
         }
     }
 
+    # Number of consecutive server-side failures (5xx, 599) against a single
+    # host before we stop sending it requests, and how long (in seconds) we
+    # wait before trying it again. See CircuitBreaker.
+    _CIRCUIT_THRESHOLD = 5
+    _CIRCUIT_RESET_TIMEOUT = 30
+
     def __init__(self, client=None, headers=None):
         self._client = client or httpclient.AsyncHTTPClient()
         self._private_kwargs = ['auth_password']
@@ -428,19 +702,30 @@ class RestClient(object):
 
         # Now generate the URL
         full_url = httputil.url_concat(url, sorted(args.items()))
-        log.debug('Generated URL: %s' % full_url)
+        log.debug('Generated URL: %s', full_url)
 
         return full_url
 
-    # TODO: Add a retry/backoff timer here. If the remote endpoint returns
-    # garbled data (ie, maybe a 500 errror or something else thats not in
-    # JSON format, we should back off and try again.
     @gen.coroutine
     @_retry
     def fetch(self, url, method, params={},
-              auth_username=None, auth_password=None):
+              auth_username=None, auth_password=None,
+              decoder=decode_json, streaming_callback=None, cache=False):
         """Executes a web request asynchronously and yields the body.
 
+        The response body is passed through `decoder` before being returned.
+        By default this parses JSON (see decode_json()), but decode_raw() or
+        any other callable can be used for endpoints that return something
+        else.
+
+        If a `streaming_callback` is supplied, each chunk of the body is
+        handed to it as it arrives and nothing is returned. The body is never
+        held in memory. Note that a retried request streams its body again.
+
+        Requests that have no side effects can set `cache`, so that identical
+        requests share one response for a few minutes (see
+        `kingpin.actors.support.transport.fetch()`).
+
         Args:
             url: (Str) The full url path of the API call
             params: (Dict) Arguments (k/v pairs) to submit either as POST data
@@ -448,6 +733,12 @@ class RestClient(object):
             method: (Str) GET/PUT/POST/DELETE
             auth_username: (str) HTTP auth username
             auth_password: (str) HTTP auth password
+            decoder: Callable that turns the response body into the return
+                     value.
+            streaming_callback: Callable that receives each chunk of the
+                                response body.
+            cache: (Bool) Whether the response may be shared with identical
+                   requests.
         """
 
         # Start with empty post data. If we're doing a PUT/POST, then just pass
@@ -461,7 +752,7 @@ class RestClient(object):
             url = self._generate_escaped_url(url, params)
 
         # Generate the full request URL and log out what we're doing...
-        log.debug('Making %s request to %s. Data: %s' % (method, url, body))
+        log.debug('Making %s request to %s. Data: %s', method, url, body)
 
         # Create the http_request object
         http_request = httpclient.HTTPRequest(
@@ -472,26 +763,39 @@ class RestClient(object):
             auth_username=auth_username,
             auth_password=auth_password,
             follow_redirects=True,
-            max_redirects=10)
+            max_redirects=10,
+            streaming_callback=streaming_callback,
+            **transport.request_options())
 
         # Execute the request and raise any exception. Exceptions are not
         # caught here because they are unique to the API endpoints, and thus
         # should be handled by the individual Actor that called this method.
-        log.debug('HTTP Request: %s' % http_request)
+        log.debug('HTTP Request: %s', http_request)
+        breaker = get_circuit_breaker(
+            url,
+            threshold=self._CIRCUIT_THRESHOLD,
+            reset_timeout=self._CIRCUIT_RESET_TIMEOUT)
+        breaker.check()
+        host = urlparse.urlparse(url).hostname
         try:
-            http_response = yield self._client.fetch(http_request)
+            with (yield budget.acquire('http', host)):
+                http_response = yield transport.fetch(
+                    self._client, http_request, cache=cache)
         except httpclient.HTTPError as e:
-            log.critical('Request for %s failed: %s' % (url, e))
+            log.critical('Request for %s failed: %s', url, e)
+            if e.code >= 500:
+                breaker.failure()
             raise
-        log.debug('HTTP Response: %s' % http_response.body)
+        breaker.success()
 
-        try:
-            body = json.loads(http_response.body)
-        except ValueError:
-            raise gen.Return(http_response.body)
+        # The body has already been handed off, chunk by chunk.
+        if streaming_callback:
+            raise gen.Return()
+
+        log.debug('HTTP Response: %s', http_response.body)
 
         # Receive a successful return
-        raise gen.Return(body)
+        raise gen.Return(decoder(http_response.body))
 
 
 class SimpleTokenRestClient(RestClient):
@@ -519,3 +823,69 @@ class SimpleTokenRestClient(RestClient):
         kwargs['params'].update(self._tokens)
         ret = yield super(SimpleTokenRestClient, self).fetch(*args, **kwargs)
         raise gen.Return(ret)
+
+
+class Paginator(object):
+
+    """Walks through a paginated list endpoint one page at a time.
+
+    Many list endpoints (ie, Pingdom's /checks) accept a limit and offset.
+    Rather than fetching (and holding onto) every item at once, a Paginator
+    requests `limit` items at a time and hands back each page as it is
+    fetched. Only the current page is held in memory.
+
+    Example:
+        >>> pages = api.Paginator(client.checks().http_get, key='checks')
+        >>> while True:
+        ...     page = yield pages.next()
+        ...     if not page:
+        ...         break
+        ...     for check in page:
+        ...         ...
+
+    Args:
+        method: The http_get() (or other) method of a RestConsumer resource
+        key: Key in the response that holds the list of items. If None, the
+             response itself is the list.
+        limit: Number of items to request per page
+        limit_param: Name of the 'limit' argument for this API
+        offset_param: Name of the 'offset' argument for this API
+        **kwargs: Any other arguments to pass on every request
+    """
+
+    def __init__(self, method, key=None, limit=100,
+                 limit_param='limit', offset_param='offset', **kwargs):
+        self._method = method
+        self._key = key
+        self._limit = limit
+        self._limit_param = limit_param
+        self._offset_param = offset_param
+        self._kwargs = kwargs
+        self._offset = 0
+        self._done = False
+
+    @gen.coroutine
+    def next(self):
+        """Fetches the next page of items.
+
+        Returns:
+            A list of items, or None once every page has been fetched.
+        """
+        if self._done:
+            raise gen.Return()
+
+        kwargs = dict(self._kwargs)
+        kwargs[self._limit_param] = self._limit
+        kwargs[self._offset_param] = self._offset
+        response = yield self._method(**kwargs)
+
+        items = response
+        if self._key is not None:
+            items = response.get(self._key, [])
+
+        # A short (or empty) page means there is nothing left to get.
+        if len(items) < self._limit:
+            self._done = True
+        self._offset += len(items)
+
+        raise gen.Return(items or None)
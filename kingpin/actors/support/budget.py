@@ -0,0 +1,200 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.budget`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+Plan-wide limits on the number of concurrent calls to each remote API.
+
+The remote APIs enforce their own rate limits, no matter how many actors
+Kingpin runs at the same time. A *budget* caps the number of calls that are
+in flight to one provider across the whole run:
+
+:aws:
+  Every `kingpin.actors.aws.base.AWSBaseActor.thread` call
+
+:rightscale:
+  Every call made by `kingpin.actors.rightscale.api.RightScale`
+
+:http:
+  Every `kingpin.actors.support.api.RestClient.fetch` request
+
+A budget can also be set for a single endpoint of a provider, as
+``<provider>/<endpoint>``: the AWS region (ie, ``aws/us-west-2``) or the host
+name of a REST API (ie, ``http/api.slack.com``). A call then has to fit in both
+the provider and the endpoint budget.
+
+Providers without a budget are not limited at all. A call holds its slot only
+while it is in flight -- not while it waits between retries. The time spent
+waiting for a slot is recorded in the ``kingpin_budget_wait_seconds`` metric.
+
+Budgets are configured with `configure()` (see the ``--budget`` option of
+``kingpin``), or with the ``KINGPIN_BUDGETS`` environment variable, which holds
+a JSON object like ``{"aws": 50, "rightscale": 20}``.
+"""
+
+import contextlib
+import functools
+import logging
+import os
+import time
+
+from tornado import gen
+from tornado import locks
+import simplejson as json
+
+from kingpin.actors.support import cancel
+from kingpin.actors.support import metrics
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+WAIT_TIME = metrics.histogram(
+    'kingpin_budget_wait_seconds',
+    'Time that calls spent waiting for a slot in a concurrency budget.',
+    labels=('budget',))
+IN_FLIGHT = metrics.gauge(
+    'kingpin_budget_in_flight',
+    'Calls holding a slot in a concurrency budget.',
+    labels=('budget',))
+
+# Budget name -> Semaphore
+_BUDGETS = {}
+
+
+def configure(limits):
+    """Sets the concurrency budgets, replacing any previous ones.
+
+    Args:
+        limits: Dict of budget name (``<provider>`` or
+                ``<provider>/<endpoint>``) -> maximum number of concurrent
+                calls
+
+    Raises:
+        ValueError: If a limit is not a positive number
+    """
+    budgets = {}
+    for name, limit in limits.items():
+        if int(limit) < 1:
+            raise ValueError('Budget %s must be at least 1: %s' %
+                             (name, limit))
+        budgets[name.lower()] = locks.Semaphore(int(limit))
+        log.debug('Allowing %s concurrent calls to %s', limit, name)
+
+    _BUDGETS.clear()
+    _BUDGETS.update(budgets)
+
+
+def parse(spec):
+    """Parses a ``NAME=LIMIT`` budget setting.
+
+    Returns:
+        A (name, limit) tuple
+
+    Raises:
+        ValueError
+    """
+    name, sep, limit = spec.partition('=')
+    if not sep or not name.strip():
+        raise ValueError('Budgets look like NAME=LIMIT, not %s' % spec)
+    return name.strip(), int(limit)
+
+
+@gen.coroutine
+def acquire(provider, endpoint=None):
+    """Waits for a slot in the budgets of `provider` (and `endpoint`).
+
+    Example:
+        >>> with (yield budget.acquire('aws', 'us-west-2')):
+        ...     yield self._thread(function)
+
+    Args:
+        provider: Name of the provider
+        endpoint: Name of the endpoint of the provider, if any
+
+    Raises:
+        gen.Return(<context manager that gives the slots back>)
+        kingpin.actors.exceptions.ActorCancelled: If the caller was cancelled
+        while it waited.
+    """
+    names = [provider]
+    if endpoint:
+        names.append('%s/%s' % (provider, endpoint.lower()))
+
+    # Always in the same order (provider, then endpoint), so that two calls
+    # can't each hold the slot that the other one is waiting for.
+    held = []
+    try:
+        for name in names:
+            semaphore = _BUDGETS.get(name)
+            if semaphore is None:
+                continue
+            start = time.time()
+            yield semaphore.acquire()
+            held.append((name, semaphore))
+            IN_FLIGHT.inc(budget=name)
+            WAIT_TIME.observe(time.time() - start, budget=name)
+
+        # Do not start a call that nobody is waiting for anymore
+        cancel.check()
+    except Exception:
+        _release(held)
+        raise
+
+    raise gen.Return(_releasing(held))
+
+
+def _release(held):
+    for name, semaphore in held:
+        IN_FLIGHT.dec(budget=name)
+        semaphore.release()
+
+
+@contextlib.contextmanager
+def _releasing(held):
+    try:
+        yield
+    finally:
+        _release(held)
+
+
+def limit(provider):
+    """Decorator that runs a Future-returning method within a budget.
+
+    Used on methods that are decorated with `run_on_executor`, so that the
+    call only takes a thread once it has a slot.
+
+    Example:
+        >>> @budget.limit('rightscale')
+        ... @concurrent.run_on_executor
+        ... def find_server_arrays(self, name):
+        ...     ...
+
+    Args:
+        provider: Name of the provider
+    """
+    def decorator(f):
+        @gen.coroutine
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with (yield acquire(provider)):
+                ret = yield f(*args, **kwargs)
+            raise gen.Return(ret)
+        return wrapper
+    return decorator
+
+
+if os.getenv('KINGPIN_BUDGETS'):
+    configure(json.loads(os.getenv('KINGPIN_BUDGETS')))
@@ -0,0 +1,174 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.cancel`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+Cooperative cancellation (and deadlines) of actors that nobody is waiting on
+anymore.
+
+Tornado can not kill a coroutine, so an actor that timed out (or whose group
+gave up on it) used to keep polling its API until Kingpin exited. Now every
+execution of an actor runs under a `Token`. The token is cancelled when the
+execution times out or fails, and cancelling a token also cancels the tokens
+of everything that was started underneath it.
+
+Like the spans of `kingpin.actors.support.trace`, the current token follows
+the code across the IOLoop using a Tornado `StackContext`. The long running
+parts of Kingpin -- `kingpin.utils.tornado_sleep`, the retry decorators and
+the repeating log messages -- call `check()`, which raises
+`kingpin.actors.exceptions.ActorCancelled` once the work they are doing has
+been abandoned. Actors with their own loops can call `check()` as well.
+
+A token may also have a deadline, which is inherited the same way: the time
+left for a piece of work is the least of its own timeout and the time left
+for everything that started it (see `remaining()`). A token whose deadline
+has passed counts as cancelled. Deadlines are kept on a `monotonic()` clock,
+so they are not thrown off when the system clock is changed. ``kingpin``
+runs its IOLoop on the same clock, so that the timers which enforce the
+deadlines (ie, in `gen.with_timeout`) are not thrown off either.
+
+On Python 2 the monotonic clock comes from the ``monotime`` package (see
+requirements.txt). Without it, `monotonic()` falls back to a clock that only
+refuses to go backwards -- a clock that is set back stalls the deadlines
+until it catches up, and one that is set forward brings them closer.
+"""
+
+import contextlib
+import logging
+import time
+
+from tornado.platform import auto as tornado_platform
+
+from kingpin.actors import exceptions
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+# The Token that the code running right now belongs to
+_CURRENT = None
+
+# The last reading of the fallback monotonic() clock
+_LAST_TIME = [0.0]
+
+
+def _never_backwards_time():
+    """time.time(), except that it never goes backwards."""
+    _LAST_TIME[0] = max(_LAST_TIME[0], time.time())
+    return _LAST_TIME[0]
+
+
+# Seconds on a clock that never goes backwards. Tornado finds a real
+# monotonic clock (time.monotonic(), or the `monotime` package) when there is
+# one -- on Python 2 that takes the `monotime` package.
+monotonic = tornado_platform.monotonic_time or _never_backwards_time
+
+
+class Token(object):
+
+    """Tells a piece of work (and everything it started) to stop.
+
+    Args:
+        parent: The Token of the work that started this work. Cancelling the
+                parent also cancels this token.
+        timeout: Seconds that this work may take (None for no limit). The
+                 deadline of the parent applies as well.
+    """
+
+    def __init__(self, parent=None, timeout=None):
+        self.parent = parent
+        self.deadline = None
+        if timeout is not None:
+            self.deadline = monotonic() + timeout
+        self._reason = None
+
+    @property
+    def cancelled(self):
+        return self.reason is not None
+
+    @property
+    def reason(self):
+        """Why the token was cancelled (or None, if it was not)."""
+        if self._reason is not None:
+            return self._reason
+        if self.deadline is not None and self.deadline <= monotonic():
+            return 'deadline passed'
+        if self.parent is not None:
+            return self.parent.reason
+        return None
+
+    def remaining(self):
+        """Seconds left until the earliest deadline of this token and its
+        parents, or None if there is no deadline at all."""
+        deadlines = []
+        token = self
+        while token is not None:
+            if token.deadline is not None:
+                deadlines.append(token.deadline)
+            token = token.parent
+        if not deadlines:
+            return None
+        return min(deadlines) - monotonic()
+
+    def cancel(self, reason='cancelled'):
+        """Cancels the token. Only the first reason is kept."""
+        if self._reason is None:
+            log.debug('Cancelling: %s', reason)
+            self._reason = reason
+
+    def check(self):
+        """Raises ActorCancelled if the token was cancelled."""
+        reason = self.reason
+        if reason is not None:
+            raise exceptions.ActorCancelled(
+                'Execution was cancelled: %s' % reason)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Context manager that makes this the current token.
+
+        Used as a StackContext factory, so that it is re-entered every time
+        the IOLoop runs a callback that belongs to this work.
+        """
+        global _CURRENT
+        previous = _CURRENT
+        _CURRENT = self
+        try:
+            yield
+        finally:
+            _CURRENT = previous
+
+
+def current():
+    """Returns the Token that the running code belongs to, or None."""
+    return _CURRENT
+
+
+def cancelled():
+    """Whether the running code belongs to cancelled work."""
+    return _CURRENT is not None and _CURRENT.cancelled
+
+
+def check():
+    """Raises ActorCancelled if the running code belongs to cancelled work."""
+    if _CURRENT is not None:
+        _CURRENT.check()
+
+
+def remaining():
+    """Seconds left for the running code, or None if there is no deadline."""
+    if _CURRENT is None:
+        return None
+    return _CURRENT.remaining()
@@ -0,0 +1,203 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.checkpoint`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+Records the actors that finished successfully, so that a failed deployment
+can be resumed where it stopped.
+
+Each actor gets a key when it is created: a hash of its type, description,
+options and condition after the context has been filled in. Actors with
+exactly the same configuration are told apart by the order in which they
+were created, which is the same from one run of a script to the next. When
+a (non-dry) actor succeeds, its key is appended to the checkpoint file.
+
+When the checkpoint is opened with ``resume=True``, actors whose keys are
+already in the file are skipped. Any change to the configuration of an
+actor (or to the tokens and contexts it uses) changes its key, so the
+actor runs again. A group actor that finished is skipped as a whole.
+
+A dry actor gets the same key as the real one, so the rehearsal of a resumed
+deployment skips the completed actors as well. Otherwise actors that can
+only run once (ie, creating a stack that now exists) would fail the
+rehearsal.
+
+The values that a completed actor published in the runtime context (see
+`kingpin.actors.support.runtime`) are kept in the file too, and published
+again when the deployment is resumed.
+
+The checkpoint file has one JSON object per line, and is only ever appended
+to. A line that was cut short by a crash is ignored.
+"""
+
+import collections
+import hashlib
+import logging
+import time
+
+import simplejson as json
+
+from kingpin.actors.support import runtime
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+# The active Checkpoint object (or None when checkpointing is disabled)
+_CHECKPOINT = None
+
+
+class Checkpoint(object):
+
+    """The set of completed actors, backed by an append-only file.
+
+    Args:
+        path: The checkpoint file
+        resume: Load the actors completed by a previous run from `path`,
+                rather than starting a new (empty) file
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.completed = set()
+        self._seen = collections.Counter()
+
+        complete_line = True
+        if resume:
+            complete_line = self._load()
+        self._file = open(path, 'a' if resume else 'w')
+
+        # Don't append to a line that was cut short
+        if not complete_line:
+            self._file.write('\n')
+
+    def _load(self):
+        """Loads the completed keys from the checkpoint file.
+
+        Returns:
+            False if the last line of the file was cut short
+        """
+        line = ''
+        try:
+            f = open(self.path)
+        except IOError as e:
+            log.warning('Could not read checkpoint %s (%s), '
+                        'starting from the beginning', self.path, e)
+            return True
+
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.completed.add(entry['key'])
+                except (ValueError, KeyError):
+                    log.debug('Ignoring a bad checkpoint line: %r', line)
+                    continue
+
+                for name, value in entry.get('outputs', {}).items():
+                    runtime.publish(name, value)
+
+        log.info('Resuming: %s actor(s) completed in previous runs',
+                 len(self.completed))
+        return not line or line.endswith('\n')
+
+    def key(self, actor):
+        """Returns the checkpoint key for a newly created actor.
+
+        Args:
+            actor: A `kingpin.actors.base.BaseActor` object
+        """
+        config = json.dumps({'type': actor._type,
+                             'desc': actor._desc,
+                             'options': actor._options,
+                             'condition': actor._condition,
+                             'warn_on_failure': actor._warn_on_failure},
+                            sort_keys=True)
+        digest = hashlib.sha1(config).hexdigest()
+
+        # The rehearsal creates all of the actors once more, so the dry and
+        # the real actors are counted separately.
+        self._seen[(actor._dry, digest)] += 1
+        return '%s-%s' % (digest, self._seen[(actor._dry, digest)])
+
+    def is_completed(self, key):
+        return key in self.completed
+
+    def record(self, key, actor):
+        """Appends a completed actor to the checkpoint file.
+
+        The file is flushed right away, because the whole point is to
+        survive the process dying unexpectedly.
+        """
+        self.completed.add(key)
+        entry = {'key': key,
+                 'type': actor._type,
+                 'desc': actor._desc,
+                 'time': time.time()}
+        if actor._outputs:
+            entry['outputs'] = actor._outputs
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def enable(path, resume=False):
+    """Starts checkpointing to `path`, and returns the Checkpoint object."""
+    global _CHECKPOINT
+    disable()
+    _CHECKPOINT = Checkpoint(path, resume=resume)
+    return _CHECKPOINT
+
+
+def disable():
+    """Stops checkpointing."""
+    global _CHECKPOINT
+    if _CHECKPOINT is not None:
+        _CHECKPOINT.close()
+        _CHECKPOINT = None
+
+
+def get_checkpoint():
+    """Returns the active Checkpoint object, or None."""
+    return _CHECKPOINT
+
+
+def key(actor):
+    """Returns the checkpoint key for `actor`.
+
+    Returns None when checkpointing is disabled.
+    """
+    if _CHECKPOINT is None:
+        return None
+    return _CHECKPOINT.key(actor)
+
+
+def is_completed(actor):
+    """Whether `actor` already finished in a previous run."""
+    if _CHECKPOINT is None or actor._checkpoint_key is None:
+        return False
+    return _CHECKPOINT.is_completed(actor._checkpoint_key)
+
+
+def record(actor):
+    """Records that `actor` finished successfully.
+
+    Dry actors are not recorded, they changed nothing.
+    """
+    if _CHECKPOINT is None or actor._checkpoint_key is None or actor._dry:
+        return
+    _CHECKPOINT.record(actor._checkpoint_key, actor)
@@ -0,0 +1,162 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.critical_path`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+Works out which chain of actors set the total runtime of a deployment, using
+the spans recorded by `kingpin.actors.support.trace`.
+
+The analysis only relies on the parent/child relationship of the spans and
+their start and end times, so it works the same way for `group.Sync`,
+`group.Async` (with or without `contexts`), `misc.Macro` and any third party
+actor that executes other actors.
+
+For every actor that executed children, the child that finished last is the
+one the parent was waiting on. Working backwards from it, the child that
+finished last before that one started is the one *it* was waiting on, and so
+on. Repeating this down the tree gives the critical path: the chain of actors
+that would have to get faster for the deployment to get faster. Every other
+child has *slack* -- the amount of time it could have taken longer without
+delaying its parent.
+"""
+
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+def _end(span):
+    return span.start + span.duration
+
+
+def _get_children(spans):
+    """Returns a dict of Span.id -> list of child Spans."""
+    children = {}
+    for span in spans:
+        if span.parent is not None:
+            children.setdefault(span.parent_id, []).append(span)
+    return children
+
+
+def _waited_on(kids):
+    """Returns the children, in order, that their parent had to wait for."""
+    chain = []
+    candidates = list(kids)
+    current = max(candidates, key=_end)
+    while current is not None:
+        chain.append(current)
+        candidates = [k for k in candidates
+                      if k is not current and _end(k) <= current.start]
+        current = max(candidates, key=_end) if candidates else None
+    chain.reverse()
+    return chain
+
+
+def _walk(span, children, path, slack):
+    """Fills in the critical `path` and `slack` lists below `span`."""
+    kids = children.get(span.id)
+    if not kids:
+        path.append(span)
+        return
+
+    chain = _waited_on(kids)
+    finish = max(_end(k) for k in kids)
+    for kid in kids:
+        if kid not in chain:
+            slack.append((finish - _end(kid), kid))
+
+    for kid in chain:
+        _walk(kid, children, path, slack)
+
+
+def analyze(spans, root=None, top=10):
+    """Builds a critical-path report from a list of spans.
+
+    Args:
+        spans: List of `kingpin.actors.support.trace.Span` objects
+        root: The Span to analyze (default: the last top-level span, which is
+              the real run when deploy.py did a dry run first)
+        top: How many of the slowest actors to list
+
+    Returns:
+        A dict with the keys:
+          root: The root Span
+          total: Seconds the root Span took
+          path: List of the leaf Spans on the critical path, in order
+          slack: List of (seconds, Span) tuples for the branches off the
+                 critical path, least slack first
+          slowest: The `top` slowest leaf Spans under `root`
+        Or None if there are no spans.
+    """
+    if root is None:
+        roots = [s for s in spans if s.parent is None]
+        if not roots:
+            return None
+        root = roots[-1]
+
+    children = _get_children(spans)
+
+    path = []
+    slack = []
+    _walk(root, children, path, slack)
+    slack.sort(key=lambda s: s[0])
+
+    # Gather every leaf actor under the root
+    leaves = []
+    pending = [root]
+    while pending:
+        span = pending.pop()
+        kids = children.get(span.id)
+        if kids:
+            pending.extend(kids)
+        else:
+            leaves.append(span)
+    leaves.sort(key=lambda s: s.duration, reverse=True)
+
+    return {'root': root,
+            'total': root.duration,
+            'path': path,
+            'slack': slack,
+            'slowest': leaves[:top]}
+
+
+def _describe(span):
+    parent = ' (in "%s")' % span.parent.desc if span.parent else ''
+    return '%8.2fs  %s "%s"%s' % (
+        span.duration, span.type, span.desc, parent)
+
+
+def format_report(report):
+    """Turns the output of analyze() into a list of printable lines."""
+    if report is None:
+        return ['No actors were executed.']
+
+    path_time = sum(s.duration for s in report['path'])
+    lines = ['Critical path: %.2fs of actor time over %.2fs total '
+             '(%s actors)' % (path_time, report['total'],
+                              len(report['path']))]
+    lines.extend(_describe(s) for s in report['path'])
+
+    if report['slack']:
+        lines.append('Slack on parallel branches:')
+        lines.extend('%8.2fs  slack for "%s" (in "%s")' %
+                     (seconds, span.desc, span.parent.desc)
+                     for seconds, span in report['slack'])
+
+    lines.append('Slowest actors:')
+    lines.extend(_describe(s) for s in report['slowest'])
+    return lines
@@ -0,0 +1,202 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.fake`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+In-process fake backends for the AWS and RightScale APIs.
+
+The fakes keep their state (ELBs, queues, stacks, server arrays, ...) in
+memory and stand in for the real remote services, so that whole deployments
+can be run (and benchmarked) without credentials or network access. Every
+fake API call goes through a `Behavior` object, which can add latency and
+randomly fail or throttle the call, to exercise the retry and error handling
+code paths of the actors.
+
+Fakes are installed with `install()`, or with the ``--fake-backends`` option
+of ``kingpin``:
+
+.. code-block:: bash
+
+    $ FAKE_BACKEND_LATENCY=0.2 FAKE_BACKEND_THROTTLE_RATE=0.1 \\
+      kingpin --fake-backends=aws,rightscale \\
+              --fake-backends-state=state.json -j deploy.json
+
+The optional state file pre-populates the fakes, keyed by backend name:
+
+.. code-block:: json
+
+    { "aws": { "elbs": [ { "name": "prod-web" } ],
+               "queues": [ { "name": "async-tasks", "messages": 5 } ] },
+      "rightscale": { "server_arrays": [ { "name": "prod-web",
+                                           "instances": 2 } ],
+                      "right_scripts": [ "restart-nginx" ] } }
+
+See `kingpin.actors.aws.fake` and `kingpin.actors.rightscale.fake` for the
+supported resources.
+
+**Optional Environment Variables**
+
+:FAKE_BACKEND_LATENCY:
+  Seconds added to every fake API call (default: 0)
+
+:FAKE_BACKEND_ERROR_RATE:
+  Fraction (0-1) of fake API calls that fail with a server error (default: 0)
+
+:FAKE_BACKEND_THROTTLE_RATE:
+  Fraction (0-1) of fake API calls that are throttled (default: 0)
+
+:FAKE_BACKEND_POLLS:
+  Number of times an in-progress resource (a launching instance, a stack
+  being created, a RightScale task ...) is read before it is finished
+  (default: 2)
+
+:FAKE_BACKEND_SEED:
+  Seed for the random number generator, for repeatable failures
+"""
+
+import collections
+import importlib
+import logging
+import os
+import random
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+LATENCY = float(os.getenv('FAKE_BACKEND_LATENCY', 0))
+ERROR_RATE = float(os.getenv('FAKE_BACKEND_ERROR_RATE', 0))
+THROTTLE_RATE = float(os.getenv('FAKE_BACKEND_THROTTLE_RATE', 0))
+POLLS = int(os.getenv('FAKE_BACKEND_POLLS', 2))
+SEED = os.getenv('FAKE_BACKEND_SEED')
+
+# Outcomes of Behavior.roll()
+THROTTLED = 'throttled'
+FAILED = 'failed'
+
+# Backend name -> module that implements it
+BACKENDS = {
+    'aws': 'kingpin.actors.aws.fake',
+    'rightscale': 'kingpin.actors.rightscale.fake',
+}
+
+# Backend name -> the installed fake backend object
+_INSTALLED = {}
+
+
+class Behavior(object):
+
+    """Decides how each fake API call behaves.
+
+    The fake calls are made from executor threads (just like the real ones),
+    so the latency is a blocking sleep.
+
+    Args:
+        latency: Seconds to sleep on every call
+        error_rate: Fraction of calls that fail
+        throttle_rate: Fraction of calls that are throttled
+        seed: Seed for the random number generator
+    """
+
+    def __init__(self, latency=None, error_rate=None, throttle_rate=None,
+                 seed=SEED):
+        self.latency = LATENCY if latency is None else latency
+        self.error_rate = ERROR_RATE if error_rate is None else error_rate
+        self.throttle_rate = (THROTTLE_RATE if throttle_rate is None
+                              else throttle_rate)
+        self.calls = collections.Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def roll(self, name):
+        """Records a call to `name` and decides its outcome.
+
+        Returns:
+            None if the call should succeed, otherwise THROTTLED or FAILED
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.calls[name] += 1
+            dice = self._random.random()
+
+        if dice < self.throttle_rate:
+            log.debug('Throttling fake call to %s', name)
+            return THROTTLED
+        if dice < self.throttle_rate + self.error_rate:
+            log.debug('Failing fake call to %s', name)
+            return FAILED
+
+
+class Pending(object):
+
+    """Tracks a remote operation that finishes after being polled a few times.
+
+    Args:
+        polls: Number of calls to done() before it returns True
+    """
+
+    def __init__(self, polls=None):
+        self.remaining = POLLS if polls is None else polls
+
+    def done(self):
+        if self.remaining > 0:
+            self.remaining -= 1
+        return self.remaining <= 0
+
+
+def install(names, state=None, behavior=None):
+    """Replaces the named remote APIs with in-process fakes.
+
+    Args:
+        names: List of backend names (see BACKENDS)
+        state: Optional dict of backend name -> state passed to its load()
+        behavior: Optional Behavior shared by the backends
+
+    Returns:
+        A dict of backend name -> fake backend object
+
+    Raises:
+        ValueError: If a backend name is unknown.
+    """
+    unknown = set(names) - set(BACKENDS)
+    if unknown:
+        raise ValueError('Unknown fake backend(s): %s. Choose from: %s' %
+                         (', '.join(sorted(unknown)),
+                          ', '.join(sorted(BACKENDS))))
+
+    state = state or {}
+    behavior = behavior or Behavior()
+    for name in names:
+        if name in _INSTALLED:
+            continue
+        log.warning('Using the fake %s backend. Nothing will really change!',
+                    name)
+        module = importlib.import_module(BACKENDS[name])
+        backend = module.install(behavior)
+        backend.load(state.get(name, {}))
+        _INSTALLED[name] = backend
+
+    return dict((name, _INSTALLED[name]) for name in names)
+
+
+def uninstall():
+    """Puts back every real API that install() replaced."""
+    for name in list(_INSTALLED):
+        importlib.import_module(BACKENDS[name]).uninstall()
+        del _INSTALLED[name]
@@ -0,0 +1,194 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.journal`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+A machine readable journal of a Kingpin run.
+
+Every state change of every actor is appended to a file as a single line
+JSON object, so that the journals of many deployments can be analyzed
+without parsing the log output. Each event has these fields:
+
+:event:
+  One of ``initialized``, ``started``, ``retried``, ``succeeded``,
+  ``failed``, ``skipped`` or ``timed_out``
+
+:run:
+  Unique ID of the Kingpin run that wrote the event
+
+:time:
+  Unix timestamp of the event
+
+:actor:
+  ID of the actor (unique within the run)
+
+:parent:
+  ID of the group actor that executed this actor (``started`` and later)
+
+The ``initialized`` event also has the actor ``type``, ``desc`` and ``dry``
+flag, and the ``succeeded``, ``failed``, ``skipped`` and ``timed_out`` events
+have the ``duration`` of the execution, the ``result`` (ie, ``warning`` for an
+actor whose failure was ignored by ``warn_on_failure``), the number of
+``retries`` and the ``error``, if there was one.
+
+Events are buffered, and written out in batches of `BATCH_SIZE` events or
+every `FLUSH_INTERVAL` seconds (by a callback on the IOLoop), whichever comes
+first.
+
+The journal follows the actor executions through the spans of
+`kingpin.actors.support.trace`.
+"""
+
+import logging
+import time
+import uuid
+
+from tornado import ioloop
+import simplejson as json
+
+from kingpin.actors import exceptions
+from kingpin.actors.support import trace
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+
+# Span result -> name of the event that finishes the execution
+FINISH_EVENTS = {
+    trace.SUCCESS: 'succeeded',
+    trace.WARNING: 'succeeded',
+    trace.SKIPPED: 'skipped',
+    trace.FAILURE: 'failed',
+}
+
+# The active Journal object (or None when the journal is disabled)
+_JOURNAL = None
+
+
+class Journal(object):
+
+    """Appends the events of one Kingpin run to a JSON-lines file.
+
+    Args:
+        path: File to append the events to
+        batch_size: Number of events to buffer before writing them out
+        flush_interval: Maximum seconds to buffer an event for
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL):
+        self.run = uuid.uuid4().hex
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._file = open(path, 'a')
+        self._buffer = []
+        self._last_flush = time.time()
+
+        # record() only checks the time when the next event comes in, which
+        # may be never in a long, quiet step of the run.
+        self._flusher = ioloop.PeriodicCallback(
+            self.flush, flush_interval * 1000)
+        self._flusher.start()
+
+    def record(self, event, actor, **fields):
+        """Buffers a single event.
+
+        Args:
+            event: Name of the event
+            actor: ID of the actor the event is about
+            fields: Any other fields of the event
+        """
+        fields.update({'event': event, 'run': self.run,
+                       'time': time.time(), 'actor': actor})
+        self._buffer.append(json.dumps(fields, sort_keys=True))
+
+        if (len(self._buffer) >= self.batch_size or
+                fields['time'] - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Writes out all of the buffered events."""
+        self._last_flush = time.time()
+        if not self._buffer:
+            return
+        self._file.write('\n'.join(self._buffer) + '\n')
+        self._file.flush()
+        self._buffer = []
+
+    def close(self):
+        self._flusher.stop()
+        self.flush()
+        self._file.close()
+
+    def actor_initialized(self, actor):
+        self.record('initialized', actor._id, type=actor._type,
+                    desc=actor._desc, dry=actor._dry)
+
+    def span_started(self, span):
+        self.record('started', span.actor, parent=self._parent(span))
+
+    def span_retried(self, span):
+        self.record('retried', span.actor, parent=self._parent(span),
+                    retries=span.retries)
+
+    def span_finished(self, span, error):
+        event = FINISH_EVENTS[span.result]
+        if isinstance(error, exceptions.ActorTimedOut):
+            event = 'timed_out'
+        self.record(event, span.actor, parent=self._parent(span),
+                    duration=span.duration, result=span.result,
+                    retries=span.retries, error=span.error)
+
+    def _parent(self, span):
+        return span.parent.actor if span.parent else None
+
+
+def enable(path, **kwargs):
+    """Starts journaling to `path`, and returns the new Journal object.
+
+    Args:
+        path: File to append the events to
+        kwargs: Passed on to the Journal
+    """
+    global _JOURNAL
+    disable()
+    _JOURNAL = Journal(path, **kwargs)
+    trace.add_listener(_JOURNAL)
+    log.debug('Writing the run journal to %s', path)
+    return _JOURNAL
+
+
+def disable():
+    """Writes out any buffered events and stops journaling."""
+    global _JOURNAL
+    if _JOURNAL is None:
+        return
+    trace.remove_listener(_JOURNAL)
+    _JOURNAL.close()
+    _JOURNAL = None
+
+
+def get_journal():
+    """Returns the active Journal object, or None."""
+    return _JOURNAL
+
+
+def actor_initialized(actor):
+    """Records the `initialized` event of `actor`, if journaling."""
+    if _JOURNAL is not None:
+        _JOURNAL.actor_initialized(actor)
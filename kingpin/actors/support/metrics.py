@@ -0,0 +1,375 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.metrics`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+A small, in-process metrics registry with counters, gauges and histograms,
+which can be exported in the `Prometheus text format
+<https://prometheus.io/docs/instrumenting/exposition_formats/>`_.
+
+Metrics are always collected (they are cheap), and are written to a file or
+served over HTTP only when asked to (see the ``--metrics-file`` and
+``--metrics-port`` options of ``kingpin``).
+
+Example:
+    >>> CALLS = metrics.counter('kingpin_unit_calls_total', 'Calls made',
+    ...                         labels=('method',))
+    >>> CALLS.inc(method='get')
+    >>> print metrics.REGISTRY.render()
+    # HELP kingpin_unit_calls_total Calls made
+    # TYPE kingpin_unit_calls_total counter
+    kingpin_unit_calls_total{method="get"} 1.0
+
+Metrics may be updated from executor threads, so every update takes a lock.
+"""
+
+import functools
+import logging
+import threading
+import time
+
+from concurrent import futures
+from tornado import httpserver
+from tornado import web
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+# Default histogram buckets, in seconds. API calls and waits range from a few
+# milliseconds to many minutes.
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300,
+                   900, 3600)
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = zip(names, values) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape(v)) for k, v in pairs)
+
+
+class Metric(object):
+
+    """Base class for a named metric with an optional set of labels."""
+
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError('%s expects labels %s, got %s' %
+                             (self.name, self.labels, sorted(labels)))
+        return tuple(labels[l] for l in self.labels)
+
+    def value(self, **labels):
+        """Returns the current value for the supplied labels."""
+        return self._values.get(self._key(labels), 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self):
+        """Yields (name suffix, label values, extra labels, value) tuples."""
+        for key, value in sorted(self._values.items()):
+            yield ('', key, (), value)
+
+    def render(self):
+        """Returns this metric in the Prometheus text format."""
+        lines = ['# HELP %s %s' % (self.name, self.help),
+                 '# TYPE %s %s' % (self.name, self.type)]
+        with self._lock:
+            samples = list(self._samples())
+        for suffix, key, extra, value in samples:
+            lines.append('%s%s%s %s' % (
+                self.name, suffix, _format_labels(self.labels, key, extra),
+                float(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+
+    """A value that only goes up."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+
+    """A value that can go up and down.
+
+    A gauge may also be backed by a function, which is called every time the
+    metric is rendered (see set_function()).
+    """
+
+    type = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super(Gauge, self).__init__(*args, **kwargs)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        """Reports the return value of `function` for these labels."""
+        self._functions[self._key(labels)] = function
+
+    def value(self, **labels):
+        key = self._key(labels)
+        if key in self._functions:
+            return self._functions[key]()
+        return self._values.get(key, 0)
+
+    def _samples(self):
+        values = dict(self._values)
+        for key, function in self._functions.items():
+            values[key] = function()
+        for key, value in sorted(values.items()):
+            yield ('', key, (), value)
+
+
+class Histogram(Metric):
+
+    """Counts observations (ie, request durations) into buckets."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = [[0] * len(self.buckets), 0, 0]
+            counts, total, count = self._values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = [counts, total + value, count + 1]
+
+    def value(self, **labels):
+        """Returns the number of observations for the supplied labels."""
+        return self._values.get(self._key(labels), [None, 0, 0])[2]
+
+    def _samples(self):
+        for key, (counts, total, count) in sorted(self._values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield ('_bucket', key, (('le', bound),), bucket_count)
+            yield ('_bucket', key, (('le', '+Inf'),), count)
+            yield ('_sum', key, (), total)
+            yield ('_count', key, (), count)
+
+
+class Registry(object):
+
+    """A collection of metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._server = None
+
+    def _get(self, metric_class, name, *args, **kwargs):
+        if name not in self._metrics:
+            self._metrics[name] = metric_class(name, *args, **kwargs)
+        metric = self._metrics[name]
+        if not isinstance(metric, metric_class):
+            raise ValueError('%s is already registered as a %s' %
+                             (name, metric.type))
+        return metric
+
+    def counter(self, name, help, labels=()):
+        """Returns (creating if needed) the Counter called `name`."""
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        """Returns (creating if needed) the Gauge called `name`."""
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        """Returns (creating if needed) the Histogram called `name`."""
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def clear(self):
+        """Resets the value of every metric (but keeps them registered)."""
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self):
+        """Returns every metric in the Prometheus text format."""
+        return ''.join('%s\n' % self._metrics[name].render()
+                       for name in sorted(self._metrics))
+
+    def write(self, path):
+        """Writes every metric to `path` in the Prometheus text format."""
+        log.debug('Writing metrics to %s', path)
+        with open(path, 'w') as f:
+            f.write(self.render())
+
+    def serve(self, port, address='127.0.0.1'):
+        """Serves the metrics on http://<address>:<port>/metrics.
+
+        The server runs on the current IOLoop until stop_serving() is called.
+        """
+        log.debug('Serving metrics on %s:%s', address, port)
+        app = web.Application(
+            [('/metrics', MetricsHandler, {'registry': self})])
+        self._server = httpserver.HTTPServer(app)
+        self._server.listen(port, address=address)
+
+    def stop_serving(self):
+        if self._server:
+            self._server.stop()
+            self._server = None
+
+
+class MetricsHandler(web.RequestHandler):
+
+    """Serves a Registry in the Prometheus text format."""
+
+    def initialize(self, registry):
+        self.registry = registry
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(self.registry.render())
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labels=()):
+    """Returns the Counter called `name` from the global REGISTRY."""
+    return REGISTRY.counter(name, help, labels)
+
+
+def gauge(name, help, labels=()):
+    """Returns the Gauge called `name` from the global REGISTRY."""
+    return REGISTRY.gauge(name, help, labels)
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    """Returns the Histogram called `name` from the global REGISTRY."""
+    return REGISTRY.histogram(name, help, labels, buckets)
+
+
+def timed(metric, label=None):
+    """Decorator that records the duration of every call in a Histogram.
+
+    Only for regular (non-coroutine) functions, like the ones that are run
+    in an executor thread.
+
+    Args:
+        metric: A Histogram object
+        label: Name of the label that gets the function name
+
+    Example:
+        >>> @metrics.timed(API_CALLS, label='method')
+        ... def find_server_arrays(self, name):
+        ...     ...
+    """
+    def decorator(f):
+        labels = {label: f.__name__} if label else {}
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                metric.observe(time.time() - start, **labels)
+        return wrapper
+    return decorator
+
+
+# Metrics shared by several modules
+RETRIES = counter(
+    'kingpin_retries_total',
+    'Failed attempts that were retried, by retry decorator.',
+    labels=('decorator',))
+POLLS = counter(
+    'kingpin_poll_iterations_total',
+    'Iterations of the loops that wait for a remote resource.',
+    labels=('loop',))
+EXECUTOR_QUEUE = gauge(
+    'kingpin_executor_queue_depth',
+    'Calls waiting for a free thread in an executor.',
+    labels=('executor',))
+
+
+class ThreadPoolExecutor(futures.ThreadPoolExecutor):
+
+    """A ThreadPoolExecutor that reports its queue in EXECUTOR_QUEUE.
+
+    A call counts as queued from the moment it is submitted until a thread
+    starts running it (or until it is cancelled).
+
+    Args:
+        max_workers: Number of threads
+        name: The `executor` label of the queue depth
+    """
+
+    def __init__(self, max_workers, name):
+        super(ThreadPoolExecutor, self).__init__(max_workers)
+        self.name = name
+        self._queued_lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        queued = [True]
+
+        def dequeue(future=None):
+            with self._queued_lock:
+                if not queued[0]:
+                    return
+                queued[0] = False
+            EXECUTOR_QUEUE.dec(executor=self.name)
+
+        def run():
+            dequeue()
+            return fn(*args, **kwargs)
+
+        EXECUTOR_QUEUE.inc(executor=self.name)
+        future = super(ThreadPoolExecutor, self).submit(run)
+        future.add_done_callback(dequeue)
+        return future
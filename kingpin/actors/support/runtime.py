@@ -0,0 +1,120 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.runtime`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+The runtime context: values that actors publish while the deployment runs,
+for the actors after them to use.
+
+The ``{KEY}`` context tokens are filled in when the actors are created, long
+before anything has run. Some values only exist once an actor has executed
+though -- the href of a cloned ServerArray, the ARN of an uploaded cert, the
+URL of a new queue. An actor with an ``id`` publishes these values as
+``<id>.<name>`` (see `kingpin.actors.base.BaseActor.publish`), and the
+options of the actors that run later can refer to them with ``{@<id>.<name>}``
+tokens. The tokens are filled in right before an actor executes.
+
+The context lasts for the whole run (there is only one run per process), so
+an id names one actor in the whole run. Every published value remembers its
+publisher, so that two actors that share an id (ie, the acts of a group with
+several contexts) are caught instead of overwriting each other's values.
+"""
+
+import logging
+import re
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+# Matches a {@<id>.<name>} token, and captures the <id>.<name>
+TOKEN = re.compile(r'\{@([\w.-]+)\}')
+
+# Published name -> value
+_VALUES = {}
+
+# Published name -> whoever published it (see publish())
+_PUBLISHERS = {}
+
+
+def publish(name, value, publisher=None):
+    """Publishes `value` as `name`, replacing any earlier value.
+
+    Args:
+        name: The <id>.<name> to publish the value as
+        value: The value
+        publisher: The actor that published the value, or None if it is
+                   unknown (ie, for values restored from a checkpoint).
+    """
+    log.debug('Publishing %s=%s', name, value)
+    _VALUES[name] = value
+    _PUBLISHERS[name] = publisher
+
+
+def get(name, default=None):
+    """Returns the value published as `name`."""
+    return _VALUES.get(name, default)
+
+
+def publisher(name):
+    """Returns whoever published `name`, or None."""
+    return _PUBLISHERS.get(name)
+
+
+def reset():
+    """Forgets all of the published values."""
+    _VALUES.clear()
+    _PUBLISHERS.clear()
+
+
+def fill_in(obj):
+    """Fills in the {@NAME} tokens of every string in `obj`.
+
+    Tokens that nothing was published for are left in place.
+
+    Args:
+        obj: A string, or a dict or list (of dicts and lists) of strings and
+             other values, like the options of an actor.
+
+    Returns:
+        A copy of `obj` with the tokens filled in
+    """
+    if isinstance(obj, basestring):
+        return TOKEN.sub(_replace, obj)
+    if isinstance(obj, dict):
+        return dict((k, fill_in(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return [fill_in(v) for v in obj]
+    return obj
+
+
+def _replace(match):
+    name = match.group(1)
+    if name not in _VALUES:
+        return match.group(0)
+    return '%s' % (_VALUES[name],)
+
+
+def find_tokens(obj):
+    """Returns the sorted names of all of the {@NAME} tokens in `obj`."""
+    if isinstance(obj, basestring):
+        return sorted(set(TOKEN.findall(obj)))
+    if isinstance(obj, dict):
+        values = obj.values()
+    elif isinstance(obj, list):
+        values = obj
+    else:
+        return []
+    return sorted(set(name for v in values for name in find_tokens(v)))
@@ -1,13 +1,18 @@
 """Tests for the actors.base package."""
 
+import StringIO
+
 import mock
 
 from tornado import gen
 from tornado import testing
 from tornado import httpclient
+from tornado import httputil
+from tornado import stack_context
 
 from kingpin.actors import exceptions
 from kingpin.actors.support import api
+from kingpin.actors.support import cancel
 from kingpin.actors.test.helper import tornado_value
 
 __author__ = 'Matt Wise <matt@nextdoor.com>'
@@ -20,10 +25,11 @@ class RestClientTest(api.RestClient):
     @gen.coroutine
     @api._retry
     def fetch(self, url, method, params={},
-              auth_username=None, auth_password=None):
+              auth_username=None, auth_password=None, **kwargs):
         # Turn all the iputs into a JSON dict and return them
         ret = {'url': url, 'method': method, 'params': params,
                'auth_username': auth_username, 'auth_password': auth_password}
+        ret.update(kwargs)
         raise gen.Return(ret)
 
 
@@ -43,6 +49,11 @@ class RestConsumerTest(api.RestConsumer):
             'test_path_with_res': {
                 'path': '/test/%res%/info',
                 'http_methods': {'get': {}}
+            },
+            'test_raw': {
+                'path': '/raw',
+                'http_methods': {'get': {'decoder': api.decode_raw,
+                                         'cache': True}}
             }
         }
     }
@@ -119,6 +130,144 @@ class TestRetry(testing.AsyncTestCase):
 
         self.assertEquals(fail._call_count, 7)
 
+    @testing.gen_test
+    def test_decorator_honors_retry_after(self):
+        response = httpclient.HTTPResponse(
+            httpclient.HTTPRequest('http://unittest'), 429,
+            headers=httputil.HTTPHeaders({'Retry-After': '7'}),
+            buffer=StringIO.StringIO(''))
+
+        class FailingClass():
+            _EXCEPTIONS = {httpclient.HTTPError: {429: None}}
+
+            @gen.coroutine
+            @api._retry(retries=2)
+            def func(self):
+                raise httpclient.HTTPError(429, response=response)
+
+        with mock.patch.object(api.utils, 'tornado_sleep') as sleep:
+            sleep.return_value = tornado_value(None)
+            with self.assertRaises(httpclient.HTTPError):
+                yield FailingClass().func()
+
+        sleep.assert_called_once_with(7.0)
+
+    @testing.gen_test
+    def test_decorator_caps_retry_after(self):
+        response = httpclient.HTTPResponse(
+            httpclient.HTTPRequest('http://unittest'), 503,
+            headers=httputil.HTTPHeaders({'Retry-After': '86400'}),
+            buffer=StringIO.StringIO(''))
+
+        class FailingClass():
+            _EXCEPTIONS = {httpclient.HTTPError: {503: None}}
+
+            @gen.coroutine
+            @api._retry(retries=2, max_delay=10)
+            def func(self):
+                raise httpclient.HTTPError(503, response=response)
+
+        with mock.patch.object(api.utils, 'tornado_sleep') as sleep:
+            sleep.return_value = tornado_value(None)
+            with self.assertRaises(httpclient.HTTPError):
+                yield FailingClass().func()
+            sleep.assert_called_once_with(10)
+
+            # Not worth retrying at all if the actor would be out of time
+            sleep.reset_mock()
+            token = cancel.Token(timeout=60)
+            with stack_context.StackContext(token.activate):
+                fut = FailingClass().func()
+            with self.assertRaises(httpclient.HTTPError):
+                yield fut
+            self.assertEquals(sleep.call_count, 0)
+
+    def test_backoff_delay(self):
+        for attempt, low, high in ((1, 0.5, 1), (2, 1, 2), (3, 2, 4),
+                                   (10, 5, 10)):
+            delay = api._backoff_delay(attempt, 1, 2, 10)
+            self.assertTrue(low <= delay <= high)
+
+    def test_get_retry_after(self):
+        def error(code, headers):
+            response = httpclient.HTTPResponse(
+                httpclient.HTTPRequest('http://unittest'), code,
+                headers=httputil.HTTPHeaders(headers),
+                buffer=StringIO.StringIO(''))
+            return httpclient.HTTPError(code, response=response)
+
+        self.assertEquals(
+            api._get_retry_after(error(503, {'Retry-After': '5'})), 5)
+        self.assertEquals(
+            api._get_retry_after(error(500, {'Retry-After': '5'})), None)
+        self.assertEquals(
+            api._get_retry_after(error(429, {})), None)
+        self.assertEquals(
+            api._get_retry_after(error(429, {'Retry-After': 'junk'})), None)
+        self.assertEquals(
+            api._get_retry_after(httpclient.HTTPError(429)), None)
+
+        # An HTTP date in the past means "go now"
+        self.assertEquals(api._get_retry_after(error(
+            429, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})), 0)
+
+    def test_match_exception(self):
+        conf = {401: 'a', '500': 'b', 'cruel': 'c'}
+        self.assertEquals(api._match_exception(
+            conf, httpclient.HTTPError(401)), ['a'])
+        self.assertEquals(api._match_exception(
+            conf, httpclient.HTTPError(500)), ['b'])
+
+        # Status codes in the message body must not match
+        self.assertEquals(api._match_exception(
+            conf, httpclient.HTTPError(404, 'Saw 401 and 500')), [])
+        self.assertEquals(api._match_exception(
+            conf, Exception('Goodbye cruel world')), ['c'])
+
+
+class TestCircuitBreaker(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestCircuitBreaker, self).setUp()
+        api.CIRCUIT_BREAKERS.clear()
+
+    def test_opens_after_threshold(self):
+        breaker = api.CircuitBreaker('unittest', threshold=2)
+        breaker.failure()
+        breaker.check()
+        breaker.failure()
+        with self.assertRaises(api.CircuitOpen):
+            breaker.check()
+
+    def test_success_resets(self):
+        breaker = api.CircuitBreaker('unittest', threshold=2)
+        breaker.failure()
+        breaker.success()
+        breaker.failure()
+        breaker.check()
+        self.assertEquals(breaker.failures, 1)
+
+    def test_half_open(self):
+        breaker = api.CircuitBreaker('unittest', threshold=1,
+                                     reset_timeout=10)
+        breaker.failure()
+        breaker.opened_at -= 11
+
+        # One trial request is let through, the rest fail fast
+        breaker.check()
+        with self.assertRaises(api.CircuitOpen):
+            breaker.check()
+
+        breaker.success()
+        breaker.check()
+
+    def test_get_circuit_breaker_is_per_host(self):
+        a = api.get_circuit_breaker('http://foo.com/a')
+        b = api.get_circuit_breaker('http://foo.com/b?c=d')
+        c = api.get_circuit_breaker('http://bar.com/a')
+        self.assertEquals(a, b)
+        self.assertNotEquals(a, c)
+
 
 class TestRestConsumer(testing.AsyncTestCase):
 
@@ -130,6 +279,32 @@ class TestRestConsumer(testing.AsyncTestCase):
         self.assertEquals(test_consumer.testA().__repr__(),
                           'RestConsumerTest(/testA)')
 
+    def test_methods_are_generated_once_per_class(self):
+        test_consumer = RestConsumerTest(client=RestClientTest())
+        a = test_consumer.testA()
+        b = test_consumer.testA()
+
+        # Each call returns a new lightweight object of the same class
+        self.assertIsNot(a, b)
+        self.assertIs(type(a), type(b))
+        self.assertFalse(hasattr(a, '__dict__'))
+        self.assertEquals(type(a).http_get, type(b).http_get)
+
+        # The resource only has the methods its own config describes
+        self.assertFalse(hasattr(a, 'http_delete'))
+        self.assertFalse(hasattr(a, 'testA'))
+        self.assertFalse(hasattr(test_consumer, 'http_get'))
+
+    def test_subclass_regenerates_methods(self):
+        authed = RestConsumerTestBasicAuthed(client=RestClientTest())
+        self.assertIsInstance(authed.testA(), RestConsumerTestBasicAuthed)
+
+        class Custom(RestConsumerTest):
+            def testA(self):
+                return 'custom'
+
+        self.assertEquals(Custom(client=RestClientTest()).testA(), 'custom')
+
     @testing.gen_test
     def test_replace_path_tokens(self):
         test_consumer = RestConsumerTest(client=RestClientTest())
@@ -154,6 +329,13 @@ class TestRestConsumer(testing.AsyncTestCase):
             'method': 'GET'}
         self.assertEquals(ret, expected_ret)
 
+    @testing.gen_test
+    def test_http_method_get_with_decoder(self):
+        test_consumer = RestConsumerTest(client=RestClientTest())
+        ret = yield test_consumer.test_raw().http_get()
+        self.assertEquals(ret['decoder'], api.decode_raw)
+        self.assertTrue(ret['cache'])
+
     @testing.gen_test
     def test_http_method_get_with_basic_auth(self):
         test_consumer = RestConsumerTestBasicAuthed(
@@ -214,6 +396,7 @@ class TestRestClient(testing.AsyncTestCase):
 
     def setUp(self, *args, **kwargs):
         super(TestRestClient, self).setUp()
+        api.CIRCUIT_BREAKERS.clear()
         self.client = api.RestClient()
         self.http_response_mock = mock.MagicMock(name='response')
         self.http_client_mock = mock.MagicMock(name='http_client')
@@ -272,6 +455,33 @@ class TestRestClient(testing.AsyncTestCase):
         self.assertEquals('foo bar', ret)
         self.http_client_mock.fetch.assert_called_once()
 
+    @testing.gen_test
+    def test_fetch_get_with_raw_decoder(self):
+        self.http_response_mock.body = '{"foo": "bar"}'
+        ret = yield self.client.fetch(url='http://foo.com', method='GET',
+                                      decoder=api.decode_raw)
+        self.assertEquals('{"foo": "bar"}', ret)
+
+    @testing.gen_test
+    def test_fetch_get_with_cache(self):
+        self.http_response_mock.body = '{"foo": "bar"}'
+        api.transport.clear_cache()
+        for i in range(2):
+            ret = yield self.client.fetch(url='http://foo.com', method='GET',
+                                          cache=True)
+            self.assertEquals({'foo': 'bar'}, ret)
+        api.transport.clear_cache()
+        self.assertEquals(self.http_client_mock.fetch.call_count, 1)
+
+    @testing.gen_test
+    def test_fetch_get_with_streaming_callback(self):
+        callback = mock.MagicMock()
+        ret = yield self.client.fetch(url='http://foo.com', method='GET',
+                                      streaming_callback=callback)
+        self.assertEquals(None, ret)
+        http_req = self.http_client_mock.fetch.call_args[0][0]
+        self.assertEquals(http_req.streaming_callback, callback)
+
     @testing.gen_test
     def test_fetch_401_raises_exc_and_called_once(self):
         e = httpclient.HTTPError(401, 'Unauthorized')
@@ -309,6 +519,31 @@ class TestRestClient(testing.AsyncTestCase):
                 url='http://foo.com', method='GET',
                 auth_username='user', auth_password='pass')
 
+    @testing.gen_test
+    def test_fetch_500_opens_circuit(self):
+        self.client._CIRCUIT_THRESHOLD = 2
+        e = httpclient.HTTPError(500, 'Failure')
+        self.http_client_mock.fetch.side_effect = e
+
+        # The circuit opens on the 2nd try, and the 3rd try fails fast
+        with self.assertRaises(api.CircuitOpen):
+            yield self.client.fetch(url='http://foo.com', method='GET')
+        self.assertEquals(2, len(self.http_client_mock.method_calls))
+
+        # Other hosts are unaffected
+        self.http_client_mock.fetch.side_effect = None
+        self.http_response_mock.body = '{"foo": "bar"}'
+        ret = yield self.client.fetch(url='http://bar.com', method='GET')
+        self.assertEquals({'foo': 'bar'}, ret)
+
+    @testing.gen_test
+    def test_fetch_429_is_retried(self):
+        e = httpclient.HTTPError(429, 'Too Many Requests')
+        self.http_client_mock.fetch.side_effect = e
+        with self.assertRaises(httpclient.HTTPError):
+            yield self.client.fetch(url='http://foo.com', method='GET')
+        self.assertEquals(3, len(self.http_client_mock.method_calls))
+
     @testing.gen_test
     def test_fetch_501_raises_recoverable(self):
         e = httpclient.HTTPError(501, 'Failure')
@@ -340,3 +575,34 @@ class TestSimpleTokenRestClient(testing.AsyncTestCase):
         http_req = self.http_client_mock.mock_calls[0]
         http_req = self.http_client_mock.fetch.call_args[0][0].__dict__
         self.assertEquals(http_req['url'], 'http://foo.com?token=foobar')
+
+
+class TestPaginator(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_next(self):
+        items = range(5)
+
+        @gen.coroutine
+        def http_get(limit, offset, **kwargs):
+            self.assertEquals(kwargs, {'foo': 'bar'})
+            raise gen.Return({'checks': items[offset:offset + limit]})
+
+        pages = api.Paginator(http_get, key='checks', limit=2, foo='bar')
+        self.assertEquals((yield pages.next()), [0, 1])
+        self.assertEquals((yield pages.next()), [2, 3])
+        self.assertEquals((yield pages.next()), [4])
+        self.assertEquals((yield pages.next()), None)
+
+    @testing.gen_test
+    def test_next_exact_pages(self):
+        method = mock.MagicMock()
+        method.side_effect = [tornado_value([1, 2]), tornado_value([])]
+
+        pages = api.Paginator(method, limit=2, limit_param='count',
+                              offset_param='start')
+        self.assertEquals((yield pages.next()), [1, 2])
+        self.assertEquals((yield pages.next()), None)
+        self.assertEquals((yield pages.next()), None)
+        method.assert_called_with(count=2, start=2)
+        self.assertEquals(method.call_count, 2)
@@ -0,0 +1,98 @@
+"""Tests for the actors.support.budget package."""
+
+from tornado import gen
+from tornado import stack_context
+from tornado import testing
+import mock
+
+from kingpin.actors import exceptions
+from kingpin.actors.support import budget
+from kingpin.actors.support import cancel
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class TestBudget(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestBudget, self).setUp()
+        self.tracker = mock.MagicMock(name='tracker')
+        self.running = 0
+
+    def tearDown(self):
+        super(TestBudget, self).tearDown()
+        budget.configure({})
+
+    @gen.coroutine
+    def _call(self, provider, endpoint=None):
+        with (yield budget.acquire(provider, endpoint)):
+            self.running += 1
+            self.tracker(self.running)
+            yield gen.sleep(0.01)
+            self.running -= 1
+
+    def _most_running(self):
+        return max(c[0][0] for c in self.tracker.call_args_list)
+
+    def test_parse(self):
+        self.assertEquals(budget.parse('aws=5'), ('aws', 5))
+        self.assertEquals(budget.parse(' http/api.slack.com = 2'),
+                          ('http/api.slack.com', 2))
+        for spec in ('aws', '=5', 'aws=many'):
+            with self.assertRaises(ValueError):
+                budget.parse(spec)
+
+        with self.assertRaises(ValueError):
+            budget.configure({'aws': 0})
+
+    @testing.gen_test
+    def test_unlimited(self):
+        yield [self._call('aws') for _ in range(5)]
+        self.assertEquals(self._most_running(), 5)
+
+    @testing.gen_test
+    def test_provider_budget(self):
+        budget.configure({'AWS': 2})
+        wait = budget.WAIT_TIME.value(budget='aws')
+        yield [self._call('aws') for _ in range(5)]
+        self.assertEquals(self._most_running(), 2)
+        self.assertEquals(budget.WAIT_TIME.value(budget='aws'), wait + 5)
+        self.assertEquals(budget.IN_FLIGHT.value(budget='aws'), 0)
+
+    @testing.gen_test
+    def test_endpoint_budget(self):
+        budget.configure({'http': 3, 'http/api.slack.com': 1})
+        yield [self._call('http', 'api.slack.com') for _ in range(3)]
+        self.assertEquals(self._most_running(), 1)
+
+        self.tracker.reset_mock()
+        yield [self._call('http', 'api.rollbar.com') for _ in range(5)]
+        self.assertEquals(self._most_running(), 3)
+
+    @testing.gen_test
+    def test_limit(self):
+        budget.configure({'rightscale': 1})
+
+        @budget.limit('rightscale')
+        @gen.coroutine
+        def call(value):
+            self.assertEquals(budget.IN_FLIGHT.value(budget='rightscale'), 1)
+            raise gen.Return(value)
+
+        ret = yield [call(1), call(2)]
+        self.assertEquals(ret, [1, 2])
+
+    @testing.gen_test
+    def test_cancelled_while_waiting(self):
+        budget.configure({'aws': 1})
+        token = cancel.Token()
+
+        with (yield budget.acquire('aws')):
+            with stack_context.StackContext(token.activate):
+                waiting = self._call('aws')
+            token.cancel()
+
+        with self.assertRaises(exceptions.ActorCancelled):
+            yield waiting
+        self.assertFalse(self.tracker.called)
+        self.assertEquals(budget.IN_FLIGHT.value(budget='aws'), 0)
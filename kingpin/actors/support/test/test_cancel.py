@@ -0,0 +1,188 @@
+"""Tests for the actors.support.cancel package."""
+
+import datetime
+import time
+
+from tornado import gen
+from tornado import stack_context
+from tornado import testing
+import mock
+
+from kingpin import utils
+from kingpin.actors import base
+from kingpin.actors import exceptions
+from kingpin.actors import group
+from kingpin.actors.support import cancel
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class PollingActor(base.BaseActor):
+
+    """Polls every 10ms until it is stopped."""
+
+    all_options = {}
+
+    @gen.coroutine
+    def _execute(self):
+        self.polls = 0
+        while True:
+            self.polls += 1
+            yield utils.tornado_sleep(0.01)
+
+
+class TestToken(testing.AsyncTestCase):
+
+    def test_cancel(self):
+        parent = cancel.Token()
+        child = cancel.Token(parent=parent)
+        self.assertFalse(child.cancelled)
+        child.check()
+
+        parent.cancel('first')
+        parent.cancel('second')
+        self.assertTrue(child.cancelled)
+        self.assertEquals(child.reason, 'first')
+        with self.assertRaises(exceptions.ActorCancelled):
+            child.check()
+
+    def test_current(self):
+        self.assertEquals(cancel.current(), None)
+        self.assertFalse(cancel.cancelled())
+        cancel.check()
+
+        token = cancel.Token()
+        token.cancel()
+        with stack_context.StackContext(token.activate):
+            self.assertEquals(cancel.current(), token)
+            with self.assertRaises(exceptions.ActorCancelled):
+                cancel.check()
+        self.assertEquals(cancel.current(), None)
+
+    def test_deadline(self):
+        self.assertEquals(cancel.Token().remaining(), None)
+
+        parent = cancel.Token(timeout=10)
+        child = cancel.Token(parent=parent, timeout=60)
+        self.assertTrue(9 < child.remaining() <= 10)
+        self.assertTrue(59 < cancel.Token(timeout=60).remaining() <= 60)
+        self.assertFalse(child.cancelled)
+
+        late = cancel.Token(parent=cancel.Token(timeout=0))
+        self.assertTrue(late.remaining() <= 0)
+        self.assertEquals(late.reason, 'deadline passed')
+
+        with stack_context.StackContext(child.activate):
+            self.assertTrue(9 < cancel.remaining() <= 10)
+        self.assertEquals(cancel.remaining(), None)
+
+    def test_monotonic(self):
+        with mock.patch.object(cancel, '_LAST_TIME', [0.0]), \
+                mock.patch.object(cancel.time, 'time', side_effect=[100, 50]):
+            self.assertEquals(cancel._never_backwards_time(), 100)
+            self.assertEquals(cancel._never_backwards_time(), 100)
+
+
+class TestCancellation(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_timed_out_actor_stops(self):
+        actor = PollingActor('Poll', {}, timeout=0.05)
+        with self.assertRaises(exceptions.ActorTimedOut):
+            yield actor.execute()
+
+        # The loop notices the cancellation on its next poll, and then stops.
+        yield gen.sleep(0.05)
+        polls = actor.polls
+        yield gen.sleep(0.05)
+        self.assertEquals(actor.polls, polls)
+
+    @testing.gen_test
+    def test_group_timeout_cancels_acts(self):
+        actor = group.Async('Group', {'acts': [
+            {'desc': 'a', 'actor': 'misc.Sleep', 'options': {'sleep': 0}},
+            {'desc': 'b', 'actor': 'misc.Sleep', 'options': {'sleep': 0}}]},
+            timeout=0.05)
+        acts = [PollingActor(act._desc, {}, timeout=None)
+                for act in actor._actions]
+        actor._actions = acts
+
+        with self.assertRaises(exceptions.ActorTimedOut):
+            yield actor.execute()
+
+        yield gen.sleep(0.05)
+        polls = [act.polls for act in acts]
+        yield gen.sleep(0.05)
+        self.assertEquals([act.polls for act in acts], polls)
+
+    @testing.gen_test
+    def test_group_deadline_reported_as_timeout(self):
+        # "a" uses up the whole deadline of the group, so "b" is not even
+        # started. The group fails before gen.with_timeout() notices the
+        # deadline, but it still ran out of time rather than failed.
+        actor = group.Async('Group', {'acts': [
+            {'desc': 'a', 'actor': 'misc.Sleep', 'options': {'sleep': 0}},
+            {'desc': 'b', 'actor': 'misc.Sleep', 'options': {'sleep': 0}}]},
+            timeout=0.05)
+
+        @gen.coroutine
+        def hog():
+            time.sleep(0.06)
+        actor._actions[0]._execute = hog
+
+        with self.assertRaises(exceptions.ActorTimedOut) as e:
+            yield actor.execute()
+        self.assertIn('exceeded deadline', str(e.exception))
+
+    @testing.gen_test
+    def test_parent_deadline_applies(self):
+        actor = PollingActor('Poll', {}, timeout=10)
+        with stack_context.StackContext(cancel.Token(timeout=0.05).activate):
+            fut = actor.execute()
+        with self.assertRaises(exceptions.ActorTimedOut):
+            yield gen.with_timeout(datetime.timedelta(seconds=1), fut)
+
+    @testing.gen_test
+    def test_doomed_actor_not_started(self):
+        actor = PollingActor('Poll', {}, timeout=10)
+        with stack_context.StackContext(cancel.Token(timeout=0).activate):
+            fut = actor.execute()
+        with self.assertRaises(exceptions.ActorTimedOut):
+            yield fut
+        self.assertFalse(hasattr(actor, 'polls'))
+
+    @testing.gen_test
+    def test_sleep_ends_at_deadline(self):
+        with stack_context.StackContext(cancel.Token(timeout=0.01).activate):
+            fut = utils.tornado_sleep(10)
+        with self.assertRaises(exceptions.ActorCancelled):
+            yield gen.with_timeout(datetime.timedelta(seconds=1), fut)
+
+    @testing.gen_test
+    def test_cancelled_retries(self):
+        tracker = mock.MagicMock(name='tracker')
+
+        @utils.async_retry(stop_max_attempt_number=3, wait_fixed=0)
+        @gen.coroutine
+        def flaky():
+            tracker()
+            raise exceptions.RecoverableActorFailure('Failed')
+
+        token = cancel.Token()
+        token.cancel()
+        with stack_context.StackContext(token.activate):
+            fut = flaky()
+        with self.assertRaises(exceptions.ActorCancelled):
+            yield fut
+        self.assertFalse(tracker.called)
+
+    @testing.gen_test
+    def test_repeating_log_stops(self):
+        logger = mock.MagicMock(name='logger')
+        token = cancel.Token()
+        with stack_context.StackContext(token.activate):
+            handle = utils.create_repeating_log(logger, 'Unit', seconds=0.01)
+        token.cancel()
+        yield gen.sleep(0.05)
+        self.assertFalse(logger.called)
+        utils.clear_repeating_log(handle)
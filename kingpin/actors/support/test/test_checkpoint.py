@@ -0,0 +1,145 @@
+"""Tests for the actors.support.checkpoint package."""
+
+import json
+import os
+import tempfile
+
+from tornado import gen
+from tornado import testing
+import mock
+
+from kingpin.actors import base
+from kingpin.actors import exceptions
+from kingpin.actors import group
+from kingpin.actors.support import checkpoint
+from kingpin.actors.support import runtime
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class TestCheckpoint(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestCheckpoint, self).setUp()
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.tracker = mock.MagicMock(name='tracker')
+
+    def tearDown(self):
+        super(TestCheckpoint, self).tearDown()
+        checkpoint.disable()
+        os.unlink(self.path)
+
+    def _group(self, fail=False, dry=False):
+        """Returns a Sync group of two actors, and the two actors."""
+        actor = group.Sync('Group', {'acts': [
+            {'desc': 'same', 'actor': 'misc.Sleep', 'options': {'sleep': 0}},
+            {'desc': 'same', 'actor': 'misc.Sleep', 'options': {'sleep': 0}}]},
+            dry=dry)
+
+        @gen.coroutine
+        def track(a=actor._actions[0]):
+            self.tracker(a)
+        actor._actions[0]._execute = track
+
+        @gen.coroutine
+        def second(a=actor._actions[1]):
+            self.tracker(a)
+            if fail:
+                raise exceptions.ActorException('late failure')
+        actor._actions[1]._execute = second
+        return actor
+
+    @testing.gen_test
+    def test_resume(self):
+        checkpoint.enable(self.path)
+        with self.assertRaises(exceptions.ActorException):
+            yield self._group(fail=True).execute()
+        self.assertEquals(self.tracker.call_count, 2)
+
+        with open(self.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEquals(len(lines), 1)
+        self.assertTrue(lines[0]['key'].endswith('-1'))
+
+        # Resuming skips the first actor, even though the second one has the
+        # same configuration.
+        self.tracker.reset_mock()
+        checkpoint.enable(self.path, resume=True)
+        actor = self._group()
+        yield actor.execute()
+        self.tracker.assert_called_once_with(actor._actions[1])
+
+        # Now that the whole group completed, it is skipped as a whole.
+        self.tracker.reset_mock()
+        checkpoint.enable(self.path, resume=True)
+        yield self._group().execute()
+        self.assertFalse(self.tracker.called)
+
+    @testing.gen_test
+    def test_resume_rehearsal(self):
+        checkpoint.enable(self.path)
+        with self.assertRaises(exceptions.ActorException):
+            yield self._group(fail=True).execute()
+
+        # The rehearsal (see kingpin.bin.deploy) skips the completed actor
+        # too, and records nothing itself.
+        self.tracker.reset_mock()
+        checkpoint.enable(self.path, resume=True)
+        rehearsal = self._group(dry=True)
+        yield rehearsal.execute()
+        self.tracker.assert_called_once_with(rehearsal._actions[1])
+        with open(self.path) as f:
+            self.assertEquals(len(f.readlines()), 1)
+
+        self.tracker.reset_mock()
+        actor = self._group()
+        yield actor.execute()
+        self.tracker.assert_called_once_with(actor._actions[1])
+
+    @testing.gen_test
+    def test_no_resume_starts_over(self):
+        checkpoint.enable(self.path)
+        yield self._group().execute()
+
+        checkpoint.enable(self.path)
+        yield self._group().execute()
+        self.assertEquals(self.tracker.call_count, 4)
+
+    def test_keys_follow_the_config(self):
+        cp = checkpoint.enable(self.path)
+        a = base.BaseActor('Unit', {'a': 1})
+        b = base.BaseActor('Unit', {'a': 2})
+        dry = base.BaseActor('Unit', {'a': 1}, dry=True)
+        self.assertNotEquals(a._checkpoint_key, b._checkpoint_key)
+        self.assertEquals(dry._checkpoint_key, a._checkpoint_key)
+
+        cp._seen.clear()
+        self.assertEquals(cp.key(a), a._checkpoint_key)
+
+    def test_resume_ignores_bad_lines(self):
+        with open(self.path, 'w') as f:
+            f.write('{"key": "abc-1"}\n{"key": "de')
+        cp = checkpoint.enable(self.path, resume=True)
+        self.assertEquals(cp.completed, set(['abc-1']))
+
+        cp.record('xyz-1', base.BaseActor('Unit', {}))
+        cp = checkpoint.enable(self.path, resume=True)
+        self.assertEquals(cp.completed, set(['abc-1', 'xyz-1']))
+
+    def test_resume_publishes_outputs(self):
+        self.addCleanup(runtime.reset)
+        cp = checkpoint.enable(self.path)
+        actor = base.BaseActor('Unit', {}, id='unit')
+        actor.publish('href', '/api/unit/1')
+        cp.record('abc-1', actor)
+
+        runtime.reset()
+        checkpoint.enable(self.path, resume=True)
+        self.assertEquals(runtime.get('unit.href'), '/api/unit/1')
+
+    def test_disabled(self):
+        actor = base.BaseActor('Unit', {})
+        self.assertEquals(actor._checkpoint_key, None)
+        self.assertFalse(checkpoint.is_completed(actor))
+        checkpoint.record(actor)
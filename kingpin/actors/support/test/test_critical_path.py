@@ -0,0 +1,71 @@
+"""Tests for the actors.support.critical_path package."""
+
+import unittest
+
+from kingpin.actors.support import critical_path
+from kingpin.actors.support import trace
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class TestCriticalPath(unittest.TestCase):
+
+    def setUp(self):
+        self.spans = []
+
+    def _span(self, desc, start, end, parent=None):
+        span = trace.Span(id=len(self.spans) + 1, parent=parent,
+                          type='unit.Test', desc=desc)
+        span.start = start
+        span.end = end
+        self.spans.append(span)
+        return span
+
+    def test_analyze_empty(self):
+        self.assertEquals(critical_path.analyze([]), None)
+        self.assertEquals(critical_path.format_report(None),
+                          ['No actors were executed.'])
+
+    def test_analyze(self):
+        # main (async)
+        #   s1: 0 -> 2
+        #   seq (sync)
+        #     s2: 0 -> 1
+        #     s3: 1 -> 4
+        #   s4: 0 -> 3.5
+        main = self._span('main', 0, 4)
+        s1 = self._span('s1', 0, 2, main)
+        seq = self._span('seq', 0, 4, main)
+        s2 = self._span('s2', 0, 1, seq)
+        s3 = self._span('s3', 1, 4, seq)
+        s4 = self._span('s4', 0, 3.5, main)
+
+        report = critical_path.analyze(self.spans, top=2)
+        self.assertEquals(report['root'], main)
+        self.assertEquals(report['total'], 4)
+        self.assertEquals(report['path'], [s2, s3])
+        self.assertEquals(report['slack'], [(0.5, s4), (2, s1)])
+        self.assertEquals(report['slowest'], [s4, s3])
+
+        lines = critical_path.format_report(report)
+        self.assertIn('Critical path: 4.00s', lines[0])
+        self.assertIn('"s2" (in "seq")', lines[1])
+        self.assertIn('0.50s  slack for "s4" (in "main")', lines[4])
+
+    def test_analyze_picks_last_root(self):
+        self._span('dry', 0, 1)
+        real = self._span('real', 1, 2)
+        report = critical_path.analyze(self.spans)
+        self.assertEquals(report['root'], real)
+        self.assertEquals(report['path'], [real])
+        self.assertEquals(report['slack'], [])
+
+    def test_waited_on_skips_parallel_siblings(self):
+        # Sync group with contexts that ran a, b then c; while d overlapped
+        # all of them.
+        parent = self._span('parent', 0, 6)
+        a = self._span('a', 0, 1, parent)
+        b = self._span('b', 1, 3, parent)
+        c = self._span('c', 3, 6, parent)
+        d = self._span('d', 0.5, 5, parent)
+        self.assertEquals(critical_path._waited_on([a, b, c, d]), [a, b, c])
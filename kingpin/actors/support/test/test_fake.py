@@ -0,0 +1,70 @@
+"""Tests for the actors.support.fake package."""
+
+import unittest
+
+import mock
+
+from kingpin.actors.support import fake
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class TestBehavior(unittest.TestCase):
+
+    def test_roll(self):
+        behavior = fake.Behavior(latency=0, error_rate=0, throttle_rate=0)
+        self.assertEquals(behavior.roll('unit'), None)
+        self.assertEquals(behavior.calls['unit'], 1)
+
+        behavior.throttle_rate = 1
+        self.assertEquals(behavior.roll('unit'), fake.THROTTLED)
+
+        behavior.throttle_rate = 0
+        behavior.error_rate = 1
+        self.assertEquals(behavior.roll('unit'), fake.FAILED)
+        self.assertEquals(behavior.calls['unit'], 3)
+
+    def test_roll_is_repeatable(self):
+        first = fake.Behavior(error_rate=0.5, seed=42)
+        second = fake.Behavior(error_rate=0.5, seed=42)
+        self.assertEquals([first.roll('unit') for i in range(20)],
+                          [second.roll('unit') for i in range(20)])
+
+    def test_roll_latency(self):
+        behavior = fake.Behavior(latency=0.5)
+        with mock.patch.object(fake.time, 'sleep') as sleep:
+            behavior.roll('unit')
+        sleep.assert_called_once_with(0.5)
+
+
+class TestPending(unittest.TestCase):
+
+    def test_done(self):
+        pending = fake.Pending(2)
+        self.assertFalse(pending.done())
+        self.assertTrue(pending.done())
+        self.assertTrue(pending.done())
+        self.assertTrue(fake.Pending(0).done())
+
+
+class TestInstall(unittest.TestCase):
+
+    def tearDown(self):
+        fake.uninstall()
+
+    def test_install_unknown(self):
+        with self.assertRaises(ValueError):
+            fake.install(['aws', 'nope'])
+
+    def test_install(self):
+        state = {'aws': {'queues': [{'name': 'unit'}]}}
+        backends = fake.install(['aws', 'rightscale'], state=state)
+        self.assertEquals(sorted(backends), ['aws', 'rightscale'])
+        self.assertIn('unit', backends['aws'].queues)
+
+        # Installing again hands back the same backend
+        again = fake.install(['aws'])
+        self.assertIs(again['aws'], backends['aws'])
+
+        fake.uninstall()
+        self.assertEquals(fake._INSTALLED, {})
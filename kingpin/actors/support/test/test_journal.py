@@ -0,0 +1,136 @@
+"""Tests for the actors.support.journal package."""
+
+import json
+import os
+import tempfile
+
+from tornado import gen
+from tornado import testing
+
+from kingpin import utils
+from kingpin.actors import base
+from kingpin.actors import exceptions
+from kingpin.actors import group
+from kingpin.actors.support import journal
+from kingpin.actors.support import trace
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class RetryingActor(base.BaseActor):
+
+    """Fails once, then succeeds."""
+
+    all_options = {}
+
+    @gen.coroutine
+    def _execute(self):
+        self.attempts = 0
+        yield self._flaky()
+
+    @gen.coroutine
+    @utils.retry(excs=exceptions.RecoverableActorFailure, delay=0)
+    def _flaky(self):
+        self.attempts += 1
+        if self.attempts < 2:
+            raise exceptions.RecoverableActorFailure('try again')
+
+
+class SlowActor(base.BaseActor):
+
+    all_options = {}
+
+    @gen.coroutine
+    def _execute(self):
+        yield gen.sleep(1)
+
+
+class TestJournal(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestJournal, self).setUp()
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.journal = journal.enable(self.path)
+
+    def tearDown(self):
+        super(TestJournal, self).tearDown()
+        journal.disable()
+        os.unlink(self.path)
+
+    def _events(self):
+        journal.disable()
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    @testing.gen_test
+    def test_group_events(self):
+        actor = group.Sync('Group', {'acts': [
+            {'desc': 'a', 'actor': 'misc.Sleep', 'options': {'sleep': 0}},
+            {'desc': 'b', 'actor': 'misc.Sleep', 'options': {'sleep': 0},
+             'condition': False}]})
+        yield actor.execute()
+
+        events = self._events()
+        self.assertEquals(set(e['run'] for e in events),
+                          set([self.journal.run]))
+        summary = [(e['event'], e['actor'], e.get('parent'))
+                   for e in events if e['event'] != 'initialized']
+        a, b = actor._actions
+        self.assertEquals(summary, [
+            ('started', actor._id, None),
+            ('started', a._id, actor._id),
+            ('succeeded', a._id, actor._id),
+            ('started', b._id, actor._id),
+            ('skipped', b._id, actor._id),
+            ('succeeded', actor._id, None)])
+
+        initialized = [e for e in events if e['event'] == 'initialized']
+        self.assertEquals([e['actor'] for e in initialized],
+                          [actor._id, a._id, b._id])
+        self.assertEquals(initialized[1]['type'], 'kingpin.actors.misc.Sleep')
+
+    @testing.gen_test
+    def test_retried_and_failed(self):
+        yield RetryingActor('Retry', {}).execute()
+
+        actor = SlowActor('Slow', {}, timeout=0.01)
+        with self.assertRaises(exceptions.ActorTimedOut):
+            yield actor.execute()
+
+        events = [e for e in self._events() if e['event'] != 'initialized']
+        self.assertEquals([e['event'] for e in events],
+                          ['started', 'retried', 'succeeded',
+                           'started', 'timed_out'])
+        self.assertEquals(events[2]['retries'], 1)
+        self.assertEquals(events[4]['result'], trace.FAILURE)
+        self.assertIn('deadline', events[4]['error'])
+
+    def test_batching(self):
+        self.journal.batch_size = 3
+        self.journal.flush_interval = 60
+        self.journal.record('started', 1)
+        self.journal.record('started', 2)
+        self.assertEquals(os.path.getsize(self.path), 0)
+
+        self.journal.record('started', 3)
+        with open(self.path) as f:
+            self.assertEquals(len(f.readlines()), 3)
+
+    @testing.gen_test
+    def test_flush_interval(self):
+        journal.disable()
+        self.journal = journal.enable(self.path, flush_interval=0.05)
+        self.journal.record('started', 1)
+        self.assertEquals(os.path.getsize(self.path), 0)
+
+        # Written out without waiting for another event
+        yield gen.sleep(0.1)
+        with open(self.path) as f:
+            self.assertEquals(len(f.readlines()), 1)
+
+    def test_disabled(self):
+        journal.disable()
+        self.assertEquals(journal.get_journal(), None)
+        self.assertEquals(trace.start_span(base.BaseActor('a', {})), None)
+        journal.disable()
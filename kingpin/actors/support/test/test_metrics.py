@@ -0,0 +1,183 @@
+"""Tests for the actors.support.metrics package."""
+
+import os
+import tempfile
+import threading
+
+from boto.exception import BotoServerError
+from tornado import gen
+from tornado import httpclient
+from tornado import testing
+
+from kingpin import utils
+from kingpin.actors.aws import settings as aws_settings
+from kingpin.actors.support import metrics
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class TestMetrics(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestMetrics, self).setUp()
+        self.registry = metrics.Registry()
+
+    def test_counter(self):
+        c = self.registry.counter('unit_total', 'Unit test', labels=('a',))
+        c.inc(a='x')
+        c.inc(2, a='x')
+        c.inc(a='y"z')
+        self.assertEquals(c.value(a='x'), 3)
+        self.assertEquals(c.value(a='nope'), 0)
+        self.assertEquals(
+            c.render(),
+            '# HELP unit_total Unit test\n'
+            '# TYPE unit_total counter\n'
+            'unit_total{a="x"} 3.0\n'
+            'unit_total{a="y\\"z"} 1.0')
+
+    def test_labels_are_validated(self):
+        c = self.registry.counter('unit_total', 'Unit test', labels=('a',))
+        with self.assertRaises(ValueError):
+            c.inc()
+        with self.assertRaises(ValueError):
+            c.inc(a=1, b=2)
+
+    def test_registry_reuses_metrics(self):
+        c = self.registry.counter('unit_total', 'Unit test')
+        self.assertIs(self.registry.counter('unit_total', 'Unit test'), c)
+        with self.assertRaises(ValueError):
+            self.registry.gauge('unit_total', 'Unit test')
+
+    def test_gauge(self):
+        g = self.registry.gauge('unit', 'Unit test', labels=('a',))
+        g.set(5, a='x')
+        g.dec(a='x')
+        g.set_function(lambda: 42, a='y')
+        self.assertEquals(g.value(a='x'), 4)
+        self.assertEquals(g.value(a='y'), 42)
+        self.assertIn('unit{a="y"} 42.0', g.render())
+
+    def test_histogram(self):
+        h = self.registry.histogram('unit_seconds', 'Unit test',
+                                    buckets=(1, 5))
+        h.observe(0.5)
+        h.observe(3)
+        h.observe(10)
+        self.assertEquals(h.value(), 3)
+        lines = h.render().split('\n')[2:]
+        self.assertEquals(lines, [
+            'unit_seconds_bucket{le="1"} 1.0',
+            'unit_seconds_bucket{le="5"} 2.0',
+            'unit_seconds_bucket{le="+Inf"} 3.0',
+            'unit_seconds_sum 13.5',
+            'unit_seconds_count 3.0'])
+
+    def test_timed(self):
+        h = self.registry.histogram('unit_seconds', 'Unit test',
+                                    labels=('method',))
+
+        @metrics.timed(h, label='method')
+        def works():
+            return True
+
+        @metrics.timed(h, label='method')
+        def breaks():
+            raise ValueError()
+
+        self.assertTrue(works())
+        with self.assertRaises(ValueError):
+            breaks()
+        self.assertEquals(h.value(method='works'), 1)
+        self.assertEquals(h.value(method='breaks'), 1)
+
+    def test_clear_and_write(self):
+        c = self.registry.counter('unit_total', 'Unit test')
+        c.inc()
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.registry.write(path)
+            with open(path) as f:
+                self.assertIn('unit_total 1.0\n', f.read())
+        finally:
+            os.unlink(path)
+
+        self.registry.clear()
+        self.assertEquals(c.value(), 0)
+
+    @testing.gen_test
+    def test_serve(self):
+        self.registry.counter('unit_total', 'Unit test').inc()
+        sock, port = testing.bind_unused_port()
+        sock.close()
+        self.registry.serve(port)
+        try:
+            client = httpclient.AsyncHTTPClient()
+            res = yield client.fetch('http://127.0.0.1:%s/metrics' % port)
+            self.assertIn('unit_total 1.0', res.body)
+            with self.assertRaises(httpclient.HTTPError):
+                yield client.fetch('http://127.0.0.1:%s/' % port)
+        finally:
+            self.registry.stop_serving()
+
+    @testing.gen_test
+    def test_retries_are_counted(self):
+        before = metrics.RETRIES.value(decorator='utils.retry')
+
+        @gen.coroutine
+        @utils.retry(excs=ValueError, retries=3, delay=0)
+        def fails():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            yield fails()
+        self.assertEquals(
+            metrics.RETRIES.value(decorator='utils.retry'), before + 2)
+
+    def test_executor_queue(self):
+        executor = metrics.ThreadPoolExecutor(1, name='unit')
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def block():
+            started.set()
+            return release.wait(1)
+
+        running = executor.submit(block)
+        started.wait(1)
+        queued = executor.submit(lambda: 'done')
+        cancelled = executor.submit(lambda: 'never')
+        self.assertEquals(
+            metrics.EXECUTOR_QUEUE.value(executor='unit'), 2)
+
+        cancelled.cancel()
+        self.assertEquals(
+            metrics.EXECUTOR_QUEUE.value(executor='unit'), 1)
+
+        release.set()
+        self.assertEquals(queued.result(), 'done')
+        self.assertTrue(running.result())
+        self.assertEquals(
+            metrics.EXECUTOR_QUEUE.value(executor='unit'), 0)
+
+    @testing.gen_test
+    def test_aws_retries_are_counted_once(self):
+        before = metrics.RETRIES.value(decorator='utils.async_retry')
+        error = BotoServerError(400, 'Throttled')
+        error.error_code = 'Throttling'
+        retriable = aws_settings.is_retriable_exception
+
+        @utils.async_retry(stop_max_attempt_number=2, wait_fixed=0,
+                           retry_on_exception=retriable)
+        @gen.coroutine
+        def throttled():
+            raise error
+
+        # Two attempts, with one retry in between
+        with self.assertRaises(BotoServerError):
+            yield throttled()
+        self.assertEquals(
+            metrics.RETRIES.value(decorator='utils.async_retry'), before + 1)
+        self.assertEquals(metrics.RETRIES.value(decorator='aws.retrying'), 0)
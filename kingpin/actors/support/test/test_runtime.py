@@ -0,0 +1,121 @@
+"""Tests for the actors.support.runtime package."""
+
+from tornado import gen
+from tornado import testing
+
+from kingpin.actors import base
+from kingpin.actors import exceptions
+from kingpin.actors import group
+from kingpin.actors.support import runtime
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class PublishingActor(base.BaseActor):
+
+    """Publishes its `value` option as `value`."""
+
+    all_options = {'value': (str, None, 'Value to publish')}
+
+    @gen.coroutine
+    def _execute(self):
+        self.publish('value', self.option('value'))
+
+
+class TestRuntime(testing.AsyncTestCase):
+
+    def tearDown(self):
+        super(TestRuntime, self).tearDown()
+        runtime.reset()
+
+    def test_fill_in(self):
+        runtime.publish('clone.href', '/api/server_arrays/1')
+        runtime.publish('clone.count', 2)
+
+        options = {'array': '{@clone.href}',
+                   'params': {'note': '{@clone.count} of {@clone.href}'},
+                   'list': ['{@clone.href}', '{@other.href}', 3],
+                   'flag': True}
+        filled = runtime.fill_in(options)
+        self.assertEquals(filled, {
+            'array': '/api/server_arrays/1',
+            'params': {'note': '2 of /api/server_arrays/1'},
+            'list': ['/api/server_arrays/1', '{@other.href}', 3],
+            'flag': True})
+        self.assertEquals(options['array'], '{@clone.href}')
+
+        self.assertEquals(runtime.find_tokens(filled), ['other.href'])
+        self.assertEquals(runtime.find_tokens(options),
+                          ['clone.count', 'clone.href', 'other.href'])
+
+    def test_publish_needs_an_id(self):
+        PublishingActor('Unit', {}).publish('value', 'x')
+        self.assertEquals(runtime.get('None.value'), None)
+
+        actor = PublishingActor('Unit', {}, id='unit')
+        actor.publish('value', 'x')
+        self.assertEquals(runtime.get('unit.value'), 'x')
+        self.assertEquals(actor._outputs, {'unit.value': 'x'})
+
+    @testing.gen_test
+    def test_tokens_filled_in_at_execution(self):
+        # This module is not always importable as part of the kingpin
+        # package, so find the actor by whatever name it was imported as.
+        actor_name = '%s.PublishingActor' % __name__
+        actor = group.Sync('Group', {'acts': [
+            {'desc': 'first', 'id': 'first', 'actor': actor_name,
+             'options': {'value': 'hello'}},
+            {'desc': 'second', 'id': 'second', 'actor': actor_name,
+             'options': {'value': '{@first.value} world'}}]})
+        yield actor.execute()
+        self.assertEquals(runtime.get('second.value'), 'hello world')
+
+        # The group left the tokens for its acts to fill in
+        self.assertEquals(runtime.find_tokens(actor._options),
+                          ['first.value'])
+
+    @testing.gen_test
+    def test_ids_per_context(self):
+        actor_name = '%s.PublishingActor' % __name__
+        config = {'contexts': [{'NAME': 'a'}, {'NAME': 'b'}],
+                  'acts': [{'desc': 'publish {NAME}', 'id': 'pub-{NAME}',
+                            'actor': actor_name,
+                            'options': {'value': '{NAME}'}}]}
+        yield group.Async('Group', config).execute()
+        self.assertEquals(runtime.get('pub-a.value'), 'a')
+        self.assertEquals(runtime.get('pub-b.value'), 'b')
+
+    def test_publish_same_id_twice(self):
+        actor = PublishingActor('Unit', {}, id='unit')
+        actor.publish('value', 'w')
+
+        # The same actor may publish again, but no other actor may
+        actor.publish('value', 'x')
+        with self.assertRaises(exceptions.InvalidOptions):
+            PublishingActor('Unit', {}, id='unit').publish('value', 'y')
+        self.assertEquals(runtime.get('unit.value'), 'x')
+
+    def test_real_run_follows_rehearsal(self):
+        # kingpin.bin.deploy creates the actors once for the dry run, and
+        # once more for the real one.
+        PublishingActor('Unit', {}, id='unit', dry=True).publish('value', 'x')
+        with self.assertRaises(exceptions.InvalidOptions):
+            PublishingActor('Unit', {}, id='unit', dry=True).publish(
+                'value', 'y')
+
+        PublishingActor('Unit', {}, id='unit').publish('value', 'y')
+        self.assertEquals(runtime.get('unit.value'), 'y')
+
+    @testing.gen_test
+    def test_missing_tokens(self):
+        actor = PublishingActor('Unit', {'value': '{@missing.value}'},
+                                id='unit')
+        with self.assertRaises(exceptions.InvalidOptions):
+            yield actor.execute()
+        self.assertEquals(runtime.get('unit.value'), None)
+
+        # Dry runs leave them be, nothing was really created to publish.
+        actor = PublishingActor('Unit', {'value': '{@missing.value}'},
+                                id='unit', dry=True)
+        yield actor.execute()
+        self.assertEquals(runtime.get('unit.value'), '{@missing.value}')
@@ -0,0 +1,139 @@
+"""Tests for the actors.support.trace package."""
+
+import json
+import os
+import tempfile
+
+from tornado import gen
+from tornado import testing
+
+from kingpin import utils
+from kingpin.actors import base
+from kingpin.actors import exceptions
+from kingpin.actors import group
+from kingpin.actors.support import trace
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class RetryingActor(base.BaseActor):
+
+    """Fails once, then succeeds."""
+
+    all_options = {}
+
+    @gen.coroutine
+    def _execute(self):
+        self.attempts = 0
+        yield self._flaky()
+
+    @gen.coroutine
+    @utils.retry(excs=exceptions.RecoverableActorFailure, delay=0)
+    def _flaky(self):
+        self.attempts += 1
+        if self.attempts < 2:
+            raise exceptions.RecoverableActorFailure('try again')
+
+
+class TestTrace(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestTrace, self).setUp()
+        self.tracer = trace.enable()
+
+    def tearDown(self):
+        super(TestTrace, self).tearDown()
+        trace.disable()
+
+    def _group(self, actor_class, acts):
+        return actor_class('Group', {'acts': [
+            {'desc': desc, 'actor': 'misc.Sleep', 'options': {'sleep': 0}}
+            for desc in acts]})
+
+    @testing.gen_test
+    def test_disabled(self):
+        trace.disable()
+        yield self._group(group.Sync, ['a']).execute()
+        self.assertEquals(trace.start_span(None), None)
+        self.assertEquals(self.tracer.spans, [])
+
+    @testing.gen_test
+    def test_span_parents(self):
+        actor = self._group(group.Async, ['a', 'b'])
+        yield actor.execute()
+
+        spans = dict((s.desc, s) for s in self.tracer.spans)
+        self.assertEquals(len(spans), 3)
+        self.assertEquals(spans['Group'].parent, None)
+        self.assertEquals(spans['a'].parent, spans['Group'])
+        self.assertEquals(spans['b'].parent, spans['Group'])
+        self.assertEquals(spans['a'].type, 'kingpin.actors.misc.Sleep')
+        self.assertEquals(spans['a'].result, trace.SUCCESS)
+        self.assertTrue(spans['Group'].end >= spans['b'].end)
+        self.assertEquals(trace.current_span(), None)
+
+    @testing.gen_test
+    def test_span_results(self):
+        skipped = base.BaseActor('skipped', {}, condition=False)
+        yield skipped.execute()
+
+        failed = group.Sync('failed', {'acts': [{
+            'actor': 'misc.Sleep', 'desc': 'bad', 'options': {'sleep': 'x'}}]})
+        with self.assertRaises(exceptions.ActorException):
+            yield failed.execute()
+
+        spans = dict((s.desc, s) for s in self.tracer.spans)
+        self.assertEquals(spans['skipped'].result, trace.SKIPPED)
+        self.assertEquals(spans['failed'].result, trace.FAILURE)
+        self.assertEquals(spans['bad'].result, trace.FAILURE)
+        self.assertTrue(spans['bad'].error)
+
+    @testing.gen_test
+    def test_retries(self):
+        yield RetryingActor('flaky', {}).execute()
+        self.assertEquals(self.tracer.spans[0].retries, 1)
+
+    @testing.gen_test
+    def test_chrome_trace(self):
+        yield self._group(group.Async, ['a', 'b']).execute()
+        events = self.tracer.chrome_trace()['traceEvents']
+        lanes = dict((e['name'], e['tid']) for e in events)
+
+        # Overlapping siblings can't share a lane, but one of them stays with
+        # its parent.
+        self.assertNotEquals(lanes['a'], lanes['b'])
+        self.assertIn(lanes['Group'], (lanes['a'], lanes['b']))
+        self.assertEquals(events[0]['ph'], 'X')
+        self.assertEquals(events[0]['args']['result'], trace.SUCCESS)
+
+    @testing.gen_test
+    def test_chrome_trace_sequential(self):
+        yield self._group(group.Sync, ['a', 'b']).execute()
+        events = self.tracer.chrome_trace()['traceEvents']
+        self.assertEquals(set(e['tid'] for e in events), set([0]))
+
+    @testing.gen_test
+    def test_otlp(self):
+        yield self._group(group.Sync, ['a']).execute()
+        data = self.tracer.otlp()
+        spans = data['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEquals(len(spans), 2)
+        self.assertNotIn('parentSpanId', spans[0])
+        self.assertEquals(spans[1]['parentSpanId'], spans[0]['spanId'])
+        self.assertEquals(spans[1]['traceId'], spans[0]['traceId'])
+        self.assertEquals(spans[1]['status'], {'code': 1})
+
+    @testing.gen_test
+    def test_write(self):
+        yield self._group(group.Sync, ['a']).execute()
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            for fmt in trace.FORMATS:
+                self.tracer.write(path, fmt)
+                with open(path) as f:
+                    self.assertTrue(json.load(f))
+            with self.assertRaises(ValueError):
+                self.tracer.write(path, 'xml')
+        finally:
+            os.unlink(path)
@@ -0,0 +1,196 @@
+"""Tests for the actors.support.transport package."""
+
+import mock
+
+from tornado import gen
+from tornado import httpclient
+from tornado import stack_context
+from tornado import testing
+
+from kingpin.actors import exceptions
+from kingpin.actors.support import cancel
+from kingpin.actors.support import transport
+from kingpin.actors.test.helper import tornado_value
+from kingpin.actors.test.helper import mock_tornado
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+
+class TestTransport(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestTransport, self).setUp()
+        self.settings = (transport.BACKEND, transport.MAX_CLIENTS,
+                         transport.MAX_PER_HOST, transport.CONNECT_TIMEOUT,
+                         transport.REQUEST_TIMEOUT)
+        transport.clear_cache()
+
+    def tearDown(self):
+        super(TestTransport, self).tearDown()
+        (transport.BACKEND, transport.MAX_CLIENTS, transport.MAX_PER_HOST,
+         transport.CONNECT_TIMEOUT, transport.REQUEST_TIMEOUT) = self.settings
+        transport._HOST_SEMAPHORES.clear()
+        transport.clear_cache()
+        httpclient.AsyncHTTPClient.configure(None)
+
+    def test_configure(self):
+        with mock.patch.object(transport, 'pycurl', None):
+            impl = transport.configure(backend='auto', max_clients=100)
+        self.assertEquals(impl, transport.SIMPLE_CLIENT)
+        self.assertEquals(transport.MAX_CLIENTS, 100)
+        self.assertEquals(
+            httpclient.AsyncHTTPClient.configured_class().__name__,
+            'SimpleAsyncHTTPClient')
+
+    def test_configure_auto_prefers_curl(self):
+        with mock.patch.object(transport, 'pycurl', mock.MagicMock()):
+            self.assertTrue(transport.curl_available())
+            with mock.patch.object(httpclient.AsyncHTTPClient,
+                                   'configure') as configure:
+                impl = transport.configure(backend='auto')
+        self.assertEquals(impl, transport.CURL_CLIENT)
+        configure.assert_called_once_with(
+            transport.CURL_CLIENT, max_clients=transport.MAX_CLIENTS)
+
+    def test_configure_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            transport.configure(backend='carrier_pigeon')
+
+    def test_request_options(self):
+        transport.configure(backend='simple', connect_timeout=1,
+                            request_timeout=2)
+        self.assertEquals(transport.request_options(),
+                          {'connect_timeout': 1.0, 'request_timeout': 2.0})
+
+        with stack_context.StackContext(cancel.Token(timeout=1.5).activate):
+            options = transport.request_options()
+        self.assertEquals(options['connect_timeout'], 1.0)
+        self.assertTrue(1.4 < options['request_timeout'] <= 1.5)
+
+        with stack_context.StackContext(cancel.Token(timeout=0).activate):
+            with self.assertRaises(exceptions.ActorCancelled):
+                transport.request_options()
+
+    @testing.gen_test
+    def test_fetch(self):
+        client = mock.MagicMock()
+        client.fetch.return_value = tornado_value('response')
+        request = httpclient.HTTPRequest('http://unittest.com/foo')
+        ret = yield transport.fetch(client, request)
+        self.assertEquals(ret, 'response')
+        client.fetch.assert_called_once_with(request)
+
+    @testing.gen_test
+    def test_fetch_with_max_per_host(self):
+        transport.configure(backend='simple', max_per_host=1)
+
+        running = []
+        peak = []
+
+        @gen.coroutine
+        def fetch(request):
+            running.append(request)
+            peak.append(len(running))
+            yield gen.moment
+            running.remove(request)
+            raise gen.Return(request.url)
+
+        client = mock.MagicMock()
+        client.fetch = fetch
+        urls = ['http://a.com/1', 'http://a.com/2', 'http://b.com/1']
+        ret = yield [transport.fetch(client, httpclient.HTTPRequest(u))
+                     for u in urls]
+        self.assertEquals(ret, urls)
+
+        # Only one request to a.com at a time, but b.com is not held up
+        self.assertEquals(max(peak), 2)
+        self.assertEquals(len(transport._HOST_SEMAPHORES), 2)
+
+    @testing.gen_test
+    def test_fetch_releases_on_error(self):
+        transport.configure(backend='simple', max_per_host=1)
+        client = mock.MagicMock()
+        client.fetch = mock_tornado(exc=httpclient.HTTPError(500))
+        request = httpclient.HTTPRequest('http://unittest.com/foo')
+        for i in range(2):
+            with self.assertRaises(httpclient.HTTPError):
+                yield transport.fetch(client, request)
+
+    def test_request_key(self):
+        a = httpclient.HTTPRequest('http://unittest.com/foo',
+                                   auth_username='a', auth_password='b')
+        b = httpclient.HTTPRequest('http://unittest.com/foo',
+                                   auth_username='a', auth_password='c')
+        c = httpclient.HTTPRequest('http://unittest.com/foo',
+                                   auth_username='a', auth_password='b')
+        self.assertNotEquals(transport.request_key(a),
+                             transport.request_key(b))
+        self.assertEquals(transport.request_key(a), transport.request_key(c))
+        self.assertNotIn('b', transport.request_key(a)[2:])
+
+    @testing.gen_test
+    def test_fetch_cache_coalesces(self):
+        calls = []
+
+        @gen.coroutine
+        def fetch(request):
+            calls.append(request)
+            yield gen.moment
+            raise gen.Return('response')
+
+        client = mock.MagicMock()
+        client.fetch = fetch
+        ret = yield [
+            transport.fetch(client,
+                            httpclient.HTTPRequest('http://a.com/1'),
+                            cache=True)
+            for i in range(3)]
+        self.assertEquals(ret, ['response'] * 3)
+        self.assertEquals(len(calls), 1)
+
+        # Finished requests are re-used too..
+        ret = yield transport.fetch(
+            client, httpclient.HTTPRequest('http://a.com/1'), cache=True)
+        self.assertEquals(ret, 'response')
+        self.assertEquals(len(calls), 1)
+
+        # But not by requests that did not ask for it
+        yield transport.fetch(client, httpclient.HTTPRequest('http://a.com/1'))
+        self.assertEquals(len(calls), 2)
+
+    @testing.gen_test
+    def test_fetch_cache_expires(self):
+        client = mock.MagicMock()
+        client.fetch.return_value = tornado_value('response')
+        request = httpclient.HTTPRequest('http://unittest.com/foo')
+        with mock.patch.object(transport, 'time') as t:
+            t.time.return_value = 1000
+            yield transport.fetch(client, request, cache=True)
+            t.time.return_value = 1000 + transport.CACHE_TTL - 1
+            yield transport.fetch(client, request, cache=True)
+            self.assertEquals(client.fetch.call_count, 1)
+            t.time.return_value = 1000 + transport.CACHE_TTL + 1
+            yield transport.fetch(client, request, cache=True)
+            self.assertEquals(client.fetch.call_count, 2)
+
+    @testing.gen_test
+    def test_fetch_cache_skips_errors(self):
+        client = mock.MagicMock()
+        client.fetch = mock_tornado(exc=httpclient.HTTPError(500))
+        request = httpclient.HTTPRequest('http://unittest.com/foo')
+        for i in range(2):
+            with self.assertRaises(httpclient.HTTPError):
+                yield transport.fetch(client, request, cache=True)
+        self.assertEquals(client.fetch._call_count, 2)
+        self.assertEquals(transport._CACHE, {})
+
+    @testing.gen_test
+    def test_fetch_records_metrics(self):
+        labels = {'host': 'metrics.com', 'method': 'GET', 'code': 500}
+        before = transport.REQUESTS.value(**labels)
+        client = mock.MagicMock()
+        client.fetch = mock_tornado(exc=httpclient.HTTPError(500))
+        with self.assertRaises(httpclient.HTTPError):
+            yield transport.fetch(
+                client, httpclient.HTTPRequest('http://metrics.com/foo'))
+        self.assertEquals(transport.REQUESTS.value(**labels), before + 1)
@@ -0,0 +1,344 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.trace`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+Records a `Span` for every `kingpin.actors.base.BaseActor.execute()` call,
+so that a whole deployment can be loaded into a flame-chart viewer.
+
+Tracing is off until `enable()` is called. Each span records the actor type,
+description, its parent span (the group actor that executed it), the start
+and end times, the result and the number of retries made on its behalf.
+
+The span that is currently executing follows the code across the IOLoop using
+a Tornado `StackContext`, so nothing has to be passed from the group actors
+down to their children.
+
+Other modules (like `kingpin.actors.support.journal`) can follow the spans
+as they start, retry and finish with `add_listener()`. Spans are created
+whenever there is either a Tracer or a listener.
+
+Spans can be written out as either `Chrome trace-event
+<https://github.com/catapult-project/catapult/wiki/Trace-Event-Format>`_
+JSON (load it into ``chrome://tracing`` or https://ui.perfetto.dev) or as
+`OTLP <https://opentelemetry.io/docs/specs/otlp/>`_ JSON.
+"""
+
+import contextlib
+import logging
+import os
+import time
+
+import simplejson as json
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+FORMATS = ('chrome', 'otlp')
+
+SUCCESS = 'success'
+FAILURE = 'failure'
+WARNING = 'warning'
+SKIPPED = 'skipped'
+
+# The active Tracer object (or None when tracing is disabled) and the Span
+# that is executing right now.
+_TRACER = None
+_CURRENT = None
+
+# Objects with span_started(), span_retried() and span_finished() methods
+_LISTENERS = []
+
+
+class Span(object):
+
+    """The execution of a single actor."""
+
+    __slots__ = ('id', 'parent', 'actor', 'type', 'desc', 'dry', 'start',
+                 'end', 'result', 'error', 'retries')
+
+    def __init__(self, id, parent, type, desc, dry=False, actor=None):
+        self.id = id
+        self.parent = parent
+        self.actor = actor
+        self.type = type
+        self.desc = desc
+        self.dry = dry
+        self.start = time.time()
+        self.end = None
+        self.result = None
+        self.error = None
+        self.retries = 0
+
+    @property
+    def duration(self):
+        """Seconds the span took (or has taken so far)."""
+        return (self.end or time.time()) - self.start
+
+    @property
+    def parent_id(self):
+        return self.parent.id if self.parent else None
+
+    def finish(self, error=None):
+        """Marks the span as done.
+
+        Args:
+            error: The exception that ended the execution, if any.
+        """
+        self.end = time.time()
+        if error is not None:
+            self.result = FAILURE
+            self.error = str(error)
+        elif self.result is None:
+            self.result = SUCCESS
+
+        for listener in _LISTENERS:
+            listener.span_finished(self, error)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Context manager that makes this the current span.
+
+        Used as a StackContext factory, so that it is re-entered every time
+        the IOLoop runs a callback that belongs to this span.
+        """
+        global _CURRENT
+        previous = _CURRENT
+        _CURRENT = self
+        try:
+            yield
+        finally:
+            _CURRENT = previous
+
+    def to_dict(self):
+        return {'id': self.id,
+                'parent': self.parent_id,
+                'type': self.type,
+                'desc': self.desc,
+                'dry': self.dry,
+                'start': self.start,
+                'end': self.end,
+                'duration': self.duration,
+                'result': self.result,
+                'error': self.error,
+                'retries': self.retries}
+
+
+class Tracer(object):
+
+    """Collects the spans for one Kingpin run."""
+
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, actor):
+        """Creates a Span for `actor`, a child of the current span.
+
+        Args:
+            actor: A `kingpin.actors.base.BaseActor` object
+
+        Returns:
+            A Span object
+        """
+        span = Span(id=len(self.spans) + 1, parent=_CURRENT,
+                    type=actor._type, desc=actor._desc, dry=actor._dry,
+                    actor=getattr(actor, '_id', None))
+        self.spans.append(span)
+        return span
+
+    def _lanes(self):
+        """Assigns every span to a lane (a Chrome trace 'thread').
+
+        The trace viewers only nest events on a single thread, and expect
+        them to be either fully nested or not overlap at all. Parallel
+        branches of an Async group overlap, so each one is moved onto its own
+        lane. A span stays on its parent's lane when nothing else is running
+        there, and otherwise takes the first idle lane.
+
+        Returns:
+            Dict of Span.id -> lane number
+        """
+        lanes = {}
+        stacks = []  # One stack of open (end time, span) tuples per lane
+        for span in sorted(self.spans, key=lambda s: (s.start, -s.duration)):
+            preferred = []
+            if span.parent_id in lanes:
+                preferred = [lanes[span.parent_id]]
+            for lane in preferred + range(len(stacks)):
+                stack = stacks[lane]
+                while stack and stack[-1][0] <= span.start:
+                    stack.pop()
+                if not stack or stack[-1][1] is span.parent:
+                    break
+            else:
+                lane = len(stacks)
+                stacks.append([])
+            stacks[lane].append((span.start + span.duration, span))
+            lanes[span.id] = lane
+        return lanes
+
+    def chrome_trace(self):
+        """Returns the spans as a Chrome trace-event dict."""
+        lanes = self._lanes()
+        events = []
+        for span in self.spans:
+            args = span.to_dict()
+            args.pop('start')
+            args.pop('end')
+            events.append({
+                'name': span.desc,
+                'cat': 'dry' if span.dry else 'actor',
+                'ph': 'X',
+                'ts': int(span.start * 1000000),
+                'dur': int(span.duration * 1000000),
+                'pid': os.getpid(),
+                'tid': lanes[span.id],
+                'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def otlp(self):
+        """Returns the spans as an OTLP JSON (ExportTraceServiceRequest)."""
+        trace_id = os.urandom(16).encode('hex')
+
+        def attribute(key, value):
+            if isinstance(value, bool):
+                return {'key': key, 'value': {'boolValue': value}}
+            if isinstance(value, (int, long)):
+                return {'key': key, 'value': {'intValue': str(value)}}
+            return {'key': key, 'value': {'stringValue': str(value)}}
+
+        spans = []
+        for span in self.spans:
+            otlp_span = {
+                'traceId': trace_id,
+                'spanId': '%016x' % span.id,
+                'name': span.desc,
+                'kind': 1,  # SPAN_KIND_INTERNAL
+                'startTimeUnixNano': str(int(span.start * 1e9)),
+                'endTimeUnixNano': str(
+                    int((span.start + span.duration) * 1e9)),
+                'attributes': [
+                    attribute('kingpin.actor.type', span.type),
+                    attribute('kingpin.actor.dry', span.dry),
+                    attribute('kingpin.actor.result', span.result),
+                    attribute('kingpin.actor.retries', span.retries)],
+                'status': {'code': 2 if span.result == FAILURE else 1}}
+            if span.error:
+                otlp_span['status']['message'] = span.error
+            if span.parent:
+                otlp_span['parentSpanId'] = '%016x' % span.parent_id
+            spans.append(otlp_span)
+
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                attribute('service.name', 'kingpin')]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}]}]}
+
+    def write(self, path, fmt='chrome'):
+        """Writes all of the spans to `path`.
+
+        Args:
+            path: File name to write to
+            fmt: One of FORMATS
+
+        Raises:
+            ValueError: If the format is unknown
+        """
+        if fmt == 'chrome':
+            data = self.chrome_trace()
+        elif fmt == 'otlp':
+            data = self.otlp()
+        else:
+            raise ValueError('Unknown trace format: %s' % fmt)
+
+        log.debug('Writing %s spans to %s', len(self.spans), path)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+
+def enable():
+    """Starts tracing, and returns the new Tracer object."""
+    global _TRACER
+    _TRACER = Tracer()
+    return _TRACER
+
+
+def disable():
+    """Stops tracing."""
+    global _TRACER
+    _TRACER = None
+
+
+def get_tracer():
+    """Returns the active Tracer object, or None."""
+    return _TRACER
+
+
+def add_listener(listener):
+    """Calls `listener` back as spans start, retry and finish.
+
+    Args:
+        listener: An object with span_started(span), span_retried(span) and
+                  span_finished(span, error) methods
+    """
+    _LISTENERS.append(listener)
+
+
+def remove_listener(listener):
+    if listener in _LISTENERS:
+        _LISTENERS.remove(listener)
+
+
+def start_span(actor):
+    """Returns a new Span for `actor`.
+
+    Returns None if there is neither a Tracer nor a listener.
+    """
+    if _TRACER is not None:
+        span = _TRACER.start_span(actor)
+    elif _LISTENERS:
+        span = Span(id=None, parent=_CURRENT, type=actor._type,
+                    desc=actor._desc, dry=actor._dry,
+                    actor=getattr(actor, '_id', None))
+    else:
+        return None
+
+    for listener in _LISTENERS:
+        listener.span_started(span)
+    return span
+
+
+def current_span():
+    """Returns the Span that is executing right now, or None."""
+    return _CURRENT
+
+
+def set_result(result):
+    """Overrides the result of the current span (ie, SKIPPED)."""
+    if _CURRENT is not None:
+        _CURRENT.result = result
+
+
+def record_retry():
+    """Counts a retry against the current span.
+
+    Called by the retry decorators that run on the IOLoop. Retries that
+    happen inside of an executor thread can not be attributed to a span.
+    """
+    if _CURRENT is not None:
+        _CURRENT.retries += 1
+        for listener in _LISTENERS:
+            listener.span_retried(_CURRENT)
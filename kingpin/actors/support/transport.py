@@ -0,0 +1,285 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""
+:mod:`kingpin.actors.support.transport`
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+Process-wide configuration of the Tornado AsyncHTTPClient used by the
+`kingpin.actors.base.HTTPBaseActor` and `kingpin.actors.support.api.RestClient`
+objects.
+
+By default Tornado uses the SimpleAsyncHTTPClient with only 10 concurrent
+connections, which makes large numbers of parallel HTTP actors queue up behind
+each other. Here we pick the (faster, keep-alive capable) curl backend when
+`pycurl` is installed, raise the connection limit, and optionally limit the
+number of concurrent requests to any single host.
+
+**Optional Environment Variables**
+
+:HTTP_BACKEND:
+  `curl`, `simple` or `auto` (default). `auto` uses curl if it is installed.
+
+:HTTP_MAX_CLIENTS:
+  Maximum number of concurrent HTTP requests (default: 50)
+
+:HTTP_MAX_PER_HOST:
+  Maximum number of concurrent HTTP requests to a single host
+  (default: 0, unlimited)
+
+:HTTP_CONNECT_TIMEOUT:
+  Seconds to wait for a connection to be established (default: 20)
+
+:HTTP_REQUEST_TIMEOUT:
+  Seconds to wait for a single HTTP request to complete (default: 20). A
+  request never waits past the deadline of the actor that made it, though.
+
+:HTTP_CACHE_TTL:
+  Seconds that responses to cacheable requests are re-used (default: 300).
+"""
+
+import hashlib
+import logging
+import os
+import time
+import urlparse
+
+from tornado import gen
+from tornado import httpclient
+from tornado import locks
+
+from kingpin.actors.support import cancel
+from kingpin.actors.support import metrics
+
+try:
+    import pycurl
+except ImportError:
+    pycurl = None
+
+log = logging.getLogger(__name__)
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+CURL_CLIENT = 'tornado.curl_httpclient.CurlAsyncHTTPClient'
+SIMPLE_CLIENT = 'tornado.simple_httpclient.SimpleAsyncHTTPClient'
+
+BACKEND = os.getenv('HTTP_BACKEND', 'auto')
+MAX_CLIENTS = int(os.getenv('HTTP_MAX_CLIENTS', 50))
+MAX_PER_HOST = int(os.getenv('HTTP_MAX_PER_HOST', 0))
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 20))
+REQUEST_TIMEOUT = float(os.getenv('HTTP_REQUEST_TIMEOUT', 20))
+CACHE_TTL = float(os.getenv('HTTP_CACHE_TTL', 300))
+
+# One semaphore per remote host, used when MAX_PER_HOST is set.
+_HOST_SEMAPHORES = {}
+
+# Responses to cacheable requests, keyed by request_key(). Each value is a
+# tuple of (expiration time, Future). The Future is stored the moment the
+# request is made, so identical requests made while it is still in flight
+# wait on the same response.
+_CACHE = {}
+
+REQUESTS = metrics.histogram(
+    'kingpin_http_request_seconds',
+    'Duration of HTTP requests, by host, method and response code.',
+    labels=('host', 'method', 'code'))
+CACHE_HITS = metrics.counter(
+    'kingpin_http_cache_hits_total',
+    'HTTP requests that were answered from the response cache.',
+    labels=('host',))
+
+
+def curl_available():
+    """Returns True if the curl based AsyncHTTPClient can be used."""
+    return pycurl is not None
+
+
+def configure(backend=None, max_clients=None, max_per_host=None,
+              connect_timeout=None, request_timeout=None):
+    """Configures the AsyncHTTPClient used by every HTTP actor.
+
+    Must be called before the first AsyncHTTPClient is created on the IOLoop
+    (ie, at application startup). Any setting left as None keeps its current
+    value (which defaults to the environment variables described above).
+
+    Args:
+        backend: 'curl', 'simple' or 'auto'
+        max_clients: Maximum number of concurrent HTTP requests
+        max_per_host: Maximum concurrent requests to a single host (0 for
+                      unlimited)
+        connect_timeout: Default connection timeout in seconds
+        request_timeout: Default request timeout in seconds
+
+    Returns:
+        The name of the AsyncHTTPClient class that was configured.
+    """
+    global BACKEND, MAX_CLIENTS, MAX_PER_HOST, CONNECT_TIMEOUT
+    global REQUEST_TIMEOUT
+
+    if backend is not None:
+        BACKEND = backend
+    if max_clients is not None:
+        MAX_CLIENTS = int(max_clients)
+    if max_per_host is not None:
+        MAX_PER_HOST = int(max_per_host)
+    if connect_timeout is not None:
+        CONNECT_TIMEOUT = float(connect_timeout)
+    if request_timeout is not None:
+        REQUEST_TIMEOUT = float(request_timeout)
+
+    _HOST_SEMAPHORES.clear()
+
+    if BACKEND not in ('auto', 'curl', 'simple'):
+        raise ValueError('Unknown HTTP backend: %s' % BACKEND)
+
+    impl = SIMPLE_CLIENT
+    if BACKEND == 'curl' or (BACKEND == 'auto' and curl_available()):
+        impl = CURL_CLIENT
+
+    log.debug('Configuring %s (max_clients=%s, max_per_host=%s)',
+              impl, MAX_CLIENTS, MAX_PER_HOST)
+    httpclient.AsyncHTTPClient.configure(impl, max_clients=MAX_CLIENTS)
+
+    return impl
+
+
+def request_options():
+    """Returns the default HTTPRequest options for every request.
+
+    The timeouts are cut short to the time that is left for the calling actor
+    (see `kingpin.actors.support.cancel.remaining()`).
+
+    Returns:
+        Dict of kwargs for tornado.httpclient.HTTPRequest
+
+    Raises:
+        kingpin.actors.exceptions.ActorCancelled: If the request would not
+        finish in time anyways.
+    """
+    # Don't start a request that nobody will wait for
+    cancel.check()
+
+    options = {'connect_timeout': CONNECT_TIMEOUT,
+               'request_timeout': REQUEST_TIMEOUT}
+    remaining = cancel.remaining()
+    if remaining is not None:
+        for key, value in options.items():
+            options[key] = min(value, remaining)
+    return options
+
+
+def _get_host_semaphore(url):
+    """Returns the Semaphore limiting requests to the host in `url`."""
+    host = urlparse.urlparse(url).netloc
+    if host not in _HOST_SEMAPHORES:
+        _HOST_SEMAPHORES[host] = locks.Semaphore(MAX_PER_HOST)
+    return _HOST_SEMAPHORES[host]
+
+
+def request_key(request):
+    """Returns the cache key for an HTTPRequest.
+
+    The key is made up of the method, the URL, and a hash of everything that
+    may carry credentials (auth, headers and body). That way, two actors using
+    different credentials never share a response.
+
+    Args:
+        request: A tornado.httpclient.HTTPRequest object
+
+    Returns:
+        A hashable tuple
+    """
+    headers = sorted((request.headers or {}).items())
+    private = repr((request.auth_username, request.auth_password, headers,
+                    request.body))
+    return (request.method, request.url, hashlib.sha1(private).hexdigest())
+
+
+def clear_cache():
+    """Forgets all cached responses."""
+    _CACHE.clear()
+
+
+@gen.coroutine
+def fetch(client, request, cache=False):
+    """Executes `request` with `client`, honoring the per-host limit.
+
+    If `cache` is True, the response is re-used for any identical request
+    (see request_key()) made in the next CACHE_TTL seconds, including any
+    made while this one is still in flight. Failed requests are never cached.
+    Only use this for requests that are free of side effects, like the
+    credential checks that many actors make in dry mode.
+
+    Args:
+        client: An AsyncHTTPClient object
+        request: A tornado.httpclient.HTTPRequest object
+        cache: Whether or not the response may be cached
+
+    Returns:
+        The tornado.httpclient.HTTPResponse object
+    """
+    if not cache:
+        response = yield _fetch(client, request)
+        raise gen.Return(response)
+
+    key = request_key(request)
+    expiration, future = _CACHE.get(key, (0, None))
+    if expiration < time.time():
+        future = _fetch(client, request)
+        _CACHE[key] = (time.time() + CACHE_TTL, future)
+    else:
+        log.debug('Re-using response for %s %s',
+                  request.method, request.url)
+        CACHE_HITS.inc(host=urlparse.urlparse(request.url).netloc)
+
+    try:
+        response = yield future
+    except Exception:
+        if _CACHE.get(key, (0, None))[1] is future:
+            del _CACHE[key]
+        raise
+
+    raise gen.Return(response)
+
+
+@gen.coroutine
+def _fetch(client, request):
+    """Executes `request` with `client`, honoring the per-host limit."""
+    if not MAX_PER_HOST:
+        response = yield _timed_fetch(client, request)
+        raise gen.Return(response)
+
+    semaphore = _get_host_semaphore(request.url)
+    with (yield semaphore.acquire()):
+        response = yield _timed_fetch(client, request)
+
+    raise gen.Return(response)
+
+
+@gen.coroutine
+def _timed_fetch(client, request):
+    """Executes `request` with `client`, recording it in REQUESTS."""
+    start = time.time()
+    code = 599
+    try:
+        response = yield client.fetch(request)
+        code = getattr(response, 'code', 200)
+    except httpclient.HTTPError as e:
+        code = e.code
+        raise
+    finally:
+        REQUESTS.observe(time.time() - start,
+                         host=urlparse.urlparse(request.url).netloc,
+                         method=request.method, code=code)
+
+    raise gen.Return(response)
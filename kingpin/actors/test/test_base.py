@@ -17,6 +17,7 @@ from kingpin import utils
 from kingpin.actors import base
 from kingpin.actors import exceptions
 from kingpin.actors.test.helper import mock_tornado
+from kingpin.actors.test.helper import tornado_value
 from kingpin.constants import REQUIRED
 
 
@@ -35,6 +36,36 @@ class FakeHTTPClientClass(object):
         raise gen.Return(self.response_value)
 
 
+class TestLogAdapter(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestLogAdapter, self).setUp()
+        self.logger = mock.MagicMock(name='logger')
+        self.log = base.LogAdapter(
+            self.logger, {'dry': '', 'desc': 'Unit 100%'})
+
+    def test_disabled_level_is_dropped(self):
+        self.logger.isEnabledFor.return_value = False
+        arg = mock.MagicMock(name='arg')
+        with mock.patch.object(self.log, 'process') as process:
+            self.log.debug('Payload: %s', arg)
+        self.assertFalse(process.called)
+        self.assertFalse(self.logger.log.called)
+        self.assertFalse(arg.__str__.called)
+
+    def test_formatting_is_deferred(self):
+        self.logger.isEnabledFor.return_value = True
+        self.log.info('Payload: %s', 'x')
+        self.logger.log.assert_called_once_with(
+            logging.INFO, '[%s%s] Payload: %s', '', 'Unit 100%', 'x')
+
+    def test_message_without_args(self):
+        self.logger.isEnabledFor.return_value = True
+        self.log.exception('50% done')
+        self.logger.log.assert_called_once_with(
+            logging.ERROR, '[Unit 100%] 50% done', exc_info=1)
+
+
 class TestBaseActor(testing.AsyncTestCase):
 
     @gen.coroutine
@@ -72,11 +103,38 @@ class TestBaseActor(testing.AsyncTestCase):
         # because some computers and compilers are slow.
         msg = 'kingpin.actors.base.BaseActor.execute() execution time'
         msg_is_in_calls = False
-        for call in self.actor.log.debug.mock_calls:
-            if msg in str(call):
+        for name, args, kwargs in self.actor.log.debug.mock_calls:
+            if msg in args[0] % args[1:]:
                 msg_is_in_calls = True
         self.assertEquals(msg_is_in_calls, True)
 
+    @testing.gen_test
+    def test_probe(self):
+        # By default, every actor needs to execute
+        needed = yield self.actor.probe()
+        self.assertTrue(needed)
+        self.assertEquals(self.actor._needs_execution, True)
+
+        # A probe that breaks is treated the same way
+        self.actor.needs_execution = mock.MagicMock(
+            side_effect=exceptions.ActorException('broken'))
+        needed = yield self.actor.probe()
+        self.assertTrue(needed)
+
+        # Satisfied actors are skipped
+        self.actor.needs_execution = mock_tornado(False)
+        self.actor._execute = mock.MagicMock(name='_execute')
+        needed = yield self.actor.probe()
+        self.assertFalse(needed)
+        yield self.actor.execute()
+        self.assertFalse(self.actor._execute.called)
+
+        # Actors that won't run because of their condition aren't probed
+        self.actor._condition = False
+        self.actor.needs_execution = mock.MagicMock(name='needs_execution')
+        yield self.actor.probe()
+        self.assertFalse(self.actor.needs_execution.called)
+
     @testing.gen_test
     def test_timeout(self):
         # Create a quick mock.. so we can track whether or not API calls were
@@ -96,7 +154,7 @@ class TestBaseActor(testing.AsyncTestCase):
         # Set our timeout to 2s, test should work
         self.actor._timeout = 1
         yield self.actor.timeout(_execute)
-        tracker.assert_has_calls(mock.call.call_me())
+        tracker.assert_has_calls([mock.call.call_me()])
 
         # Now set our timeout to 500ms. Exception should be raised, and the
         # tracker should NOT be called.
@@ -349,6 +407,45 @@ class TestHTTPBaseActor(testing.AsyncTestCase):
             with self.assertRaises(exceptions.UnparseableResponseFromEndpoint):
                 yield self.actor._fetch('/')
 
+    @testing.gen_test
+    def test_fetch_with_decoder(self):
+        http_response = httpclient.HTTPResponse(
+            httpclient.HTTPRequest('/'), code=200,
+            buffer=StringIO.StringIO('Not JSON'))
+
+        with mock.patch.object(self.actor, '_get_http_client') as m:
+            m.return_value = FakeHTTPClientClass()
+            m.return_value.response_value = http_response
+
+            response = yield self.actor._fetch('/', decoder=str)
+            self.assertEquals('Not JSON', response)
+
+    @testing.gen_test
+    def test_fetch_with_streaming_callback(self):
+        http_response = httpclient.HTTPResponse(
+            httpclient.HTTPRequest('/'), code=200,
+            buffer=StringIO.StringIO(''))
+        callback = mock.MagicMock()
+
+        with mock.patch.object(self.actor, '_get_http_client') as m:
+            m.return_value = FakeHTTPClientClass()
+            m.return_value.response_value = http_response
+
+            response = yield self.actor._fetch(
+                '/', streaming_callback=callback)
+            self.assertEquals(None, response)
+            self.assertEquals(m.return_value.request.streaming_callback,
+                              callback)
+
+    @testing.gen_test
+    def test_fetch_with_cache(self):
+        with mock.patch.object(base.transport, 'fetch') as fetch:
+            fetch.return_value = tornado_value(httpclient.HTTPResponse(
+                httpclient.HTTPRequest('/'), code=200,
+                buffer=StringIO.StringIO('{}')))
+            yield self.actor._fetch('/', cache=True)
+            self.assertTrue(fetch.call_args[1]['cache'])
+
     @testing.gen_test
     def test_fetch_with_auth(self):
         response_dict = {'foo': 'asdf'}
@@ -44,6 +44,42 @@ class TestActorRaises(base.BaseActor):
         raise exc
 
 
+class TestActorProbed(base.BaseActor):
+
+    """Fake Actor for Tests, that is satisfied once its key is in STATE"""
+
+    all_options = {
+        'key': (str, True, 'Key that this actor puts in STATE'),
+        'remove': (str, None, 'Key that this actor removes from STATE'),
+    }
+
+    STATE = set()
+    executed = []
+
+    @gen.coroutine
+    def needs_execution(self):
+        raise gen.Return(self.option('key') not in self.STATE)
+
+    @gen.coroutine
+    def _execute(self):
+        self.executed.append(self.option('key'))
+        self.STATE.add(self.option('key'))
+        self.STATE.discard(self.option('remove'))
+
+
+class TestActorSlow(base.BaseActor):
+
+    """Fake Actor for Tests, that takes a while even in the dry run"""
+
+    all_options = {
+        'sleep': (float, 0.1, 'Seconds to take'),
+    }
+
+    @gen.coroutine
+    def _execute(self):
+        yield utils.tornado_sleep(self.option('sleep'))
+
+
 class TestGroupActorBaseClass(testing.AsyncTestCase):
 
     def setUp(self, *args, **kwargs):
@@ -226,6 +262,129 @@ class TestSyncGroupActor(TestGroupActorBaseClass):
         with self.assertRaises(exceptions.RecoverableActorFailure):
             yield actor._run_actions()
 
+    @testing.gen_test
+    def test_skip_satisfied(self):
+        TestActorProbed.STATE = set(['a', 'c', 'd'])
+        TestActorProbed.executed = []
+
+        def probed(key, remove=None):
+            return {'desc': key,
+                    'actor': 'kingpin.actors.test.test_group.TestActorProbed',
+                    'options': {'key': key, 'remove': remove}}
+
+        # 'b' runs, and takes away what made 'c' satisfied. 'd' stays
+        # satisfied, even though it is probed again after 'b' ran.
+        actor = group.Sync('Unit Test Action', {'acts': [
+            probed('a'), probed('b', remove='c'), probed('c'), probed('d')]})
+
+        with mock.patch.object(group, 'SKIP_SATISFIED', True):
+            yield actor.execute()
+        self.assertEquals(TestActorProbed.executed, ['b', 'c'])
+
+        # Now everything is in place, so the whole group is skipped
+        actor = group.Sync('Unit Test Action', {'acts': [
+            probed('a'), probed('b', remove='c'), probed('c'), probed('d')]})
+        with mock.patch.object(group, 'SKIP_SATISFIED', True):
+            yield actor.execute()
+        self.assertEquals(actor._needs_execution, False)
+        self.assertEquals(TestActorProbed.executed, ['b', 'c'])
+
+    @testing.gen_test
+    def test_skip_satisfied_disabled(self):
+        TestActorProbed.STATE = set(['a'])
+        TestActorProbed.executed = []
+        actor = group.Sync('Unit Test Action', {'acts': [{
+            'desc': 'a',
+            'actor': 'kingpin.actors.test.test_group.TestActorProbed',
+            'options': {'key': 'a'}}]})
+        yield actor.execute()
+        self.assertEquals(TestActorProbed.executed, ['a'])
+
+    def test_stage_limit(self):
+        for value, limit in ((False, None), (True, 1), (3, 3), ('true', 1),
+                             ('2', 2), ('0', None)):
+            actor = group.Sync('Unit Test Action', {
+                'acts': [dict(self.actor_returns)], 'pipeline': value})
+            self.assertEquals(actor._stage_limit, limit)
+
+        with self.assertRaises(exceptions.InvalidOptions):
+            group.Sync('Unit Test Action', {
+                'acts': [dict(self.actor_returns)], 'pipeline': 'fast'})
+
+    @testing.gen_test
+    def test_run_actions_pipelined(self):
+        sleeper = {'actor': 'misc.Sleep',
+                   'desc': 'Sleep {N}',
+                   'options': {'sleep': 0.1}}
+        options = {'contexts': [{'N': 1}, {'N': 2}, {'N': 3}],
+                   'acts': [sleeper, sleeper],
+                   'pipeline': True}
+
+        # Three contexts through two stages take four steps, not six
+        start = time.time()
+        yield group.Sync('Unit Test Action', options).execute()
+        self.assertTrue(0.4 < time.time() - start < 0.5)
+
+        # And all at once with a wide enough pipeline
+        options['pipeline'] = 3
+        start = time.time()
+        yield group.Sync('Unit Test Action', options).execute()
+        self.assertTrue(0.2 < time.time() - start < 0.3)
+
+    @testing.gen_test
+    def test_run_actions_pipelined_failure(self):
+        raises = dict(self.actor_raises_recoverable_exception,
+                      condition='{FAIL}')
+        self.actor_returns['options']['value'] = 'ran'
+        actor = group.Sync('Unit Test Action', {
+            'contexts': [{'FAIL': True}, {'FAIL': False}],
+            'acts': [raises, dict(self.actor_returns)],
+            'pipeline': True})
+
+        with self.assertRaises(exceptions.RecoverableActorFailure):
+            yield actor._run_actions()
+
+        # The second context never starts its second act
+        self.assertEquals(TestActor.last_value, None)
+
+    @testing.gen_test
+    def test_run_actions_parallel_dry(self):
+        slow = {'desc': 'slow',
+                'actor': 'kingpin.actors.test.test_group.TestActorSlow',
+                'options': {}}
+        options = {'acts': [
+            slow, slow, dict(self.actor_raises_recoverable_exception),
+            {'desc': 'nested', 'actor': 'group.Sync',
+             'options': {'acts': [
+                 slow, dict(self.actor_raises_unrecoverable_exception)]}}]}
+
+        # The four slow acts take two rounds with two slots, and all of the
+        # errors are still reported
+        with mock.patch.object(group, 'PARALLEL_DRY', 2):
+            actor = group.Sync('Unit Test Action', options, dry=True)
+            start = time.time()
+            with self.assertRaises(exceptions.UnrecoverableActorFailure):
+                yield actor.execute()
+            self.assertTrue(0.2 < time.time() - start < 0.3)
+
+        # One at a time by default
+        actor = group.Sync('Unit Test Action', options, dry=True)
+        start = time.time()
+        with self.assertRaises(exceptions.UnrecoverableActorFailure):
+            yield actor.execute()
+        self.assertTrue(0.3 < time.time() - start < 0.4)
+
+    @testing.gen_test
+    def test_run_actions_parallel_dry_only_in_dry(self):
+        slow = {'desc': 'slow',
+                'actor': 'kingpin.actors.test.test_group.TestActorSlow',
+                'options': {}}
+        actor = group.Sync('Unit Test Action', {'acts': [slow, slow]})
+        with mock.patch.object(group, 'PARALLEL_DRY', 2):
+            start = time.time()
+            yield actor.execute()
+            self.assertTrue(0.2 < time.time() - start < 0.3)
+
 
 class TestAsyncGroupActor(TestGroupActorBaseClass):
 
@@ -351,3 +510,147 @@ class TestAsyncGroupActor(TestGroupActorBaseClass):
 
         with self.assertRaises(exceptions.UnrecoverableActorFailure):
             yield actor._run_actions()
+
+    def test_fail_threshold(self):
+        acts = {'acts': [dict(self.actor_returns)] * 10}
+        for value, threshold in ((False, None), (True, 1), (3, 3), (0, None),
+                                 ('true', 1), ('False', None), ('4', 4),
+                                 ('25%', 3), ('0%', 1)):
+            options = dict(acts, fail_fast=value)
+            actor = group.Async('Unit Test Action', options)
+            self.assertEquals(actor._fail_threshold, threshold)
+
+        for value in ('often', '-1', 'x%'):
+            with self.assertRaises(exceptions.InvalidOptions):
+                group.Async('Unit Test Action', dict(acts, fail_fast=value))
+
+    @testing.gen_test
+    def test_run_actions_fail_fast(self):
+        sleeper = {'actor': 'misc.Sleep',
+                   'desc': 'Sleep',
+                   'options': {'sleep': 5}}
+        actor = group.Async(
+            'Unit Test Action',
+            {'fail_fast': True,
+             'acts': [
+                 sleeper,
+                 dict(self.actor_raises_unrecoverable_exception),
+                 dict(self.actor_returns)]})
+
+        # The group does not wait for the sleeper
+        start = time.time()
+        with self.assertRaises(exceptions.UnrecoverableActorFailure):
+            yield actor.execute()
+        self.assertTrue(time.time() - start < 1)
+
+    @testing.gen_test
+    def test_run_actions_fail_fast_ignored_in_dry(self):
+        options = {'fail_fast': 1,
+                   'acts': [
+                       dict(self.actor_raises_recoverable_exception),
+                       dict(self.actor_raises_unrecoverable_exception)]}
+
+        # Gives up after the first (recoverable) failure
+        actor = group.Async('Unit Test Action', options)
+        with self.assertRaises(exceptions.RecoverableActorFailure) as e:
+            yield actor._run_actions()
+        self.assertNotIsInstance(
+            e.exception, exceptions.UnrecoverableActorFailure)
+
+        # But the dry run reports the worst of all of the failures
+        actor = group.Async('Unit Test Action', options, dry=True)
+        with self.assertRaises(exceptions.UnrecoverableActorFailure):
+            yield actor._run_actions()
+
+
+class TestGraphGroupActor(TestGroupActorBaseClass):
+
+    def _act(self, act_id=None, depends_on=None, sleep=0, config=None):
+        act = dict(config or {'desc': 'Sleep %s' % act_id,
+                              'actor': 'misc.Sleep',
+                              'options': {'sleep': sleep}})
+        if act_id:
+            act['id'] = act_id
+        if depends_on:
+            act['depends_on'] = depends_on
+        return act
+
+    def _recorded(self, action, finished):
+        """Wraps action.execute(), to append its id to `finished`."""
+        execute = action.execute
+
+        @gen.coroutine
+        def wrapper():
+            yield execute()
+            finished.append(action._act_id)
+        return wrapper
+
+    def test_order(self):
+        actor = group.Graph('Unit Test Action', {'acts': [
+            self._act('c', depends_on=['a', 'b']),
+            self._act('a'),
+            self._act(depends_on='c'),
+            self._act('b', depends_on='a')]})
+        c, a, d, b = actor._actions
+        self.assertEquals(actor._order, [a, b, c, d])
+        self.assertEquals(actor._depends_on[c], [a, b])
+
+    def test_invalid_graphs(self):
+        for acts in ([self._act('a'), self._act('a')],
+                     [self._act('a', depends_on='b')],
+                     [self._act('a', depends_on='b'),
+                      self._act('b', depends_on='a')]):
+            with self.assertRaises(exceptions.InvalidOptions):
+                group.Graph('Unit Test Action', {'acts': acts})
+
+    def test_contexts(self):
+        actor = group.Graph('Unit Test Action', {
+            'contexts': [{'X': 1}, {'X': 2}],
+            'acts': [self._act('a'), self._act('b', depends_on='a')]})
+        a1, b1, a2, b2 = actor._actions
+        self.assertEquals(actor._depends_on[b1], [a1])
+        self.assertEquals(actor._depends_on[b2], [a2])
+
+    @testing.gen_test
+    def test_execute_without_barriers(self):
+        # "b" only needs "a", so it does not wait for the slow "c"
+        actor = group.Graph('Unit Test Action', {'acts': [
+            self._act('a', sleep=0.1),
+            self._act('c', sleep=0.3),
+            self._act('b', depends_on='a', sleep=0.1),
+            self._act('d', depends_on=['b', 'c'], sleep=0.1)]})
+
+        finished = []
+        for action in actor._actions:
+            action.execute = self._recorded(action, finished)
+        yield actor.execute()
+
+        # In Sync(Async(a, c), b, d), "b" would only finish after "c"
+        self.assertEquals(finished, ['a', 'b', 'c', 'd'])
+
+    @testing.gen_test
+    def test_failure_skips_dependents(self):
+        self.actor_returns['options']['value'] = '123'
+        actor = group.Graph('Unit Test Action', {'acts': [
+            self._act('a', config=self.actor_raises_recoverable_exception),
+            self._act('b', depends_on='a', config=self.actor_returns),
+            self._act(depends_on='b', config=self.actor_returns),
+            self._act('c')]})
+
+        with self.assertRaises(exceptions.RecoverableActorFailure) as e:
+            yield actor._run_actions()
+        self.assertIn('2 skipped', str(e.exception))
+        self.assertEquals(TestActor.last_value, None)
+
+    @testing.gen_test
+    def test_failure_in_dry_runs_dependents(self):
+        self.actor_returns['options']['value'] = '123'
+        actor = group.Graph('Unit Test Action', {'acts': [
+            self._act('a', config=self.actor_raises_recoverable_exception),
+            self._act('b', config=self.actor_raises_unrecoverable_exception),
+            self._act(depends_on=['a', 'b'], config=self.actor_returns)]},
+            dry=True)
+
+        with self.assertRaises(exceptions.UnrecoverableActorFailure):
+            yield actor._run_actions()
+        self.assertEquals(TestActor.last_value, '123')
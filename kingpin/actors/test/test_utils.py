@@ -3,6 +3,7 @@ import logging
 from tornado import gen
 from tornado import testing
 
+from kingpin.actors import base
 from kingpin.actors import exceptions
 from kingpin.actors import utils
 from kingpin.actors import misc
@@ -35,6 +36,37 @@ class TestUtils(testing.AsyncTestCase):
         self.assertEquals(True, ret.options['return_value'])
         self.assertEquals(FakeActor, type(ret))
 
+    @testing.gen_test
+    def test_get_actor_disabled(self):
+        group = {
+            'desc': 'disabled {ENV}',
+            'actor': 'group.Sync',
+            'condition': 'false',
+            'options': {'acts': [{
+                'desc': 'never built',
+                'actor': 'kingpin.actors.test.test_utils.FakeActor',
+                'options': {'return_value': '{UNKNOWN}'}}]},
+            'init_context': {'ENV': 'prod'}}
+        ret = utils.get_actor(group, dry=False)
+        self.assertEquals(base.Disabled, type(ret))
+        self.assertEquals(ret._desc, 'disabled prod')
+        self.assertEquals(ret.option('actor'), 'group.Sync')
+        self.assertEquals((yield ret.execute()), None)
+
+        # Misspelled actors are still caught
+        group['actor'] = 'bogus.actor'
+        with self.assertRaises(exceptions.InvalidActor):
+            utils.get_actor(group, dry=False)
+
+    def test_get_actor_depends_on(self):
+        act = {
+            'desc': 'not in a graph',
+            'actor': 'kingpin.actors.test.test_utils.FakeActor',
+            'depends_on': 'other',
+            'options': {'return_value': True}}
+        with self.assertRaises(exceptions.InvalidOptions):
+            utils.get_actor(act, dry=True)
+
     def test_get_actor_class(self):
         actor_string = 'misc.Sleep'
         ret = utils.get_actor_class(actor_string)
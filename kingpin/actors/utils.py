@@ -22,6 +22,7 @@ Misc methods for dealing with Actors.
 import logging
 
 from kingpin import utils
+from kingpin.actors import base
 from kingpin.actors import exceptions
 
 log = logging.getLogger(__name__)
@@ -49,7 +50,13 @@ def get_actor(config, dry):
         warn_on_failure: Boolean
 
     Returns:
-        <actor object>
+        <actor object>, or a `kingpin.actors.base.Disabled` placeholder if
+        the condition of the actor is false.
+
+    Raises:
+        exceptions.InvalidActor: if the actor can't be found
+        exceptions.InvalidOptions: if the act uses `depends_on` outside of a
+                                   group.Graph actor
     """
     # Copy the supplied dict before we modify it below
     config = dict(config)
@@ -57,9 +64,25 @@ def get_actor(config, dry):
     # Get the name of the actor, and pull it out of the config because its
     # not a valid kwarg for an Actor object.
     actor_string = config.pop('actor')
-
-    log.debug('Building Actor "%s" with args: %s' % (actor_string, config))
     ActorClass = get_actor_class(actor_string)
+
+    # group.Graph takes the dependencies out of its acts before building
+    # them. No actor takes them as an argument.
+    if 'depends_on' in config:
+        raise exceptions.InvalidOptions(
+            '"%s" (%s) has depends_on, but only the acts of a group.Graph '
+            'actor can depend on each other.' %
+            (config.get('desc'), actor_string))
+
+    # An actor that will never run isn't worth building (along with all of
+    # its children, if it is a group).
+    if not base.check_condition(config.get('condition', True)):
+        log.debug('Not building disabled Actor "%s": %s',
+                  actor_string, config.get('desc'))
+        config['options'] = {'actor': actor_string}
+        return base.Disabled(dry=dry, **config)
+
+    log.debug('Building Actor "%s" with args: %s', actor_string, config)
     return ActorClass(dry=dry, **config)
 
 
@@ -80,11 +103,11 @@ def get_actor_class(actor):
         full_actor = 'kingpin.actors.%s' % actor
         ref = utils.str_to_class(full_actor)
     except expected_exceptions as e:
-        log.warning('Could not import %s: %s' % (full_actor, e))
+        log.warning('Could not import %s: %s', full_actor, e)
         try:
             ref = utils.str_to_class(actor)
         except expected_exceptions:
-            log.critical('Could not import %s: %s' % (actor, e))
+            log.critical('Could not import %s: %s', actor, e)
             msg = 'Unable to import "%s" as a valid Actor.' % actor
             raise exceptions.InvalidActor(msg)
 
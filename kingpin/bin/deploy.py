@@ -14,6 +14,7 @@
 # Copyright 2014 Nextdoor.com, Inc
 """CLI Script Runner for Kingpin."""
 
+import json
 import logging
 import optparse
 import os
@@ -24,7 +25,17 @@ from tornado import ioloop
 
 from kingpin import utils
 from kingpin.actors import exceptions as actor_exceptions
+from kingpin.actors import group
 from kingpin.actors.misc import Macro
+from kingpin.actors.support import budget
+from kingpin.actors.support import cancel
+from kingpin.actors.support import checkpoint
+from kingpin.actors.support import critical_path
+from kingpin.actors.support import fake
+from kingpin.actors.support import journal
+from kingpin.actors.support import metrics
+from kingpin.actors.support import trace
+from kingpin.actors.support import transport
 from kingpin.version import __version__
 
 
@@ -56,6 +67,89 @@ parser.add_option('', '--debug', dest='level_debug', default=False,
                   action='store_true', help='Equivalent to --level=DEBUG')
 parser.add_option('-c', '--color', dest='color', default=False,
                   action='store_true', help='Colorize the log output')
+parser.add_option('--log-queue', dest='log_queue', default=False,
+                  action='store_true',
+                  help='Write the log output from a background thread')
+parser.add_option('--log-json', dest='log_json',
+                  help='Also write the log output to this file as JSON lines')
+
+# HTTP Transport Configuration
+parser.add_option('--http-backend', dest='http_backend',
+                  default=transport.BACKEND,
+                  help='HTTP client to use (AUTO|CURL|SIMPLE)')
+parser.add_option('--http-max-clients', dest='http_max_clients', type='int',
+                  default=transport.MAX_CLIENTS,
+                  help='Maximum concurrent HTTP requests')
+parser.add_option('--http-max-per-host', dest='http_max_per_host',
+                  type='int', default=transport.MAX_PER_HOST,
+                  help='Maximum concurrent HTTP requests per host '
+                       '(0=no limit)')
+parser.add_option('--http-connect-timeout', dest='http_connect_timeout',
+                  type='float', default=transport.CONNECT_TIMEOUT,
+                  help='HTTP connection timeout in seconds')
+parser.add_option('--http-request-timeout', dest='http_request_timeout',
+                  type='float', default=transport.REQUEST_TIMEOUT,
+                  help='HTTP request timeout in seconds')
+
+# Tracing
+parser.add_option('--trace', dest='trace',
+                  help='Write a trace of every actor execution to this file')
+parser.add_option('--trace-format', dest='trace_format', default='chrome',
+                  help='Format of the --trace file (CHROME|OTLP)')
+parser.add_option('--critical-path', dest='critical_path', default=False,
+                  action='store_true',
+                  help='Report the chain of actors that set the total runtime')
+parser.add_option('--critical-path-top', dest='critical_path_top',
+                  type='int', default=10,
+                  help='Number of slowest actors in the --critical-path '
+                       'report')
+
+# Idempotency probes
+parser.add_option('--skip-satisfied', dest='skip_satisfied', default=False,
+                  action='store_true',
+                  help='Probe every actor first, and skip the ones that have '
+                       'nothing to change')
+
+# Concurrency budgets
+parser.add_option('--budget', dest='budget', action='append', default=[],
+                  help='Maximum concurrent calls to a provider (AWS, '
+                       'RIGHTSCALE, HTTP) or provider/endpoint, as NAME=LIMIT '
+                       '(repeatable)')
+parser.add_option('--budget-file', dest='budget_file',
+                  help='JSON file with an object of NAME: LIMIT budgets')
+
+# Dry run
+parser.add_option('--parallel-dry', dest='parallel_dry', type='int',
+                  default=group.PARALLEL_DRY,
+                  help='Dry run the acts of group.Sync actors in parallel, '
+                       'this many at a time (0=in order)')
+
+# Checkpoints
+parser.add_option('--checkpoint', dest='checkpoint',
+                  help='Record every actor that completes in this file')
+parser.add_option('--resume', dest='resume', default=False,
+                  action='store_true',
+                  help='Skip the actors that the --checkpoint file says have '
+                       'already completed')
+
+# Run journal
+parser.add_option('--journal', dest='journal',
+                  help='Append a JSON-lines event for every actor state '
+                       'change to this file')
+
+# Metrics
+parser.add_option('--metrics-file', dest='metrics_file',
+                  help='Write Prometheus metrics to this file when done')
+parser.add_option('--metrics-port', dest='metrics_port', type='int',
+                  help='Serve Prometheus metrics on localhost:PORT/metrics '
+                       'while running')
+
+# Fake backends
+parser.add_option('--fake-backends', dest='fake_backends',
+                  help='Comma separated list of remote APIs to replace with '
+                       'in-process fakes (AWS,RIGHTSCALE)')
+parser.add_option('--fake-backends-state', dest='fake_backends_state',
+                  help='JSON file with the initial state of the fake backends')
 
 (options, args) = parser.parse_args()
 
@@ -112,10 +206,69 @@ def main():
 
 
 def begin():
+    # Keep the timers of the IOLoop (and with them, the actor timeouts) on
+    # the same monotonic clock as the deadlines. This has to happen before
+    # anything creates the IOLoop.
+    ioloop.IOLoop.configure(None, time_func=cancel.monotonic)
+
     # Set up logging before we do anything else
     if options.level_debug:
         options.level = 'DEBUG'
-    utils.setup_root_logger(level=options.level, color=options.color)
+    utils.setup_root_logger(level=options.level, color=options.color,
+                            queued=options.log_queue,
+                            json_file=options.log_json)
+
+    # Configure the shared HTTP client before any actor creates one
+    try:
+        transport.configure(backend=options.http_backend.lower(),
+                            max_clients=options.http_max_clients,
+                            max_per_host=options.http_max_per_host,
+                            connect_timeout=options.http_connect_timeout,
+                            request_timeout=options.http_request_timeout)
+    except ValueError as e:
+        kingpin_fail(e)
+
+    if options.budget_file or options.budget:
+        try:
+            limits = {}
+            if options.budget_file:
+                with open(options.budget_file) as f:
+                    limits.update(json.load(f))
+            limits.update(budget.parse(spec) for spec in options.budget)
+            budget.configure(limits)
+        except (IOError, ValueError) as e:
+            kingpin_fail(e)
+
+    if options.trace and options.trace_format.lower() not in trace.FORMATS:
+        kingpin_fail('Unknown trace format: %s' % options.trace_format)
+    if options.trace or options.critical_path:
+        tracer = trace.enable()
+
+    if options.skip_satisfied:
+        group.SKIP_SATISFIED = True
+    group.PARALLEL_DRY = options.parallel_dry
+
+    if options.resume and not options.checkpoint:
+        kingpin_fail('--resume requires a --checkpoint file')
+    if options.checkpoint:
+        checkpoint.enable(options.checkpoint, resume=options.resume)
+
+    if options.journal:
+        journal.enable(options.journal)
+
+    if options.metrics_port:
+        metrics.REGISTRY.serve(options.metrics_port)
+
+    if options.fake_backends:
+        state = {}
+        if options.fake_backends_state:
+            with open(options.fake_backends_state) as f:
+                state = json.load(f)
+        names = [n.strip().lower() for n in options.fake_backends.split(',')]
+        try:
+            fake.install(names, state=state)
+        except ValueError as e:
+            kingpin_fail(e)
 
     try:
         ioloop.IOLoop.instance().run_sync(main)
@@ -133,6 +286,18 @@ def begin():
             if not skip_next:
                 print(l)
             skip_next = False
+    finally:
+        if options.trace:
+            tracer.write(options.trace, options.trace_format.lower())
+        if options.critical_path:
+            report = critical_path.analyze(tracer.spans,
+                                           top=options.critical_path_top)
+            for line in critical_path.format_report(report):
+                log.info(line)
+        if options.metrics_file:
+            metrics.REGISTRY.write(options.metrics_file)
+        journal.disable()
+        checkpoint.disable()
 
 if __name__ == '__main__':
     begin()
@@ -58,6 +58,17 @@ SCHEMA_1_0 = {
 
         # Optional conditional to indicate to skip this actor.
         'condition': {'type': ['boolean', 'string'], 'default': True},
+
+        # Names the actor, for the {@<id>.<name>} runtime context tokens
+        # and for the depends_on lists of a group.Graph actor.
+        'id': {'type': 'string'},
+
+        # Only used by the acts of a group.Graph actor, to list the acts they
+        # have to wait for.
+        'depends_on': {
+            'type': ['string', 'array'],
+            'items': {'type': 'string'},
+        },
     }
 }
 
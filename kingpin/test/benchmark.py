@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright 2014 Nextdoor.com, Inc
+"""Offline benchmarks for the Kingpin engine.
+
+Times the code that every deployment runs regardless of which actors it uses:
+token replacement, JSON parsing, schema validation, actor instantiation and
+the construction and (dry) execution of large group trees.
+
+Nothing here talks to the network, so results are comparable between runs on
+the same machine. Results are written as a single JSON document:
+
+.. code-block:: bash
+
+    $ python -m kingpin.test.benchmark --output=benchmark.json
+    $ python -m kingpin.test.benchmark --sizes=1000,50000 --filter=tree
+
+Each result has the number of ``runs``, the ``min``, ``mean`` and ``max``
+wall time of a run in seconds, and the growth in peak RSS (``rss_kb``) seen
+while running it. Peak RSS only ever grows, so run the memory-hungry tree
+benchmarks on their own (with ``--filter``) to compare their memory use.
+"""
+
+import StringIO
+import gc
+import json
+import logging
+import optparse
+import platform
+import resource
+import sys
+import time
+
+from tornado import ioloop
+
+from kingpin import schema
+from kingpin import utils
+from kingpin.actors import base
+from kingpin.actors import utils as actor_utils
+from kingpin.version import __version__
+
+__author__ = 'Matt Wise <matt@nextdoor.com>'
+
+DEFAULT_SIZES = (1000, 10000, 50000)
+
+# Number of actors in each group.Sync at the bottom of the synthetic trees
+LEAVES_PER_GROUP = 100
+
+BENCHMARKS = []
+
+
+def benchmark(runs=5):
+    """Registers a benchmark function.
+
+    The decorated function is called once to set up, and returns the
+    function that is actually timed.
+
+    Args:
+        runs: Number of times to run the timed function.
+    """
+    def decorator(f):
+        BENCHMARKS.append((f.__name__, f, runs))
+        return f
+    return decorator
+
+
+def sleep_actor(i, sleep=0):
+    return {'actor': 'misc.Sleep',
+            'desc': 'Sleep %s' % i,
+            'options': {'sleep': sleep}}
+
+
+def synthetic_tree(size, group='group.Async'):
+    """Returns a config with `size` misc.Sleep actors.
+
+    The actors are split into group.Sync actors of LEAVES_PER_GROUP each,
+    which are all run by a single `group` actor.
+    """
+    groups = []
+    for start in range(0, size, LEAVES_PER_GROUP):
+        end = min(start + LEAVES_PER_GROUP, size)
+        groups.append({
+            'actor': 'group.Sync',
+            'desc': 'Actors %s-%s' % (start, end),
+            'options': {'acts': [sleep_actor(i, 0)
+                                 for i in range(start, end)]}})
+    return {'actor': group, 'desc': '%s actors' % size,
+            'options': {'acts': groups}}
+
+
+@benchmark(runs=20)
+def populate_with_tokens():
+    tokens = dict(('TOKEN_%s' % i, 'value %s' % i) for i in range(100))
+    string = json.dumps(synthetic_tree(100)).replace(
+        '"sleep": 0', '"sleep": "%TOKEN_50%"')
+    return lambda: utils.populate_with_tokens(string, tokens)
+
+
+@benchmark()
+def convert_json_to_dict():
+    raw = json.dumps(synthetic_tree(1000)).replace(
+        '"sleep": 0', '"sleep": "%SLEEP%"')
+    tokens = {'SLEEP': '0'}
+    return lambda: utils.convert_json_to_dict(StringIO.StringIO(raw), tokens)
+
+
+@benchmark()
+def schema_validate():
+    config = synthetic_tree(1000)
+    return lambda: schema.validate(config)
+
+
+@benchmark(runs=20)
+def get_actor():
+    configs = [sleep_actor(i, 0) for i in range(100)]
+
+    def run():
+        for config in configs:
+            actor_utils.get_actor(config, dry=True)
+    return run
+
+
+@benchmark(runs=20)
+def fill_in_contexts():
+    actor = actor_utils.get_actor(sleep_actor(0), dry=True)
+    options = {'sleep': '{SLEEP}',
+               'extra': dict(('key%s' % i, '{CTX_%s}' % i)
+                             for i in range(100))}
+    context = dict(('CTX_%s' % i, i) for i in range(100))
+    context['SLEEP'] = 0
+
+    def run():
+        actor._desc = 'Sleep {SLEEP}'
+        actor._options = dict(options)
+        base.BaseActor._fill_in_contexts(actor, context=context)
+    return run
+
+
+@benchmark(runs=10)
+def disabled_debug_logging():
+    # What a large dry run pays for the debug messages it never prints, now
+    # that they are only formatted when they are emitted...
+    actor = actor_utils.get_actor(sleep_actor(0), dry=True)
+    options = dict(('key%s' % i, 'value %s' % i) for i in range(20))
+
+    def run():
+        for i in range(10000):
+            actor.log.debug('Building with options %s (%s)', options, i)
+    return run
+
+
+@benchmark(runs=10)
+def disabled_debug_logging_eager():
+    # ... and what it paid when they were formatted before the call, the way
+    # the messages used to be written. Compare with disabled_debug_logging.
+    actor = actor_utils.get_actor(sleep_actor(0), dry=True)
+    options = dict(('key%s' % i, 'value %s' % i) for i in range(20))
+
+    def run():
+        for i in range(10000):
+            actor.log.debug('Building with options %s (%s)' % (options, i))
+    return run
+
+
+def tree_benchmarks(sizes):
+    """Returns the tree build/execute benchmarks for each size."""
+    benchmarks = []
+    for size in sizes:
+        for group in ('group.Async', 'group.Sync'):
+            def build(size=size, group=group):
+                config = synthetic_tree(size, group)
+                return lambda: actor_utils.get_actor(config, dry=True)
+
+            def execute(size=size, group=group):
+                actor = actor_utils.get_actor(
+                    synthetic_tree(size, group), dry=True)
+                return lambda: ioloop.IOLoop.current().run_sync(actor.execute)
+
+            name = 'tree_%s_%s' % (group.split('.')[1].lower(), size)
+            runs = 1 if size > 10000 else 3
+            benchmarks.append(('%s_build' % name, build, runs))
+            benchmarks.append(('%s_execute' % name, execute, runs))
+    return benchmarks
+
+
+def _max_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # OSX reports bytes, Linux reports kilobytes
+    if sys.platform == 'darwin':
+        rss = rss / 1024
+    return rss
+
+
+def run(name, setup, runs):
+    """Runs a single benchmark and returns its results as a dict."""
+    rss_before = _max_rss_kb()
+    f = setup()
+    times = []
+    for i in range(runs):
+        gc.collect()
+        start = time.time()
+        f()
+        times.append(time.time() - start)
+    return {'name': name,
+            'runs': runs,
+            'min': min(times),
+            'mean': sum(times) / len(times),
+            'max': max(times),
+            'rss_kb': _max_rss_kb() - rss_before}
+
+
+def run_all(sizes=DEFAULT_SIZES, name_filter=None):
+    """Runs every registered benchmark and returns a results dict."""
+    results = []
+    for name, setup, runs in BENCHMARKS + tree_benchmarks(sizes):
+        if name_filter and name_filter not in name:
+            continue
+        results.append(run(name, setup, runs))
+
+    return {'kingpin': __version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'results': results}
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage='usage: %prog <options>',
+        description='Runs the Kingpin benchmarks and prints JSON results.')
+    parser.add_option('-o', '--output', dest='output',
+                      help='Write results to this file instead of stdout')
+    parser.add_option('-s', '--sizes', dest='sizes',
+                      default=','.join(str(s) for s in DEFAULT_SIZES),
+                      help='Comma separated actor counts for the tree '
+                           'benchmarks')
+    parser.add_option('-f', '--filter', dest='filter',
+                      help='Only run benchmarks with this in their name')
+    (options, args) = parser.parse_args(argv)
+
+    try:
+        sizes = [int(s) for s in options.sizes.split(',') if s]
+    except ValueError:
+        parser.error('--sizes must be a comma separated list of integers')
+
+    results = run_all(sizes, options.filter)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    # The actors log every step at INFO, which would dominate the timings.
+    logging.getLogger().addHandler(logging.NullHandler())
+    logging.getLogger().setLevel(logging.WARNING)
+    main()
@@ -0,0 +1,45 @@
+"""Tests for the kingpin.test.benchmark suite."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from kingpin.test import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_synthetic_tree(self):
+        tree = benchmark.synthetic_tree(250, 'group.Sync')
+        self.assertEquals(tree['actor'], 'group.Sync')
+        groups = tree['options']['acts']
+        self.assertEquals(len(groups), 3)
+        self.assertEquals(sum(len(g['options']['acts']) for g in groups), 250)
+
+    def test_run_all(self):
+        results = benchmark.run_all(sizes=[10], name_filter='_10_')
+        names = [r['name'] for r in results['results']]
+        self.assertEquals(names, ['tree_async_10_build',
+                                  'tree_async_10_execute',
+                                  'tree_sync_10_build',
+                                  'tree_sync_10_execute'])
+        self.assertEquals(results['results'][0]['runs'], 3)
+
+    def test_registered_benchmarks_run(self):
+        for name, setup, runs in benchmark.BENCHMARKS:
+            result = benchmark.run(name, setup, 1)
+            self.assertEquals(result['name'], name)
+            self.assertTrue(result['min'] <= result['mean'] <= result['max'])
+
+    def test_main(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            benchmark.main(['--sizes=10', '--filter=tree_sync_10_build',
+                            '--output=%s' % path])
+            with open(path) as f:
+                results = json.load(f)
+        finally:
+            os.unlink(path)
+        self.assertEquals(len(results['results']), 1)
@@ -29,3 +29,16 @@ class TestSchema(unittest.TestCase):
         json = {'this': 'is', 'invalid': 'ok'}
         with self.assertRaises(exceptions.InvalidJSON):
             schema.validate(json)
+
+    def test_validate_with_graph_json(self):
+        json = {'desc': 'graph', 'actor': 'group.Graph', 'options': {
+            'acts': [
+                {'id': 'a', 'desc': 'a', 'actor': 'misc.Sleep',
+                 'options': {'sleep': 0}},
+                {'depends_on': ['a'], 'desc': 'b', 'actor': 'misc.Sleep',
+                 'options': {'sleep': 0}}]}}
+        self.assertEquals(None, schema.validate(json))
+
+        json['options']['acts'][1]['depends_on'] = [1]
+        with self.assertRaises(exceptions.InvalidJSON):
+            schema.validate(json)
@@ -1,9 +1,13 @@
+import Queue
 import StringIO
+import json
 import logging
 import os
+import tempfile
 import time
 
 from tornado import gen
+from tornado import ioloop
 from tornado import testing
 from tornado.testing import unittest
 import mock
@@ -11,6 +15,7 @@ import rainbow_logging_handler
 import requests
 
 from kingpin import utils
+from kingpin.actors.support import cancel
 
 
 class TestUtils(unittest.TestCase):
@@ -154,6 +159,60 @@ class TestSetupRootLoggerUtils(unittest.TestCase):
                           logging.handlers.SysLogHandler)
         self.assertEquals(logger.handlers[0].facility, 'local0')
 
+    def test_setup_root_logger_queued_with_json(self):
+        log = logging.getLogger()
+        log.handlers = []
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            logger = utils.setup_root_logger(queued=True, json_file=path)
+            handler = logger.handlers[0]
+            self.assertEquals(len(logger.handlers), 1)
+            self.assertEquals(type(handler), utils.QueueHandler)
+
+            try:
+                raise ValueError('boom')
+            except ValueError:
+                logger.exception('Unit %s', 'test')
+            handler.listener.stop()
+            log.handlers = []
+
+            with open(path) as f:
+                entry = json.loads(f.readline())
+            self.assertEquals(entry['message'], 'Unit test')
+            self.assertEquals(entry['level'], 'ERROR')
+            self.assertIn('ValueError: boom', entry['exception'])
+        finally:
+            os.unlink(path)
+
+    def test_queue_handler_renders_args(self):
+        queue = mock.MagicMock(name='queue')
+        handler = utils.QueueHandler(queue)
+        record = logging.LogRecord('unit', logging.INFO, __file__, 1,
+                                   'Unit %s', ('test',), None)
+        handler.emit(record)
+        queued = queue.put_nowait.call_args[0][0]
+        self.assertEquals(queued.msg, 'Unit test')
+        self.assertEquals(queued.args, None)
+
+    def test_queue_listener(self):
+        queue = Queue.Queue()
+        handler = mock.MagicMock(name='handler')
+        handler.level = logging.WARNING
+        listener = utils.QueueListener(queue, handler)
+        listener.start()
+        for level in (logging.INFO, logging.ERROR):
+            queue.put(logging.LogRecord('unit', level, __file__, 1,
+                                        'Unit', None, None))
+        listener.stop()
+        listener.stop()
+
+        self.assertEquals(handler.handle.call_count, 1)
+        self.assertEquals(handler.handle.call_args[0][0].levelno,
+                          logging.ERROR)
+        self.assertTrue(handler.flush.called)
+
     def test_super_httplib_debug_logging(self):
         logger = utils.super_httplib_debug_logging()
         self.assertEquals(10, logger.level)
@@ -182,6 +241,75 @@ class TestCoroutineHelpers(testing.AsyncTestCase):
         ret = yield work()
         self.assertEquals(ret, True)
 
+    @testing.gen_test
+    def test_async_retry(self):
+        tracker = mock.MagicMock(name='tracker')
+
+        @utils.async_retry(stop_max_attempt_number=3, wait_fixed=10)
+        @gen.coroutine
+        def flaky():
+            tracker()
+            if tracker.call_count < 3:
+                raise requests.exceptions.HTTPError('Failed')
+            raise gen.Return(True)
+
+        with mock.patch.object(utils, 'tornado_sleep') as sleep:
+            sleep.side_effect = lambda seconds: gen.maybe_future(None)
+            ret = yield flaky()
+
+        self.assertEquals(ret, True)
+        self.assertEquals(tracker.call_count, 3)
+        sleep.assert_has_calls([mock.call(0.01), mock.call(0.01)])
+
+    @testing.gen_test
+    def test_async_retry_waits_like_retrying(self):
+        tracker = mock.MagicMock(name='tracker')
+        wait = mock.MagicMock(name='wait', return_value=1234)
+
+        # retrying only adds the jitter in Retrying.call()
+        @utils.async_retry(stop_max_attempt_number=2, wait_func=wait,
+                           wait_jitter_max=1000)
+        @gen.coroutine
+        def flaky():
+            tracker()
+            if tracker.call_count < 2:
+                raise requests.exceptions.HTTPError('Failed')
+
+        with mock.patch.object(utils, 'tornado_sleep') as sleep:
+            sleep.side_effect = lambda seconds: gen.maybe_future(None)
+            yield flaky()
+
+        self.assertEquals(wait.call_args[0][0], 1)
+        sleep.assert_called_once_with(1.234)
+
+    @testing.gen_test
+    def test_async_retry_gives_up(self):
+        tracker = mock.MagicMock(name='tracker')
+
+        @utils.async_retry(stop_max_attempt_number=2, wait_fixed=0)
+        @gen.coroutine
+        def raise_exception():
+            tracker()
+            raise requests.exceptions.HTTPError('Failed')
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            yield raise_exception()
+        self.assertEquals(tracker.call_count, 2)
+
+        # Exceptions rejected by retry_on_exception are raised right away
+        tracker.reset_mock()
+
+        @utils.async_retry(stop_max_attempt_number=2, wait_fixed=0,
+                           retry_on_exception=lambda e: False)
+        @gen.coroutine
+        def reject():
+            tracker()
+            raise requests.exceptions.HTTPError('Failed')
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            yield reject()
+        self.assertEquals(tracker.call_count, 1)
+
     @testing.gen_test
     def testTornadoSleep(self):
         start = time.time()
@@ -189,6 +317,14 @@ class TestCoroutineHelpers(testing.AsyncTestCase):
         stop = time.time()
         self.assertTrue(stop - start > 0.1)
 
+    def test_tornado_sleep_monotonic(self):
+        # kingpin.bin.deploy runs the IOLoop on the monotonic clock
+        io_loop = ioloop.IOLoop(time_func=cancel.monotonic)
+        start = time.time()
+        io_loop.run_sync(lambda: utils.tornado_sleep(0.05), timeout=1)
+        io_loop.close()
+        self.assertTrue(time.time() - start >= 0.05)
+
     @testing.gen_test
     def test_repeating_log(self):
         logger = mock.Mock()  # used for tracking
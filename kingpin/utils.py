@@ -20,13 +20,17 @@ Common package for utility functions.
 """
 
 from logging import handlers
+import Queue
+import atexit
 import datetime
 import demjson
 import functools
+import json
 import logging
 import os
 import re
 import sys
+import threading
 import time
 import traceback
 
@@ -34,6 +38,11 @@ from tornado import gen
 from tornado import ioloop
 import httplib
 import rainbow_logging_handler
+import retrying
+
+from kingpin.actors.support import cancel
+from kingpin.actors.support import metrics
+from kingpin.actors.support import trace
 
 __author__ = 'Matt Wise (matt@nextdoor.com)'
 
@@ -80,7 +89,103 @@ def str_to_class(string):
     return c
 
 
-def setup_root_logger(level='warn', syslog=None, color=False):
+class QueueHandler(logging.Handler):
+
+    """Hands log records off to a queue instead of writing them out.
+
+    A `QueueListener` thread takes the records off the queue and passes them
+    to the real handlers, so the thread that logged (usually the IOLoop) never
+    waits on a slow terminal, pipe or socket.
+
+    Args:
+        queue: A Queue.Queue shared with the QueueListener
+    """
+
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+
+    def prepare(self, record):
+        """Formats the message and traceback of a record before it is queued.
+
+        The arguments of the message may change (or go away) by the time the
+        listener thread gets to the record, so they are rendered now.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+
+    """Writes the records queued by a `QueueHandler` from a background thread.
+
+    Args:
+        queue: A Queue.Queue shared with the QueueHandler
+        handlers: The logging.Handler objects that write the records out
+    """
+
+    _sentinel = None
+
+    def __init__(self, queue, *handlers):
+        self.queue = queue
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor,
+                                        name='kingpin-log-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _monitor(self):
+        while True:
+            record = self.queue.get()
+            if record is self._sentinel:
+                break
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def stop(self):
+        """Writes out the records still in the queue and stops the thread."""
+        if not self._thread:
+            return
+        self.queue.put(self._sentinel)
+        self._thread.join()
+        self._thread = None
+        for handler in self.handlers:
+            handler.flush()
+
+
+class JSONFormatter(logging.Formatter):
+
+    """Formats each log record as a single line JSON object."""
+
+    def format(self, record):
+        entry = {'time': record.created,
+                 'level': record.levelname,
+                 'logger': record.name,
+                 'message': record.getMessage()}
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, sort_keys=True)
+
+
+def setup_root_logger(level='warn', syslog=None, color=False, queued=False,
+                      json_file=None):
     """Configures the root logger.
 
     Args:
@@ -88,6 +193,8 @@ def setup_root_logger(level='warn', syslog=None, color=False):
         syslog: String representing syslog facility to output to.  If empty,
         logs are written to console.
         color: Colorize the log output
+        queued: Write the logs from a background thread (see `QueueHandler`)
+        json_file: Also write the logs to this file, one JSON object per line
 
     Returns:
         A root Logger object
@@ -140,7 +247,24 @@ def setup_root_logger(level='warn', syslog=None, color=False):
     # Append the formatter to the handler, then set the handler as our default
     # handler for the root logger.
     handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    output = [handler]
+
+    if json_file:
+        json_handler = logging.FileHandler(json_file)
+        json_handler.setFormatter(JSONFormatter())
+        output.append(json_handler)
+
+    if queued:
+        queue = Queue.Queue()
+        listener = QueueListener(queue, *output)
+        listener.start()
+        atexit.register(listener.stop)
+        handler = QueueHandler(queue)
+        handler.listener = listener
+        output = [handler]
+
+    for handler in output:
+        logger.addHandler(handler)
 
     return logger
 
@@ -181,9 +305,10 @@ def exception_logger(func):
         try:
             return func(*args, **kwargs)
         except Exception as e:
-            log.debug('Exception caught in %s(%s, %s): %s' %
-                      (func, args, kwargs, e))
-            log.debug(traceback.format_exc())
+            log.debug('Exception caught in %s(%s, %s): %s',
+                      func, args, kwargs, e)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(traceback.format_exc())
             raise
     return wrapper
 
@@ -213,35 +338,105 @@ def retry(excs, retries=3, delay=0.25):
                 try:
                     # Don't log the first time..
                     if i > 1:
-                        log.debug('Try (%s/%s) of %s(%s, %s)' %
-                                  (i, retries, f, args, kwargs))
+                        log.debug('Try (%s/%s) of %s(%s, %s)',
+                                  i, retries, f, args, kwargs)
                     ret = yield gen.coroutine(f)(*args, **kwargs)
-                    log.debug('Result: %s' % ret)
+                    log.debug('Result: %s', ret)
                     raise gen.Return(ret)
                 except excs as e:
-                    log.error('Exception raised on try %s: %s' % (i, e))
+                    log.error('Exception raised on try %s: %s', i, e)
 
-                    if i >= retries:
-                        log.debug('Raising exception: %s' % e)
+                    if i >= retries or cancel.cancelled():
+                        log.debug('Raising exception: %s', e)
                         raise e
 
                     i += 1
-                    log.debug('Retrying in %s...' % delay)
+                    trace.record_retry()
+                    metrics.RETRIES.inc(decorator='utils.retry')
+                    log.debug('Retrying in %s...', delay)
                     yield tornado_sleep(delay)
                 log.debug('Retrying..')
         return wrapper
     return _retry_on_exc
 
 
+def async_retry(**settings):
+    """IOLoop version of the `retrying.retry` decorator.
+
+    Takes the same settings as `retrying.retry` (ie,
+    ``stop_max_attempt_number``, ``wait_exponential_multiplier``,
+    ``wait_jitter_max``, ``retry_on_exception`` ...), but decorates a
+    function that returns a Future -- such as a `run_on_executor` method.
+    The waits between the attempts happen on the IOLoop, so a call that is
+    backing off does not hold an executor thread while it sleeps. Each wait
+    is whatever `retrying.Retrying.wait()` returns for the settings (note
+    that `retrying` only adds ``wait_jitter_max`` inside its own
+    ``call()``, so it has no effect here). No new
+    attempt is made once the calling actor has been cancelled (see
+    `kingpin.actors.support.cancel`).
+
+    Example usage:
+        >>> @async_retry(stop_max_attempt_number=3, wait_fixed=1000)
+        ... @concurrent.run_on_executor
+        ... def get_things(self):
+        ...     return self._client.get_things()
+
+    Args:
+        settings: Keyword arguments for `retrying.Retrying`
+    """
+    def _retry_on_exc(f):
+        @gen.coroutine
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            policy = retrying.Retrying(**settings)
+            start = time.time()
+            attempt = 1
+            while True:
+                cancel.check()
+                try:
+                    ret = yield f(*args, **kwargs)
+                except Exception:
+                    failure = retrying.Attempt(sys.exc_info(), attempt, True)
+                    if not policy.should_reject(failure):
+                        raise
+
+                    delay_ms = int((time.time() - start) * 1000)
+                    if policy.stop(attempt, delay_ms) or cancel.cancelled():
+                        raise
+
+                    wait = policy.wait(attempt, delay_ms)
+                    log.debug('Try %s of %s failed, retrying in %.2fs: %s',
+                              attempt, f.__name__, wait / 1000.0,
+                              failure.value[1])
+                    trace.record_retry()
+                    metrics.RETRIES.inc(decorator='utils.async_retry')
+                    yield tornado_sleep(wait / 1000.0)
+                    attempt += 1
+                else:
+                    raise gen.Return(ret)
+        return wrapper
+    return _retry_on_exc
+
+
 @gen.coroutine
 def tornado_sleep(seconds=1.0):
     """Async method equivalent to sleeping.
 
+    Raises `kingpin.actors.exceptions.ActorCancelled` rather than returning
+    if the calling actor was cancelled in the meantime, so that polling loops
+    stop once nobody is waiting on them. The sleep never lasts past the
+    deadline of the calling actor either.
+
     Args:
         seconds: Float seconds. Default 1.0
     """
-    yield gen.Task(ioloop.IOLoop.current().add_timeout,
-                   time.time() + seconds)
+    cancel.check()
+    remaining = cancel.remaining()
+    if remaining is not None:
+        seconds = min(seconds, max(remaining, 0))
+    io_loop = ioloop.IOLoop.current()
+    yield gen.Task(io_loop.add_timeout, io_loop.time() + seconds)
+    cancel.check()
 
 
 def populate_with_tokens(string, tokens, left_wrapper='%', right_wrapper='%',
@@ -273,8 +468,8 @@ def populate_with_tokens(string, tokens, left_wrapper='%', right_wrapper='%',
         for k, v in tokens.iteritems():
 
             if type(v) not in allowed_types:
-                log.warning('Token %s=%s is not in allowed types: %s' % (
-                    k, v, allowed_types))
+                log.warning('Token %s=%s is not in allowed types: %s',
+                            k, v, allowed_types)
                 continue
 
             string = string.replace(
@@ -352,7 +547,8 @@ def create_repeating_log(logger, message, handle=None, **kwargs):
         kwargs: values accepted by datetime.timedelta namely seconds, and
         milliseconds.
 
-    Must be cleared via clear_repeating_log()
+    Must be cleared via clear_repeating_log(), but stops on its own when the
+    actor that created it is cancelled.
     Only handles one interval per actor.
     """
 
@@ -367,6 +563,8 @@ def create_repeating_log(logger, message, handle=None, **kwargs):
         handle = OpaqueHandle()
 
     def log_and_queue():
+        if cancel.cancelled():
+            return
         logger(message)
         create_repeating_log(logger, message, handle, **kwargs)
 